@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from collections.abc import Iterable
+from collections.abc import Iterator
+from contextlib import asynccontextmanager
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# the queue delay is evaluated over windows of this many seconds
+_INTERVAL = 1.0
+
+
+class OverloadedError(Exception):
+    """Raised when a query is refused a connection, instead of queueing without bound."""
+
+
+_rejections: ContextVar[list[OverloadedError] | None] = ContextVar(
+    "admission_rejections",
+    default=None,
+)
+
+
+@contextmanager
+def track_rejections() -> Iterator[list[OverloadedError]]:
+    """Collect the queries refused within the block, even when issued from child tasks."""
+    rejections: list[OverloadedError] = []
+    token = _rejections.set(rejections)
+    try:
+        yield rejections
+    finally:
+        _rejections.reset(token)
+
+
+def record_rejections(rejections: Iterable[OverloadedError]) -> None:
+    """Report refused queries to the block tracking them, e.g. those of work shared with other requests."""
+    tracked = _rejections.get()
+    if tracked is not None:
+        tracked.extend(rejections)
+
+
+class AdmissionController:
+    """
+    Bounds the queries in flight on a connection pool and the queue in front of it.
+
+    Up to `capacity` queries run at once, so they never wait inside the pool
+    itself. Past that, at most `max_queue_depth` queries wait for a slot, for
+    up to `queue_timeout` seconds; any further query is refused right away.
+
+    Like CoDel, the controller considers the pool overloaded once the queue
+    delay stayed above `queue_target` seconds for a whole interval. While
+    overloaded, queries only wait up to `queue_target`, so a standing queue
+    drains quickly instead of every query timing out late.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        capacity: int,
+        max_queue_depth: int,
+        queue_target: float,
+        queue_timeout: float,
+    ) -> None:
+        self.name = name
+        self.capacity = capacity
+        self.max_queue_depth = max_queue_depth
+        self.queue_target = queue_target
+        self.queue_timeout = queue_timeout
+
+        self.in_use = 0
+        self.rejected = 0
+        self._waiters: deque[tuple[asyncio.Future[None], float]] = deque()
+        self._overloaded = False
+        self._interval_min_delay = math.inf
+        self._interval_end = time.monotonic() + _INTERVAL
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def overloaded(self) -> bool:
+        self._roll_interval(time.monotonic())
+        return self._overloaded
+
+    @property
+    def saturated(self) -> bool:
+        """Whether the queue is full, so a new query would be refused right away."""
+        return self.waiting >= self.max_queue_depth
+
+    def _roll_interval(self, now: float) -> None:
+        if now < self._interval_end:
+            return
+
+        min_delay = self._interval_min_delay
+        if self._waiters:
+            # nothing left the queue for a whole interval
+            min_delay = min(min_delay, now - self._waiters[0][1])
+        elif min_delay == math.inf:
+            min_delay = 0
+
+        self._overloaded = min_delay > self.queue_target
+        self._interval_min_delay = math.inf
+        self._interval_end = now + _INTERVAL
+
+    def _observe_delay(self, delay: float) -> None:
+        self._interval_min_delay = min(self._interval_min_delay, delay)
+        self._roll_interval(time.monotonic())
+
+    def _reject(self, reason: str) -> OverloadedError:
+        self.rejected += 1
+        exc = OverloadedError(f"Database pool {self.name} is overloaded ({reason})")
+        record_rejections([exc])
+        return exc
+
+    async def acquire(self) -> None:
+        if self.in_use < self.capacity and not self._waiters:
+            self.in_use += 1
+            self._observe_delay(0)
+            return
+
+        if len(self._waiters) >= self.max_queue_depth:
+            raise self._reject("queue full")
+
+        enqueued_at = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (waiter, enqueued_at)
+        self._waiters.append(entry)
+        try:
+            await asyncio.wait_for(
+                waiter,
+                self.queue_target if self.overloaded else self.queue_timeout,
+            )
+        except BaseException as exc:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just as the wait was given up
+                self.release()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+
+            if isinstance(exc, TimeoutError):
+                self._observe_delay(time.monotonic() - enqueued_at)
+                raise self._reject("queue timeout") from None
+            raise
+
+        self._observe_delay(time.monotonic() - enqueued_at)
+
+    def release(self) -> None:
+        # hand the slot over to the oldest waiter, if any is still waiting
+        while self._waiters:
+            waiter, _ = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+        self.in_use -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def gauges(self) -> dict[str, int | bool]:
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "idle": self.capacity - self.in_use,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "overloaded": self.overloaded,
+        }
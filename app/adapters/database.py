@@ -1,12 +1,22 @@
 from __future__ import annotations
 
-import re
+import asyncio
 import ssl
+import time
+from collections import deque
+from collections.abc import AsyncGenerator
+from contextlib import aclosing
 from types import TracebackType
 from typing import Any
+from typing import Literal
 from typing import Type
+from urllib.parse import urlsplit
 
+from adapters import mysql
+from adapters.admission import AdmissionController
+from common import deadlines
 from common import logger
+from common import metrics
 from common import settings
 from common.timer import Timer
 from databases import Database as _Database
@@ -41,30 +51,157 @@ def dsn(
     return f"{scheme}://{user}:{password}@{host}:{port}/{database}"
 
 
-class Database:
-    """Wrapper around read & write database pools to simplify usage."""
+def _log_query(query: str, values: Any, timer: Timer) -> None:
+    if settings.APP_DEBUG:
+        time_elapsed = timer.elapsed()
+        logger.info(
+            f"Executed SQL query: {metrics.fingerprint(query)} {values} in {time_elapsed * 1000:.2f} msec.",
+        )
+
+
+_HEALTH_CHECK_INTERVAL = 5
+
+# number of read latencies the hedging delay (their p95) is computed from
+_LATENCY_WINDOW = 1000
+_LATENCY_REFRESH_INTERVAL = 100
+_MIN_HEDGE_DELAY = 0.005
+
+_ReadMethod = Literal["fetch_one", "fetch_all", "fetch_val"]
+
+
+def _count_rows(method: _ReadMethod, result: Any, raw: bool) -> int:
+    if raw:
+        return len(result.rows)
+    if method == "fetch_all":
+        return len(result)
+    return int(result is not None)
+
 
+class _Replica:
     def __init__(
         self,
-        read_dsn: str,
-        read_db_ssl: bool | ssl.SSLContext,
-        write_dsn: str,
-        write_db_ssl: bool | ssl.SSLContext,
+        dsn: str,
+        db_ssl: bool | ssl.SSLContext,
+        weight: int,
         min_pool_size: int,
         max_pool_size: int,
+        max_queue_depth: int,
+        queue_target: float,
+        queue_timeout: float,
+        max_streams: int,
     ) -> None:
-        self.read_pool = _create_pool(
-            read_dsn,
-            min_pool_size,
+        url = urlsplit(dsn)
+        self.name = f"{url.hostname}:{url.port}"
+        self.pool = _create_pool(dsn, min_pool_size, max_pool_size, db_ssl)
+        self.raw_pool = mysql.RawPool(dsn, min_pool_size, max_pool_size, db_ssl)
+        # shared by both pools, so queries never queue inside either of them
+        self.admission = AdmissionController(
+            self.name,
             max_pool_size,
-            read_db_ssl,
+            max_queue_depth,
+            queue_target,
+            queue_timeout,
+        )
+        # streams last as long as their client reads, so they get connections of their own
+        self.stream_pool = mysql.RawPool(dsn, 0, max_streams, db_ssl)
+        # and are refused right away once all of them are in use, rather than queued
+        self.streams = AdmissionController(
+            f"{self.name} streams",
+            max_streams,
+            0,
+            queue_target,
+            queue_timeout,
         )
-        self.write_pool = _create_pool(
+        self.weight = weight
+        self.outstanding = 0
+        self.healthy = True
+        self.lag: float | None = None
+
+
+class Database:
+    """
+    Wrapper around read & write database pools to simplify usage.
+
+    Reads are spread over one or more read replicas, picking the healthy one
+    with the fewest outstanding queries relative to its weight. Replicas are
+    health checked in the background and skipped while unreachable or lagging
+    more than `max_replication_lag` seconds behind; reads go to the write
+    pool when no replica is usable.
+
+    With `hedge_reads`, a read which hasn't completed after the p95 read
+    latency is also sent to a second replica, and the first answer wins.
+
+    `raw` offers the same reads on the raw driver path of `adapters.mysql`.
+
+    Every query is recorded in `common.metrics` under its fingerprint, and the
+    plan of queries slower than `slow_query_threshold` seconds is captured
+    with EXPLAIN in the background.
+
+    Queries (but not explicit connections and transactions) go through the
+    `AdmissionController` of their pool, which refuses them with an
+    `OverloadedError` rather than letting them queue without bound.
+
+    Queries are bounded by the deadline of the request issuing them, from
+    `common.deadlines`. Reads also pass the time left to the server, as a
+    `MAX_EXECUTION_TIME` hint.
+    """
+
+    def __init__(
+        self,
+        read_dsns: list[str],
+        read_db_ssl: bool | ssl.SSLContext,
+        write_dsn: str,
+        write_db_ssl: bool | ssl.SSLContext,
+        read_min_pool_size: int,
+        read_max_pool_size: int,
+        write_min_pool_size: int,
+        write_max_pool_size: int,
+        read_weights: list[int] | None = None,
+        max_replication_lag: float = 10,
+        hedge_reads: bool = False,
+        slow_query_threshold: float = 0.2,
+        max_queue_depth: int = 50,
+        queue_target: float = 0.05,
+        queue_timeout: float = 1,
+        max_streams: int = 4,
+    ) -> None:
+        weights = read_weights or [1] * len(read_dsns)
+        self.replicas = [
+            _Replica(
+                read_dsn,
+                read_db_ssl,
+                weight,
+                read_min_pool_size,
+                read_max_pool_size,
+                max_queue_depth,
+                queue_target,
+                queue_timeout,
+                max_streams,
+            )
+            for read_dsn, weight in zip(read_dsns, weights, strict=True)
+        ]
+        self.primary = _Replica(
             write_dsn,
-            min_pool_size,
-            max_pool_size,
             write_db_ssl,
+            1,
+            write_min_pool_size,
+            write_max_pool_size,
+            max_queue_depth,
+            queue_target,
+            queue_timeout,
+            max_streams,
         )
+        self.write_pool = self.primary.pool
+        self.max_replication_lag = max_replication_lag
+        self.hedge_reads = hedge_reads
+        self.slow_query_threshold = slow_query_threshold
+
+        self._latencies: deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self._latencies_since_refresh = 0
+        self._hedge_delay = 0.05
+        self._health_check_task: asyncio.Task[None] | None = None
+        self._explain_tasks: set[asyncio.Task[None]] = set()
+        self.raw = RawReader(self)
 
     async def __aenter__(self) -> Database:
         await self.connect()
@@ -79,7 +216,9 @@ class Database:
         await self.disconnect()
 
     def connection(self) -> Connection:
-        return self.read_pool.connection()
+        replica = self._pick_replica()
+        assert replica is not None
+        return replica.pool.connection()
 
     def transaction(
         self,
@@ -93,12 +232,297 @@ class Database:
         )
 
     async def connect(self) -> None:
-        await self.read_pool.connect()
-        await self.write_pool.connect()
+        await asyncio.gather(
+            *(replica.pool.connect() for replica in self.replicas),
+            *(replica.raw_pool.connect() for replica in self.replicas),
+            *(replica.stream_pool.connect() for replica in self.replicas),
+            self.write_pool.connect(),
+            self.primary.raw_pool.connect(),
+            self.primary.stream_pool.connect(),
+        )
+        self._health_check_task = asyncio.create_task(
+            self._check_replicas_periodically(),
+        )
 
     async def disconnect(self) -> None:
-        await self.read_pool.disconnect()
-        await self.write_pool.disconnect()
+        if self._health_check_task is not None:
+            self._health_check_task.cancel()
+            await asyncio.gather(self._health_check_task, return_exceptions=True)
+            self._health_check_task = None
+
+        for task in self._explain_tasks:
+            task.cancel()
+        await asyncio.gather(*self._explain_tasks, return_exceptions=True)
+
+        await asyncio.gather(
+            *(replica.pool.disconnect() for replica in self.replicas),
+            *(replica.raw_pool.disconnect() for replica in self.replicas),
+            *(replica.stream_pool.disconnect() for replica in self.replicas),
+            self.write_pool.disconnect(),
+            self.primary.raw_pool.disconnect(),
+            self.primary.stream_pool.disconnect(),
+        )
+
+    def _pick_replica(self, exclude: _Replica | None = None) -> _Replica | None:
+        """Pick the healthy replica with the least outstanding reads per unit of weight."""
+        candidates = [
+            replica
+            for replica in self.replicas
+            if replica.healthy and replica is not exclude
+        ]
+        if not candidates:
+            # hedged reads only go to another replica
+            return self.primary if exclude is None else None
+
+        return min(
+            candidates,
+            key=lambda replica: (replica.outstanding + 1) / replica.weight,
+        )
+
+    @property
+    def overloaded(self) -> bool:
+        """Whether the queue of every pool reads could currently go to is full."""
+        candidates = [replica for replica in self.replicas if replica.healthy]
+        return all(
+            replica.admission.saturated for replica in candidates or [self.primary]
+        )
+
+    def pool_gauges(self) -> dict[str, dict[str, int | bool]]:
+        replicas = (
+            *(("read", replica) for replica in self.replicas),
+            ("write", self.primary),
+        )
+        return {
+            **{
+                f"{role}:{replica.name}": replica.admission.gauges()
+                for role, replica in replicas
+            },
+            **{
+                f"{role}_streams:{replica.name}": replica.streams.gauges()
+                for role, replica in replicas
+            },
+        }
+
+    async def _fetch_replication_lag(self, connection: Connection) -> float | None:
+        """Fetch the replication lag of a replica, 0 for a primary and None if replication is stopped."""
+        status = None
+        for query in ("SHOW REPLICA STATUS", "SHOW SLAVE STATUS"):
+            try:
+                status = await connection.fetch_one(query)
+                break
+            except Exception:
+                continue  # unsupported syntax (or missing privileges)
+        else:
+            return 0
+
+        if status is None:
+            return 0
+
+        mapping = status._mapping
+        lag = mapping.get("Seconds_Behind_Source", mapping.get("Seconds_Behind_Master"))
+        return float(lag) if lag is not None else None
+
+    async def _check_replica(self, replica: _Replica) -> None:
+        try:
+            async with replica.pool.connection() as connection:
+                await connection.fetch_val("SELECT 1")
+                replica.lag = await self._fetch_replication_lag(connection)
+        except Exception as exc:
+            if replica.healthy:
+                logger.warning(
+                    f"Read replica {replica.name} is unreachable",
+                    exc_info=exc,
+                )
+            replica.healthy = False
+            return
+
+        healthy = replica.lag is not None and replica.lag <= self.max_replication_lag
+        if healthy != replica.healthy:
+            if healthy:
+                logger.info(f"Read replica {replica.name} is back in rotation")
+            else:
+                logger.warning(
+                    f"Read replica {replica.name} is lagging ({replica.lag} seconds behind)",
+                )
+        replica.healthy = healthy
+
+    async def _check_replicas_periodically(self) -> None:
+        while True:
+            await asyncio.gather(
+                *(self._check_replica(replica) for replica in self.replicas),
+            )
+            await asyncio.sleep(_HEALTH_CHECK_INTERVAL)
+
+    def _record_latency(self, latency: float) -> None:
+        self._latencies.append(latency)
+        self._latencies_since_refresh += 1
+
+        if self._latencies_since_refresh >= _LATENCY_REFRESH_INTERVAL:
+            latencies = sorted(self._latencies)
+            p95 = latencies[int(len(latencies) * 0.95)]
+            self._hedge_delay = max(p95, _MIN_HEDGE_DELAY)
+            self._latencies_since_refresh = 0
+
+    async def _read_from(
+        self,
+        replica: _Replica,
+        method: _ReadMethod,
+        query: str,
+        values: dict[str, Any] | None,
+        raw: bool,
+    ) -> tuple[Any, float]:
+        """Run a read on a replica, returning its result and the time spent waiting for the pool."""
+        replica.outstanding += 1
+        started_at = time.perf_counter()
+        try:
+            async with replica.admission.slot():
+                # the server gives up on the query along with the request
+                remaining = deadlines.remaining()
+                max_execution_time = (
+                    max(int(remaining * 1000), 1) if remaining is not None else None
+                )
+
+                if raw:
+                    admitted_at = time.perf_counter()
+                    result = await replica.raw_pool.fetch(
+                        method,
+                        query,
+                        values,
+                        max_execution_time,
+                    )
+                    pool_wait = admitted_at - started_at + result.pool_wait
+                else:
+                    if max_execution_time is not None:
+                        query = mysql.with_max_execution_time(query, max_execution_time)
+
+                    connection = replica.pool.connection()
+                    async with connection:
+                        pool_wait = time.perf_counter() - started_at
+                        result = await getattr(connection, method)(query, values)
+        finally:
+            replica.outstanding -= 1
+
+        self._record_latency(time.perf_counter() - started_at)
+        return result, pool_wait
+
+    def _observe(
+        self,
+        query: str,
+        values: Any,
+        duration: float,
+        rows: int = 0,
+        pool_wait: float | None = None,
+        failed: bool = False,
+        explain: bool = True,
+    ) -> None:
+        stats = metrics.record_query(query, duration, rows, pool_wait, failed)
+
+        if (
+            explain
+            and not failed
+            and metrics.should_sample_slow_query(
+                stats,
+                duration,
+                self.slow_query_threshold,
+            )
+        ):
+            task = asyncio.create_task(self._explain(stats, query, values))
+            self._explain_tasks.add(task)
+            task.add_done_callback(self._explain_tasks.discard)
+
+    async def _explain(
+        self,
+        stats: metrics.QueryStats,
+        query: str,
+        values: dict[str, Any] | None,
+    ) -> None:
+        """Capture the plan of a slow query, on a replica as it doesn't run the query."""
+        replica = self._pick_replica()
+        assert replica is not None and stats.slow_sample is not None
+
+        if replica.admission.saturated or replica.admission.overloaded:
+            return  # not worth adding to the load
+
+        try:
+            async with replica.admission.slot():
+                columns, rows, _ = await replica.raw_pool.fetch(
+                    "fetch_all",
+                    f"EXPLAIN {query}",
+                    values,
+                )
+        except Exception as exc:
+            logger.warning("Failed to explain a slow query", exc_info=exc)
+            return
+
+        stats.slow_sample.plan = [dict(zip(columns, row)) for row in rows]
+
+    async def _read(
+        self,
+        method: _ReadMethod,
+        query: str,
+        values: dict[str, Any] | None,
+        raw: bool = False,
+    ) -> Any:
+        started_at = time.perf_counter()
+        try:
+            async with deadlines.timeout():
+                result, pool_wait = await self._hedged_read(method, query, values, raw)
+        except Exception:
+            self._observe(query, values, time.perf_counter() - started_at, failed=True)
+            raise
+
+        self._observe(
+            query,
+            values,
+            time.perf_counter() - started_at,
+            rows=_count_rows(method, result, raw),
+            pool_wait=pool_wait,
+        )
+        return result
+
+    async def _hedged_read(
+        self,
+        method: _ReadMethod,
+        query: str,
+        values: dict[str, Any] | None,
+        raw: bool,
+    ) -> tuple[Any, float]:
+        replica = self._pick_replica()
+        assert replica is not None
+
+        if not self.hedge_reads:
+            return await self._read_from(replica, method, query, values, raw)
+
+        first = asyncio.ensure_future(
+            self._read_from(replica, method, query, values, raw),
+        )
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self._hedge_delay)
+            if not done:
+                second_replica = self._pick_replica(exclude=replica)
+                if second_replica is not None:
+                    tasks.add(
+                        asyncio.ensure_future(
+                            self._read_from(second_replica, method, query, values, raw),
+                        ),
+                    )
+
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+
+            # every attempt failed, surface the error of the first one
+            return first.result()
+        finally:
+            for task in tasks:
+                task.cancel()
 
     async def fetch_one(
         self,
@@ -106,15 +530,9 @@ class Database:
         values: dict[str, Any] | None = None,
     ) -> dict[str, Any] | None:
         async with Timer() as timer:
-            async with self.read_pool.connection() as connection:
-                rec = await connection.fetch_one(query, values)
-
-        if settings.APP_DEBUG:
-            time_elapsed = timer.elapsed()
-            cleaned_query = re.sub(r"\s+", " ", query).strip()
-            logger.info(
-                f"Executed SQL query: {cleaned_query} {values} in {time_elapsed * 1000:.2f} msec.",
-            )
+            rec = await self._read("fetch_one", query, values)
+
+        _log_query(query, values, timer)
 
         return dict(rec._mapping) if rec is not None else None
 
@@ -124,60 +542,185 @@ class Database:
         values: dict[str, Any] | None = None,
     ) -> list[dict[str, Any]]:
         async with Timer() as timer:
-            async with self.read_pool.connection() as connection:
-                recs = await connection.fetch_all(query, values)
-
-        if settings.APP_DEBUG:
-            time_elapsed = timer.elapsed()
-            cleaned_query = re.sub(r"\s+", " ", query).strip()
-            logger.info(
-                f"Executed SQL query: {cleaned_query} {values} in {time_elapsed * 1000:.2f} msec.",
-            )
+            recs = await self._read("fetch_all", query, values)
+
+        _log_query(query, values, timer)
 
         return [dict(rec._mapping) for rec in recs]
 
     async def fetch_val(self, query: str, values: dict[str, Any] | None = None) -> Any:
         async with Timer() as timer:
-            async with self.read_pool.connection() as connection:
-                val = await connection.fetch_val(query, values)
-
-        if settings.APP_DEBUG:
-            time_elapsed = timer.elapsed()
-            cleaned_query = re.sub(r"\s+", " ", query).strip()
-            logger.info(
-                f"Executed SQL query: {cleaned_query} {values} in {time_elapsed * 1000:.2f} msec.",
-            )
+            val = await self._read("fetch_val", query, values)
+
+        _log_query(query, values, timer)
 
         return val
 
+    async def iterate(
+        self,
+        query: str,
+        values: dict[str, Any] | None = None,
+        batch_size: int = 1000,
+    ) -> AsyncGenerator[dict[str, Any]]:
+        """
+        Stream the rows of a read query, without loading the whole result in memory.
+
+        Rows are read from a replica through an unbuffered server side cursor,
+        `batch_size` at a time. Breaking out of the loop (or cancelling the task
+        iterating) aborts the query on the server.
+
+        Streams use a small pool of their own, so slow clients never hold
+        connections other queries wait for; once all of its connections are
+        in use, further streams are refused with an `OverloadedError`.
+        """
+        replica = self._pick_replica()
+        assert replica is not None
+
+        started_at = time.perf_counter()
+        row_count = 0
+        failed = False
+        try:
+            async with replica.streams.slot():
+                # closes the cursor as soon as iteration stops, not once garbage collected
+                async with aclosing(
+                    replica.stream_pool.iterate(query, values, batch_size),
+                ) as batches:
+                    async with Timer() as timer:
+                        async for columns, rows in batches:
+                            row_count += len(rows)
+                            for row in rows:
+                                yield dict(zip(columns, row))
+        except Exception:
+            failed = True
+            raise
+        finally:
+            # streams last as long as their consumer, their plan isn't worth sampling
+            self._observe(
+                query,
+                values,
+                time.perf_counter() - started_at,
+                rows=row_count,
+                failed=failed,
+                explain=False,
+            )
+
+        _log_query(query, values, timer)
+
     async def execute(
         self,
         query: str,
         values: dict[str, Any] | None = None,
     ) -> Any:  # TODO: this Any can surely be typed better
+        started_at = time.perf_counter()
         async with Timer() as timer:
-            async with self.write_pool.connection() as connection:
-                result = await connection.execute(query, values)
-
-        if settings.APP_DEBUG:
-            time_elapsed = timer.elapsed()
-            cleaned_query = re.sub(r"\s+", " ", query).strip()
-            logger.info(
-                f"Executed SQL query: {cleaned_query} {values} in {time_elapsed * 1000:.2f} msec.",
-            )
+            connection = self.write_pool.connection()
+            try:
+                async with deadlines.timeout(), self.primary.admission.slot():
+                    async with connection:
+                        pool_wait = time.perf_counter() - started_at
+                        result = await connection.execute(query, values)
+            except Exception:
+                self._observe(
+                    query,
+                    values,
+                    time.perf_counter() - started_at,
+                    failed=True,
+                )
+                raise
+
+        self._observe(
+            query,
+            values,
+            time.perf_counter() - started_at,
+            pool_wait=pool_wait,
+        )
+        _log_query(query, values, timer)
 
         return result
 
     async def execute_many(self, query: str, values: list[Any]) -> None:
+        started_at = time.perf_counter()
         async with Timer() as timer:
-            async with self.write_pool.connection() as connection:
-                await connection.execute_many(query, values)
-
-        if settings.APP_DEBUG:
-            time_elapsed = timer.elapsed()
-            cleaned_query = re.sub(r"\s+", " ", query).strip()
-            logger.info(
-                f"Executed SQL query: {cleaned_query} {values} in {time_elapsed * 1000:.2f} msec.",
-            )
+            connection = self.write_pool.connection()
+            try:
+                async with deadlines.timeout(), self.primary.admission.slot():
+                    async with connection:
+                        pool_wait = time.perf_counter() - started_at
+                        await connection.execute_many(query, values)
+            except Exception:
+                self._observe(
+                    query,
+                    values,
+                    time.perf_counter() - started_at,
+                    failed=True,
+                    explain=False,
+                )
+                raise
+
+        self._observe(
+            query,
+            values,
+            time.perf_counter() - started_at,
+            rows=len(values),
+            pool_wait=pool_wait,
+            explain=False,
+        )
+        _log_query(query, values, timer)
 
         return None
+
+
+class RawReader:
+    """
+    The reads of `Database` on the raw driver path, which repositories opt into per call.
+
+    Rows are built with `dict(zip(columns, row))` out of the driver's tuples,
+    skipping SQLAlchemy query compilation and row mapping.
+    """
+
+    def __init__(self, database: Database) -> None:
+        self._database = database
+
+    async def fetch_one(
+        self,
+        query: str,
+        values: dict[str, Any] | None = None,
+    ) -> dict[str, Any] | None:
+        async with Timer() as timer:
+            columns, rows, _ = await self._database._read(
+                "fetch_one",
+                query,
+                values,
+                raw=True,
+            )
+
+        _log_query(query, values, timer)
+        return dict(zip(columns, rows[0])) if rows else None
+
+    async def fetch_all(
+        self,
+        query: str,
+        values: dict[str, Any] | None = None,
+    ) -> list[dict[str, Any]]:
+        async with Timer() as timer:
+            columns, rows, _ = await self._database._read(
+                "fetch_all",
+                query,
+                values,
+                raw=True,
+            )
+
+        _log_query(query, values, timer)
+        return [dict(zip(columns, row)) for row in rows]
+
+    async def fetch_val(self, query: str, values: dict[str, Any] | None = None) -> Any:
+        async with Timer() as timer:
+            _, rows, _ = await self._database._read(
+                "fetch_val",
+                query,
+                values,
+                raw=True,
+            )
+
+        _log_query(query, values, timer)
+        return rows[0][0] if rows else None
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import functools
+import re
+import ssl
+import time
+from collections.abc import AsyncGenerator
+from collections.abc import Sequence
+from typing import Any
+from typing import Literal
+from typing import NamedTuple
+from urllib.parse import unquote
+from urllib.parse import urlsplit
+
+import aiomysql  # type: ignore[import-untyped]
+
+# named parameters as used with `databases`, e.g. `WHERE id = :id`
+_NAMED_PARAMETER = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+_SELECT = re.compile(r"\s*SELECT\b", re.IGNORECASE)
+
+FetchMethod = Literal["fetch_one", "fetch_all", "fetch_val"]
+
+
+class FetchResult(NamedTuple):
+    columns: tuple[str, ...]
+    rows: Sequence[tuple[Any, ...]]
+    # seconds spent waiting for a connection out of the pool
+    pool_wait: float
+
+
+@functools.lru_cache(maxsize=1024)
+def to_pyformat(query: str) -> str:
+    """
+    Translate a query using `:name` parameters to the driver's `%(name)s` style.
+
+    The translation is cached per query text, as repositories only build a
+    handful of distinct queries.
+    """
+    return _NAMED_PARAMETER.sub(r"%(\1)s", query.replace("%", "%%"))
+
+
+def with_max_execution_time(query: str, max_execution_time: int) -> str:
+    """
+    Add a `MAX_EXECUTION_TIME` optimizer hint (in msec) to a SELECT query.
+
+    The server aborts the query once it runs for longer, rather than keeping
+    a connection busy for a client which gave up on it. Other statements
+    don't support the hint and are returned as is.
+    """
+    match = _SELECT.match(query)
+    if match is None:
+        return query
+
+    return (
+        f"{query[: match.end()]} /*+ MAX_EXECUTION_TIME({max_execution_time}) */"
+        f"{query[match.end() :]}"
+    )
+
+
+class RawPool:
+    """
+    Connection pool straight on top of aiomysql, skipping `databases`.
+
+    Rows come back as tuples, along with their column names, so no SQLAlchemy
+    compilation nor row mapping happens on the way. aiomysql only speaks the
+    text protocol, so there are no server side prepared statements; what is
+    cached instead is the parameter style translation of every query.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        min_pool_size: int,
+        max_pool_size: int,
+        ssl_context: bool | ssl.SSLContext,
+    ) -> None:
+        url = urlsplit(dsn)
+        self._connect_kwargs = {
+            "host": url.hostname,
+            "port": url.port or 3306,
+            "user": unquote(url.username or ""),
+            "password": unquote(url.password or ""),
+            "db": url.path.lstrip("/"),
+            "minsize": min_pool_size,
+            "maxsize": max_pool_size,
+            "autocommit": True,
+            "ssl": ssl_context if isinstance(ssl_context, ssl.SSLContext) else None,
+        }
+        self._pool: aiomysql.Pool | None = None
+
+    async def connect(self) -> None:
+        self._pool = await aiomysql.create_pool(**self._connect_kwargs)
+
+    async def disconnect(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    async def fetch(
+        self,
+        method: FetchMethod,
+        query: str,
+        values: dict[str, Any] | None = None,
+        max_execution_time: int | None = None,
+    ) -> FetchResult:
+        """Run a query, returning its column names and rows (a single one unless `fetch_all`)."""
+        assert self._pool is not None, "the pool isn't connected"
+
+        # without values the driver doesn't interpolate, nor unescape %%
+        statement = to_pyformat(query) if values is not None else query
+        if max_execution_time is not None:
+            # after the cached translation, as the hint changes on every call
+            statement = with_max_execution_time(statement, max_execution_time)
+
+        waiting_since = time.perf_counter()
+        async with self._pool.acquire() as connection:
+            pool_wait = time.perf_counter() - waiting_since
+
+            async with connection.cursor() as cursor:
+                await cursor.execute(statement, values)
+
+                if method == "fetch_all":
+                    rows = await cursor.fetchall()
+                else:
+                    row = await cursor.fetchone()
+                    rows = [row] if row is not None else []
+
+                columns = tuple(column[0] for column in cursor.description or ())
+
+        return FetchResult(columns, rows, pool_wait)
+
+    async def iterate(
+        self,
+        query: str,
+        values: dict[str, Any] | None = None,
+        batch_size: int = 1000,
+    ) -> AsyncGenerator[tuple[tuple[str, ...], Sequence[tuple[Any, ...]]]]:
+        """
+        Stream the rows of a query through an unbuffered server side cursor.
+
+        Yields the column names along with batches of at most `batch_size`
+        rows, so memory use doesn't grow with the result size. If iteration
+        stops early the connection is closed rather than drained, which
+        makes the server abort the query.
+        """
+        assert self._pool is not None, "the pool isn't connected"
+
+        connection = await self._pool.acquire()
+        cursor = await connection.cursor(aiomysql.SSCursor)
+        exhausted = False
+        try:
+            await cursor.execute(
+                to_pyformat(query) if values is not None else query,
+                values,
+            )
+            columns = tuple(column[0] for column in cursor.description or ())
+
+            while rows := await cursor.fetchmany(batch_size):
+                yield columns, rows
+
+            exhausted = True
+        finally:
+            if exhausted:
+                await cursor.close()
+            else:
+                # closing the cursor would read the remaining rows first
+                connection.close()
+            self._pool.release(connection)
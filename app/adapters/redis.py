@@ -1,10 +1,36 @@
 from __future__ import annotations
 
-import redis.asyncio
+from typing import Any
+
+from common import deadlines
 from redis.asyncio import Redis as _Redis
+from redis.asyncio.client import Pipeline as _Pipeline
+
+
+class Pipeline(_Pipeline):
+    async def execute(self, raise_on_error: bool = True) -> list[Any]:
+        async with deadlines.timeout():
+            return await super().execute(raise_on_error)
+
+
+class Redis(_Redis):
+    """Redis client whose commands are bounded by the deadline of the current request."""
 
+    async def execute_command(self, *args: Any, **options: Any) -> Any:
+        async with deadlines.timeout():
+            return await super().execute_command(*args, **options)
 
-class Redis(_Redis): ...
+    def pipeline(
+        self,
+        transaction: bool = True,
+        shard_hint: str | None = None,
+    ) -> Pipeline:
+        return Pipeline(
+            self.connection_pool,
+            self.response_callbacks,
+            transaction,
+            shard_hint,
+        )
 
 
 def dsn(
@@ -23,4 +49,4 @@ def dsn(
 
 
 async def from_url(url: str) -> Redis:
-    return await redis.asyncio.from_url(url)  # type: ignore
+    return await Redis.from_url(url)  # type: ignore
@@ -4,7 +4,9 @@ from fastapi import APIRouter
 
 rest_api_router = APIRouter()
 
+from api.metrics.controllers import router as metrics_router
 from api.v1.osu.controllers import router as v1_osu_router
+from api.v1.replays.controllers import router as v1_replays_router
 from api.v1.users.controllers import router as v1_accounts_router
 from api.v2.beatmaps.controllers import router as v2_beatmaps_router
 from api.v2.beatmapsets.controller import router as v2_beatmapsets_router
@@ -12,8 +14,10 @@ from api.v2.scores.controllers import router as v2_scores_router
 from api.v2.users.controllers import router as v2_accounts_router
 
 rest_api_router.include_router(v1_osu_router)
+rest_api_router.include_router(v1_replays_router)
 rest_api_router.include_router(v1_accounts_router)
 rest_api_router.include_router(v2_beatmaps_router)
 rest_api_router.include_router(v2_scores_router)
 rest_api_router.include_router(v2_accounts_router)
 rest_api_router.include_router(v2_beatmapsets_router)
+rest_api_router.include_router(metrics_router)
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import dataclasses
+import hmac
+from typing import Any
+
+from common import cache
+from common import clients
+from common import metrics
+from common import settings
+from fastapi import APIRouter
+from fastapi import Header
+from fastapi import status
+from fastapi.responses import JSONResponse
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def fetch_metrics(authorization: str | None = Header(default=None)) -> Any:
+    """
+    Returns the per query metrics recorded by the database adapter, along with
+    the saturation of every database pool and the cache hit rates.
+
+    Queries are identified by their fingerprint and the repository function
+    issuing them, and sorted by the total time they've spent in the database.
+    Latencies and pool wait times are in milliseconds.
+
+    The endpoint is disabled unless METRICS_TOKEN is set, and then requires
+    it as a bearer token.
+    """
+    if not settings.METRICS_TOKEN:
+        return JSONResponse(
+            content={"error": "Not found."},
+            status_code=status.HTTP_404_NOT_FOUND,
+        )
+
+    if authorization is None or not hmac.compare_digest(
+        authorization.encode(),
+        f"Bearer {settings.METRICS_TOKEN}".encode(),
+    ):
+        return JSONResponse(
+            content={"error": "Invalid metrics token."},
+            status_code=status.HTTP_401_UNAUTHORIZED,
+        )
+
+    return {
+        "queries": metrics.snapshot(),
+        "pools": clients.database.pool_gauges(),
+        "caches": {
+            namespace: dataclasses.asdict(stats)
+            for namespace, stats in cache.stats.items()
+        },
+    }
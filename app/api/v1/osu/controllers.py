@@ -1,29 +1,66 @@
 from __future__ import annotations
 
+import os
+
 from common import storage
 from common.utils import BPY_INITIAL_MAP_ID
 from fastapi import APIRouter
+from fastapi import Header
 from fastapi import status
+from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse
 from fastapi.responses import RedirectResponse
 from fastapi.responses import Response
 
 router = APIRouter()
 
 
+def _etag(stat_result: os.stat_result) -> str:
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def _etag_matches(etag: str, if_none_match: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
 @router.get("/osu/{map_id}")
-async def get_osu_file(map_id: str) -> Response:
+async def get_osu_file(
+    map_id: int,
+    if_none_match: str | None = Header(default=None),
+) -> Response:
     """
     Handle a osu download request.
+
+    Files are streamed from disk with ETag revalidation and Range support.
     """
-    if int(map_id) >= BPY_INITIAL_MAP_ID:
-        osu_disk_file = storage.get_beatmap_file(int(map_id))
+    if map_id >= BPY_INITIAL_MAP_ID:
+        osu_file = await storage.stat_beatmap_file(map_id)
+
+        if osu_file is None:
+            return JSONResponse(
+                content={"error": "Specified beatmap file couldn't be found."},
+                status_code=status.HTTP_404_NOT_FOUND,
+            )
+
+        path, stat_result = osu_file
+        etag = _etag(stat_result)
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "public, max-age=0, must-revalidate",
+        }
+
+        if if_none_match is not None and _etag_matches(etag, if_none_match):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-        return Response(
-            content=osu_disk_file,
+        return FileResponse(
+            path,
+            stat_result=stat_result,
             media_type="application/octet-stream",
-            headers={
-                "Content-Disposition": f'attachment; filename="{map_id}.osu"',
-            },
+            filename=f"{map_id}.osu",
+            headers=headers,
         )
 
     return RedirectResponse(
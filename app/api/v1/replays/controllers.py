@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import base64
+
+from common import replays
+from common.utils import SubmissionStatus
+from errors import ServiceError
+from fastapi import APIRouter
+from fastapi import Query
+from services import maps
+from services import scores
+
+router = APIRouter()
+
+
+@router.get("/api/get_replay")
+async def get_replay(
+    k: str,
+    b: int | None = Query(
+        default=None,
+        description="The beatmap ID (not beatmap set ID!) in which the replay was played",
+    ),
+    u: str | None = Query(
+        default=None,
+        description="The user that has played the beatmap",
+    ),
+    m: int = Query(
+        default=0,
+        description="Gamemode integer (0 = osu!, 1 = osu!taiko, 2 = osu!catch, 3 = osu!mania)",
+    ),
+    s: int | None = Query(
+        default=None,
+        description="Specify a score id to retrieve the replay data for",
+    ),
+    type: str | None = Query(
+        default=None,
+        description="Specify if 'u' is a user_id ('id') or a username ('string')",
+    ),  # TODO: only user ids are supported for now
+    mods: int | None = Query(
+        default=None,
+        description="Specify a mod or mod combination",
+    ),
+) -> dict[str, str]:
+    """
+    Query parameters:
+    - k (str): API Key (Required).
+    - b (int): The beatmap ID in which the replay was played.
+    - u (str): The user that has played the beatmap.
+    - m (int, optional): Gamemode integer. Defaults to 0.
+    - s (int, optional): Score ID to retrieve the replay data for, b and u are ignored if given.
+    - type (str, optional): Specifies if 'u' is a User ID or a username.
+    - mods (int, optional): Mod combination of the score.
+
+    More info: https://github.com/ppy/osu-api/wiki#apiget_replay
+    """
+    score_id = s
+
+    if score_id is None:
+        if b is None or u is None or not u.isdigit():
+            return {"error": "Replay not available."}
+
+        _map = await maps.fetch_one(id=b)
+        if isinstance(_map, ServiceError):
+            return {"error": "Replay not available."}
+
+        _scores = await scores.fetch_many(
+            map_md5=_map["md5"],
+            user_id=int(u),
+            mode=m,
+            score_statuses=[SubmissionStatus.BEST],
+            sort_by="score",
+        )
+        if isinstance(_scores, ServiceError):
+            return {"error": "Replay not available."}
+
+        score_id = next(
+            (score["id"] for score in _scores if mods is None or score["mods"] == mods),
+            None,
+        )
+        if score_id is None:
+            return {"error": "Replay not available."}
+
+    replay = await replays.get_replay(score_id)
+
+    if replay is None:
+        return {"error": "Replay not available."}
+
+    return {
+        "content": base64.b64encode(replay).decode(),
+        "encoding": "base64",
+    }
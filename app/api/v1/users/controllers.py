@@ -4,13 +4,14 @@ from datetime import datetime
 from datetime import timezone
 from typing import Any
 
+from api.v1.users.models import RecentScore
 from api.v1.users.models import User
-from common import clients
 from common import utils
 from errors import ServiceError
 from fastapi import APIRouter
 from fastapi import Query
-from services import stats
+from services import profiles
+from services import recent
 from services import users
 
 router = APIRouter()
@@ -55,26 +56,18 @@ async def get_user(
     is_user_id = type == "u" or (isinstance(u, str) and u.isdigit())
 
     if is_user_id:
-        user = await users.fetch_by_user_id(id=int(u))
+        profile = await profiles.fetch_one(mode=m, user_id=int(u))
     else:
-        user = await users.fetch_by_username(username=u)
+        profile = await profiles.fetch_one(mode=m, username=u)
 
-    if isinstance(user, ServiceError):
+    if isinstance(profile, ServiceError):
         return {}
 
-    user_stats = await stats.fetch_one(user_id=user["id"], mode=m)
-    # TODO: fix crash when the user never played in the specified mode
-    global_rank = await clients.redis.zrevrank(
-        f"bancho:leaderboard:{m}",
-        user["id"],
-    )
-    country_rank = await clients.redis.zrevrank(
-        f"bancho:leaderboard:{m}:{user['country']}",
-        user["id"],
-    )
-
-    if isinstance(user_stats, ServiceError):
-        return {}
+    user = profile["user"]
+    user_stats = profile["stats"]
+    # unranked users are reported with a rank of 0
+    global_rank = profile["global_rank"]
+    country_rank = profile["country_rank"]
 
     return User.model_validate(
         {
@@ -92,7 +85,7 @@ async def get_user(
             "playcount": user_stats["plays"],
             "ranked_score": user_stats["rscore"],
             "total_score": user_stats["tscore"],
-            "pp_rank": global_rank + 1,
+            "pp_rank": global_rank + 1 if global_rank is not None else 0,
             "level": utils.get_level(user_stats["tscore"]),
             "pp_raw": user_stats["pp"],
             "accuracy": user_stats["acc"],
@@ -103,7 +96,83 @@ async def get_user(
             "count_rank_a": user_stats["a_count"],
             "country": user["country"].upper(),
             "total_seconds_played": user_stats["playtime"],
-            "pp_country_rank": country_rank + 1,
+            "pp_country_rank": country_rank + 1 if country_rank is not None else 0,
             "events": [],  # TODO: to be implemented
         },
     )
+
+
+@router.get("/api/get_user_recent")
+async def get_user_recent(
+    k: str,
+    u: str,
+    m: int = Query(
+        default=0,
+        description="Gamemode integer (0 = osu!, 1 = osu!taiko, 2 = osu!catch, 3 = osu!mania)",
+    ),
+    limit: int = Query(
+        default=10,
+        ge=1,
+        le=50,
+        description="Amount of results (1-50)",
+    ),
+    type: str | None = Query(
+        default=None,
+        description="Specify if 'u' is a User ID ('id') or a username ('string')",
+    ),
+) -> list[RecentScore]:
+    """
+    Query parameters:
+    - k (str): API Key (Required).
+    - u (str): User ID or username (Required).
+    - m (int, optional): Gamemode integer. Defaults to 0.
+    - limit (int, optional): Amount of results, from 1 to 50. Defaults to 10.
+    - type (str, optional): Specifies if 'u' is a User ID or a username.
+      - "string" for usernames
+      - "id" for user IDs
+      - Defaults to automatic recognition.
+
+    More info: https://github.com/ppy/osu-api/wiki#apiget_user_recent
+    """
+    is_user_id = type == "id" or (type is None and u.isdigit())
+
+    if is_user_id:
+        user = await users.fetch_by_user_id(id=int(u))
+    else:
+        user = await users.fetch_by_username(username=u)
+
+    if isinstance(user, ServiceError):
+        return []
+
+    _scores = await recent.fetch_recent(
+        user_id=user["id"],
+        mode=m,
+        include_fails=True,
+        page_size=limit,
+    )
+
+    if isinstance(_scores, ServiceError):
+        return []
+
+    return [
+        RecentScore.model_validate(
+            {
+                "beatmap_id": score["beatmap_id"],
+                "score_id": score["id"],
+                "score": score["score"],
+                "maxcombo": score["max_combo"],
+                "count50": score["n50"],
+                "count100": score["n100"],
+                "count300": score["n300"],
+                "countmiss": score["nmiss"],
+                "countkatu": score["nkatu"],
+                "countgeki": score["ngeki"],
+                "perfect": int(score["perfect"]),
+                "enabled_mods": score["mods"],
+                "user_id": score["userid"],
+                "date": score["play_time"].strftime("%Y-%m-%d %H:%M:%S"),
+                "rank": score["grade"],
+            },
+        )
+        for score in _scores
+    ]
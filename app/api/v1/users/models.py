@@ -28,3 +28,21 @@ class User(BaseModel):
     total_seconds_played: int
     pp_country_rank: int
     events: list[Any]
+
+
+class RecentScore(BaseModel):
+    beatmap_id: int
+    score_id: int
+    score: int
+    maxcombo: int
+    count50: int
+    count100: int
+    count300: int
+    countmiss: int
+    countkatu: int
+    countgeki: int
+    perfect: int
+    enabled_mods: int
+    user_id: int
+    date: str
+    rank: str
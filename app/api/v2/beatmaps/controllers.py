@@ -1,18 +1,28 @@
 from __future__ import annotations
 
+import asyncio
 from typing import Any
+from typing import Literal
 
-from api.v2.beatmaps.models import BeatmapScore
+from api.v2.beatmaps.models import BeatmapAttributes
+from api.v2.beatmaps.models import BeatmapAttributesRequest
 from api.v2.beatmaps.models import Mod
-from api.v2.beatmaps.models import Score
+from api.v2.beatmaps.models import PerformanceRequest
+from api.v2.beatmaps.models import PerformanceResults
+from api.v2.scores import serializers
 from common import logger
 from common import utils
+from common.difficulty import Play
 from common.mods import Mods
 from common.utils import GameMode
 from common.utils import SubmissionStatus
 from errors import ServiceError
 from fastapi import APIRouter
 from fastapi import Query
+from fastapi import Response
+from fastapi import status
+from services import difficulty
+from services import leaderboards
 from services import maps
 from services import scores
 
@@ -35,7 +45,7 @@ async def fetch_user_beatmap_scores(
         default=None,
         description="The 'Ruleset' to get scores for. Defaults to beatmap ruleset.",
     ),
-) -> Score | dict[str, list[dict[str, Any]] | str]:
+) -> Response:
     """
     Fetch beatmap scores for a specific user from the osu! API.
 
@@ -53,9 +63,11 @@ async def fetch_user_beatmap_scores(
     _map = await maps.fetch_one(id=beatmap)
 
     if isinstance(_map, ServiceError):
-        return {
-            "error": "Specified beatmap difficulty couldn't be found.",
-        }
+        return serializers.render(
+            {
+                "error": "Specified beatmap difficulty couldn't be found.",
+            },
+        )
 
     _scores = await scores.fetch_many(
         map_md5=_map["md5"],
@@ -69,60 +81,17 @@ async def fetch_user_beatmap_scores(
     )
 
     if isinstance(_scores, ServiceError):
-        return {
-            "scores:": [],
-        }
-
-    validated_scores = [
-        Score.model_validate(
+        return serializers.render(
             {
-                "accuracy": score["acc"] / 100,
-                "best_id": score["id"],
-                "created_at": score["play_time"].strftime("%Y-%m-%dT%H:%M:%SZ"),
-                "ended_at": score["play_time"].strftime("%Y-%m-%dT%H:%M:%SZ"),
-                "id": score["id"],
-                "max_combo": score["max_combo"],
-                "mode": repr(GameMode(score["mode"])),
-                "ruleset_id": repr(GameMode(score["mode"])),
-                "mode_int": score["mode"],
-                "mods": Mods.to_array(score["mods"]),
-                "passed": True,  # this should be true for all scores because of the filter applied previously
-                "perfect": bool(score["perfect"]),
-                "pp": score["pp"],
-                "rank": score["grade"],
-                "replay": False,  # TODO: add .env with BANCHO_PY_PATH to search for replays
-                "score": score["score"],
-                "classic_total_score": score["score"],
-                "total_score": score["score"],
-                "statistics": {
-                    "count_100": score["n100"],
-                    "count_300": score["n300"],
-                    "count_50": score["n50"],
-                    "count_geki": score["ngeki"],
-                    "count_katu": score["nkatu"],
-                    "count_miss": score["nmiss"],
-                },
-                "maximum_statistics": {
-                    "count_100": 0,
-                    "count_300": 0,
-                    "count_50": 0,
-                    "count_geki": 0,
-                    "count_katu": 0,
-                    "count_miss": 0,
-                },
-                "type": "score_best_osu",  # TODO: to be implemented
-                "user_id": score["userid"],
-                "current_user_attributes": {
-                    "pin": None,
-                },
+                "scores": [],
             },
         )
-        for score in _scores
-    ]
 
-    return {
-        "scores": [score.model_dump() for score in validated_scores],
-    }
+    return serializers.render(
+        {
+            "scores": await serializers.encode_scores(_scores),
+        },
+    )
 
 
 @router.get("/api/v2/beatmaps/{beatmap}/scores")
@@ -138,12 +107,94 @@ async def fetch_beatmap_scores(
     mods: list[Mod] | None = Query(
         default=None,
         description="List of mods to filter by.",
-    ),  # TODO: to be implemented
+    ),
+    mods_match: Literal["exact", "include"] = Query(
+        default="exact",
+        description="Whether scores must have exactly the given mods, or at least them.",
+    ),
     type: str | None = Query(
         default=None,
         description="Beatmap score ranking type",
     ),  # unused for now
-) -> BeatmapScore | dict[str, list[dict[str, Any]] | str]:
+) -> Response:
+    _map = await maps.fetch_one(id=beatmap)
+
+    if isinstance(_map, ServiceError):
+        return serializers.render(
+            {
+                "error": "Specified beatmap difficulty couldn't be found.",
+            },
+        )
+
+    mode_int = GameMode.from_string(mode) if mode is not None else _map["mode"]
+
+    mods_value = Mods.from_array(list(mods)) if mods else None
+    exact_mods = mods_value if mods_match == "exact" else None
+    included_mods = mods_value if mods_match == "include" else None
+
+    if type in (None, "global"):
+        scores_task = leaderboards.fetch_leaderboard(
+            md5=_map["md5"],
+            mode=mode_int,
+            mods=exact_mods,
+            mods_include=included_mods,
+        )
+    else:
+        scores_task = scores.fetch_many(
+            map_md5=_map["md5"],
+            mode=mode_int,
+            score_statuses=leaderboards.LEADERBOARD_STATUSES,
+            sort_by="score",
+            page_size=leaderboards.LEADERBOARD_SIZE,
+            mods=exact_mods,
+            mods_include=included_mods,
+        )
+
+    _scores, score_count = await asyncio.gather(
+        scores_task,
+        leaderboards.fetch_score_count(
+            md5=_map["md5"],
+            mode=mode_int,
+            mods=exact_mods,
+            mods_include=included_mods,
+        ),
+    )
+
+    if isinstance(_scores, ServiceError):
+        return serializers.render(
+            {
+                "scores": [],
+            },
+        )
+
+    return serializers.render(
+        {
+            "score_count": score_count if isinstance(score_count, int) else 0,
+            "scores": await serializers.encode_scores(_scores),
+        },
+    )
+
+
+@router.post("/api/v2/beatmaps/{beatmap}/attributes")
+async def fetch_beatmap_attributes(
+    beatmap: int,
+    response: Response,
+    body: BeatmapAttributesRequest | None = None,
+) -> BeatmapAttributes | dict[str, str]:
+    """
+    Returns difficulty attributes of beatmap with specific mode and mods combination.
+
+    Parameters:
+        beatmap (int): Beatmap id.
+
+    Request body:
+        mods (int | list[str], optional): Mod combination, as a bitset or as acronyms. Defaults to no mods.
+        ruleset (str, optional): Ruleset of the difficulty attributes. Defaults to the beatmap ruleset,
+            osu!standard beatmaps can be converted to any ruleset.
+        ruleset_id (int, optional): Same as ruleset, as an id. Takes precedence over ruleset.
+
+    More info: https://osu.ppy.sh/docs/index.html#get-beatmap-attributes
+    """
     _map = await maps.fetch_one(id=beatmap)
 
     if isinstance(_map, ServiceError):
@@ -151,67 +202,90 @@ async def fetch_beatmap_scores(
             "error": "Specified beatmap difficulty couldn't be found.",
         }
 
-    _scores = await scores.fetch_many(
-        map_md5=_map["md5"],
-        mode=(GameMode.from_string(mode) if mode is not None else _map["mode"]),
-        score_statuses=[SubmissionStatus.SUBMITTED, SubmissionStatus.BEST],
-        sort_by="score",
-        # TODO: pass mods as a parameter
-    )
+    mods = body.mods if body is not None else None
+    if isinstance(mods, list):
+        mods = Mods.from_array(list(mods))
 
-    if isinstance(_scores, ServiceError):
+    mode = None
+    if body is not None and body.ruleset_id is not None:
+        mode = body.ruleset_id
+    elif body is not None and body.ruleset is not None:
+        mode = GameMode.from_string(body.ruleset)
+
+    attributes = await difficulty.fetch_attributes(_map, mods or 0, mode)
+
+    if attributes is ServiceError.MAPS_UNSUPPORTED_MODE:
+        response.status_code = status.HTTP_400_BAD_REQUEST
         return {
-            "scores:": [],
+            "error": "This beatmap can't be played in the specified ruleset.",
         }
 
-    return BeatmapScore.model_validate(
-        {
-            "score_count": 0,  # TODO: to be implemented
-            "scores": [
-                Score.model_validate(
-                    {
-                        "accuracy": score["acc"] / 100,
-                        "best_id": score["id"],
-                        "created_at": score["play_time"].strftime("%Y-%m-%dT%H:%M:%SZ"),
-                        "ended_at": score["play_time"].strftime("%Y-%m-%dT%H:%M:%SZ"),
-                        "id": score["id"],
-                        "max_combo": score["max_combo"],
-                        "mode": repr(GameMode(score["mode"])),
-                        "ruleset_id": repr(GameMode(score["mode"])),
-                        "mode_int": score["mode"],
-                        "mods": Mods.to_array(score["mods"]),
-                        "passed": True,  # this should be true for all scores because of the filter applied previously
-                        "perfect": bool(score["perfect"]),
-                        "pp": score["pp"],
-                        "rank": score["grade"],
-                        "replay": False,  # TODO: add .env with BANCHO_PY_PATH to search for replays
-                        "score": score["score"],
-                        "classic_total_score": score["score"],
-                        "total_score": score["score"],
-                        "statistics": {
-                            "count_100": score["n100"],
-                            "count_300": score["n300"],
-                            "count_50": score["n50"],
-                            "count_geki": score["ngeki"],
-                            "count_katu": score["nkatu"],
-                            "count_miss": score["nmiss"],
-                        },
-                        "maximum_statistics": {
-                            "count_100": 0,
-                            "count_300": 0,
-                            "count_50": 0,
-                            "count_geki": 0,
-                            "count_katu": 0,
-                            "count_miss": 0,
-                        },
-                        "type": "score_best_osu",  # TODO: to be implemented
-                        "user_id": score["userid"],
-                        "current_user_attributes": {
-                            "pin": None,
-                        },
-                    },
-                )
-                for score in _scores
-            ],
-        },
+    if isinstance(attributes, ServiceError):
+        return {
+            "error": "Couldn't calculate the difficulty attributes of this beatmap.",
+        }
+
+    return BeatmapAttributes.model_validate({"attributes": attributes})
+
+
+@router.post("/api/v2/beatmaps/performance")
+async def calculate_performance(
+    body: PerformanceRequest,
+    response: Response,
+) -> PerformanceResults | dict[str, str]:
+    """
+    Calculate the performance of up to 1000 scores in a single request.
+
+    Request body:
+        scores (list): The scores to calculate, each with:
+            - map_md5 (str): Checksum of the beatmap.
+            - mods (int | list[str], optional): Mod combination, as a bitset or as acronyms.
+            - ruleset (str, optional): Ruleset of the score. Defaults to the beatmap ruleset,
+              osu!standard beatmaps can be converted to any ruleset.
+            - count_300, count_100, count_50, count_miss (int): Hit counts.
+            - count_geki, count_katu (int, optional): Hit counts, for osu!mania and osu!catch.
+            - max_combo (int): Max combo of the score.
+
+    Results are returned in the same order, null if a score couldn't be calculated.
+    pp_if_fc is the pp of the score with its misses turned into 300s and full combo.
+    """
+    results = await difficulty.calculate_performance(
+        [
+            (
+                score.map_md5,
+                Play(
+                    mods=(
+                        Mods.from_array(list(score.mods))
+                        if isinstance(score.mods, list)
+                        else score.mods
+                    ),
+                    n300=score.count_300,
+                    n100=score.count_100,
+                    n50=score.count_50,
+                    nmiss=score.count_miss,
+                    combo=score.max_combo,
+                    ngeki=score.count_geki,
+                    nkatu=score.count_katu,
+                    mode=(
+                        GameMode.from_string(score.ruleset)
+                        if score.ruleset is not None
+                        else None
+                    ),
+                ),
+            )
+            for score in body.scores
+        ],
     )
+
+    if results is ServiceError.MAPS_UNSUPPORTED_MODE:
+        response.status_code = status.HTTP_400_BAD_REQUEST
+        return {
+            "error": "A beatmap can't be played in the specified ruleset.",
+        }
+
+    if isinstance(results, ServiceError):
+        return {
+            "error": "Couldn't calculate the performance of these scores.",
+        }
+
+    return PerformanceResults.model_validate({"results": results})
@@ -387,3 +387,55 @@ class Score(BaseModel):
 class BeatmapScore(BaseModel):
     score_count: int
     scores: list[Score]
+
+
+class BeatmapAttributesRequest(BaseModel):
+    mods: int | list[Mod] | None = None
+    ruleset: Gamemode | None = None
+    ruleset_id: int | None = None
+
+
+class BeatmapDifficultyAttributes(BaseModel):
+    star_rating: float
+    max_combo: int
+    aim_difficulty: float | None = None
+    speed_difficulty: float | None = None
+    approach_rate: float | None = None
+    overall_difficulty: float | None = None
+    circle_size: float | None = None
+    drain_rate: float | None = None
+    speed_multiplier: float | None = None
+    count_circles: int | None = None
+    count_sliders: int | None = None
+    count_spinners: int | None = None
+
+
+class BeatmapAttributes(BaseModel):
+    attributes: BeatmapDifficultyAttributes
+
+
+class PerformanceRequestScore(BaseModel):
+    map_md5: str
+    mods: int | list[Mod] = 0
+    ruleset: Gamemode | None = None
+    count_300: int = Field(ge=0)
+    count_100: int = Field(ge=0)
+    count_50: int = Field(ge=0)
+    count_miss: int = Field(ge=0)
+    count_geki: int = Field(default=0, ge=0)
+    count_katu: int = Field(default=0, ge=0)
+    max_combo: int = Field(ge=0)
+
+
+class PerformanceRequest(BaseModel):
+    scores: list[PerformanceRequestScore] = Field(max_length=1000)
+
+
+class PerformanceAttributes(BaseModel):
+    pp: float
+    pp_if_fc: float
+    star_rating: float
+
+
+class PerformanceResults(BaseModel):
+    results: list[PerformanceAttributes | None]
@@ -5,6 +5,7 @@ from typing import Any
 
 from api.v2.beatmaps.models import Beatmapset
 from api.v2.users.models import User
+from common import beatmap_metadata
 from common import settings
 from common import utils
 from common.utils import GameMode
@@ -35,6 +36,10 @@ async def fetch_beatmapset(
     if isinstance(_maps, ServiceError):
         return {}
 
+    metadata = await beatmap_metadata.fetch_many(
+        [(map["id"], map["md5"]) for map in _maps],
+    )
+
     return Beatmapset.model_validate(
         {
             "id": _maps[0]["set_id"],
@@ -109,11 +114,23 @@ async def fetch_beatmapset(
                     "cs": map["cs"],
                     "drain": map["hp"],
                     "convert": False,  # maybe make an api call to get this?
-                    "count_circles": 200,  # placeholder, idk if add this field to the db or make an api call to get this
-                    "count_sliders": 0,  # placeholder, idk if add this field to the db or make an api call to get this
-                    "count_spinners": 0,  # placeholder, idk if add this field to the db or make an api call to get this
+                    "count_circles": (
+                        metadata[map["md5"]]["count_circles"]
+                        if map["md5"] in metadata
+                        else None
+                    ),
+                    "count_sliders": (
+                        metadata[map["md5"]]["count_sliders"]
+                        if map["md5"] in metadata
+                        else None
+                    ),
+                    "count_spinners": (
+                        metadata[map["md5"]]["count_spinners"]
+                        if map["md5"] in metadata
+                        else None
+                    ),
                     "hit_length": map["total_length"],
-                    "passcount": 0,  # placeholder, idk if add this field to the db or make an api call to get this
+                    "passcount": map["passes"],
                     "playcount": map["plays"],
                 }
                 for map in _maps
@@ -137,11 +154,23 @@ async def fetch_beatmapset(
                     "cs": map["cs"],
                     "drain": map["hp"],
                     "convert": False,  # maybe make an api call to get this?
-                    "count_circles": 0,  # placeholder, idk if add this field to the db or make an api call to get this
-                    "count_sliders": 0,  # placeholder, idk if add this field to the db or make an api call to get this
-                    "count_spinners": 0,  # placeholder, idk if add this field to the db or make an api call to get this
+                    "count_circles": (
+                        metadata[map["md5"]]["count_circles"]
+                        if map["md5"] in metadata
+                        else None
+                    ),
+                    "count_sliders": (
+                        metadata[map["md5"]]["count_sliders"]
+                        if map["md5"] in metadata
+                        else None
+                    ),
+                    "count_spinners": (
+                        metadata[map["md5"]]["count_spinners"]
+                        if map["md5"] in metadata
+                        else None
+                    ),
                     "hit_length": map["total_length"],
-                    "passcount": 0,  # placeholder, idk if add this field to the db or make an api call to get this
+                    "passcount": map["passes"],
                     "playcount": map["plays"],
                 }
                 for map in _maps
@@ -1,18 +1,48 @@
 from __future__ import annotations
 
+import asyncio
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from contextlib import aclosing
+from datetime import datetime
 from typing import Any
 from typing import Literal
 
-from common import logger
-from common import utils
+import orjson
+from api.v2.scores import serializers
+from common import cursor
+from common import deadlines
+from common import replays
+from common import storage
 from common.utils import GameMode
 from errors import ServiceError
 from fastapi import APIRouter
+from fastapi import Header
 from fastapi import Query
+from fastapi import Response
+from fastapi import status
+from fastapi.responses import JSONResponse
+from fastapi.responses import StreamingResponse
+from repositories.scores import MAX_PAGE_SIZE
+from repositories.scores import Score as ScoreRow
+from services import maps
+from services import score_stream
 from services import scores
+from services import users
 
 router = APIRouter()
 
+# seconds between comments sent to idle streams, to keep proxies from closing them
+KEEPALIVE_INTERVAL = 15
+
+# exported scores are sent in chunks of about this many bytes
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# live scores whose event is kept for the streams yet to send it
+LIVE_EVENTS_CACHE_SIZE = 256
+
+_live_events: OrderedDict[int, asyncio.Task[list[bytes]]] = OrderedDict()
+
 
 @router.get("/api/v2/scores")
 async def fetch_scores(
@@ -29,7 +59,8 @@ async def fetch_scores(
     Returns all passed scores. Up to 1000 scores will be returned in order of oldest to latest.
     Most recent scores will be returned if cursor_string parameter is not specified.
 
-    Obtaining new scores that arrived after the last request can be done by passing cursor_string parameter from the previous request.
+    Obtaining new scores that arrived after the last request can be done by passing cursor_string parameter from the previous request,
+    or without polling through /api/v2/scores/stream.
 
     Query parameters:
         ruleset (str, optional): The Ruleset to get scores for.
@@ -37,6 +68,17 @@ async def fetch_scores(
 
     More info: https://osu.ppy.sh/docs/index.html#get-scores97
     """
+    position = None
+    if cursor_string is not None:
+        payload = cursor.decode(cursor_string)
+        if payload is None:
+            return {"error": "Invalid cursor_string."}
+
+        position = (
+            datetime.fromisoformat(payload["play_time"]),
+            int(payload["id"]),
+        )
+
     _scores = await scores.fetch_many(
         map_md5=None,
         user_id=None,
@@ -44,13 +86,358 @@ async def fetch_scores(
         score_statuses=None,
         map_statuses=None,
         sort_by="play_time",
-        order="asc",
+        # without a cursor we seek backwards from the latest score
+        order="asc" if position is not None else "desc",
         page=None,
-        page_size=None,
+        page_size=MAX_PAGE_SIZE,
+        cursor=position,
     )
 
     if isinstance(_scores, ServiceError):
-        return []
+        return {"scores": [], "cursor_string": cursor_string}
+
+    if position is None:
+        _scores.reverse()
+
+    if _scores:
+        cursor_string = cursor.encode(
+            {
+                "play_time": _scores[-1]["play_time"].isoformat(),
+                "id": _scores[-1]["id"],
+            },
+        )
+
+    return {
+        "scores": _scores,
+        "cursor_string": cursor_string,
+    }
+
+
+async def _encode_events(_scores: list[ScoreRow]) -> list[bytes]:
+    """Encode scores as server-sent events, with the metadata of their beatmaps."""
+    events = []
+    for score, payload in zip(_scores, await serializers.encode_scores(_scores)):
+        event_id = cursor.encode(
+            {
+                "play_time": score["play_time"].isoformat(),
+                "id": score["id"],
+            },
+        )
+        data = orjson.dumps(payload)
+        events.append(b"id: " + event_id.encode() + b"\ndata: " + data + b"\n\n")
+
+    return events
+
+
+def _forget_failed_event(score_id: int, task: asyncio.Task[list[bytes]]) -> None:
+    failed = task.cancelled() or task.exception() is not None
+    if failed and _live_events.get(score_id) is task:
+        del _live_events[score_id]
+
+
+async def _encode_live_event(score: ScoreRow) -> bytes:
+    """Encode a live score as a server-sent event, once for every stream sending it."""
+    task = _live_events.get(score["id"])
+    if task is None:
+        task = asyncio.create_task(
+            _encode_events([score]),
+            context=deadlines.detached(),
+        )
+        task.add_done_callback(
+            lambda task: _forget_failed_event(score["id"], task),
+        )
+        _live_events[score["id"]] = task
+        while len(_live_events) > LIVE_EVENTS_CACHE_SIZE:
+            _live_events.popitem(last=False)
+
+    return b"".join(await deadlines.wait_shared(task))
+
+
+@router.get("/api/v2/scores/stream")
+async def stream_scores(
+    ruleset: Literal["osu", "taiko", "fruits", "mania"] | None = Query(
+        default=None,
+        description="Ruleset of the scores to be streamed.",
+    ),
+    user: int | None = Query(
+        default=None,
+        description="Only stream the scores of this user.",
+    ),
+    beatmap: int | None = Query(
+        default=None,
+        description="Only stream the scores of this beatmap.",
+    ),
+    cursor_string: str | None = Query(
+        default=None,
+        description="Cursor string to resume from, as returned by /api/v2/scores.",
+    ),
+    last_event_id: str | None = Header(default=None),
+) -> Response:
+    """
+    Streams new scores as server-sent events, as they are submitted.
+
+    Every event carries a score as its data and a cursor string as its id. Reconnecting
+    clients resume from the Last-Event-ID header (or cursor_string), receiving the
+    scores they missed before the live ones. Clients which don't keep up with the
+    stream are disconnected and are expected to reconnect.
+
+    Query parameters:
+        ruleset (str, optional): The Ruleset to stream scores for. Defaults to all of them.
+        user (int, optional): Id of the user to stream scores for.
+        beatmap (int, optional): Id of the beatmap to stream scores for.
+        cursor_string (str, optional): Position to resume from.
+    """
+    resume_from = last_event_id or cursor_string
+    position = None
+    if resume_from is not None:
+        payload = cursor.decode(resume_from)
+        if payload is None:
+            return JSONResponse(
+                content={"error": "Invalid cursor_string."},
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+
+        position = (
+            datetime.fromisoformat(payload["play_time"]),
+            int(payload["id"]),
+        )
+
+    map_md5 = None
+    if beatmap is not None:
+        _map = await maps.fetch_one(id=beatmap)
+        if isinstance(_map, ServiceError):
+            return JSONResponse(
+                content={"error": "Specified beatmap difficulty couldn't be found."},
+                status_code=status.HTTP_404_NOT_FOUND,
+            )
+
+        map_md5 = _map["md5"]
+
+    mode = GameMode.from_string(ruleset) if ruleset is not None else None
+
+    async def events() -> AsyncIterator[bytes]:
+        # subscribed once the response starts, so a request failing or dropped
+        # before that leaves nothing behind, and before catching up, so no
+        # score falls between the two
+        subscription = score_stream.stream.subscribe(
+            mode=mode,
+            user_id=user,
+            beatmap_id=beatmap,
+        )
+        try:
+            last_sent_id = 0
+            catch_up_position = position
+
+            while catch_up_position is not None:
+                _scores = await scores.fetch_many(
+                    map_md5=map_md5,
+                    user_id=user,
+                    mode=mode,
+                    sort_by="play_time",
+                    order="asc",
+                    page_size=MAX_PAGE_SIZE,
+                    cursor=catch_up_position,
+                )
+                if isinstance(_scores, ServiceError):
+                    break
+
+                for event in await _encode_events(_scores):
+                    yield event
+                for score in _scores:
+                    last_sent_id = max(last_sent_id, score["id"])
+
+                catch_up_position = (
+                    (_scores[-1]["play_time"], _scores[-1]["id"])
+                    if len(_scores) == MAX_PAGE_SIZE
+                    else None
+                )
 
-    logger.info(_scores)
-    return _scores
+            while not subscription.overflowed:
+                try:
+                    score = await asyncio.wait_for(
+                        subscription.queue.get(),
+                        timeout=KEEPALIVE_INTERVAL,
+                    )
+                except TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+
+                # already sent while catching up
+                if score["id"] <= last_sent_id:
+                    continue
+
+                yield await _encode_live_event(score)
+        finally:
+            score_stream.stream.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@router.get("/api/v2/scores/export")
+async def export_scores(
+    ruleset: Literal["osu", "taiko", "fruits", "mania"] | None = Query(
+        default=None,
+        description="Ruleset of the scores to be exported.",
+    ),
+    user: int | None = Query(
+        default=None,
+        description="Only export the scores of this user.",
+    ),
+    beatmap: int | None = Query(
+        default=None,
+        description="Only export the scores of this beatmap.",
+    ),
+    after: int = Query(
+        default=0,
+        description="Only export scores with a greater id, to resume an export.",
+    ),
+) -> Response:
+    """
+    Exports every matching score as newline delimited JSON, oldest first.
+
+    The scores are streamed from the database as they are sent, so exports of any
+    size use the same amount of memory; a dropped export can be resumed by passing
+    the id of the last score received as the after parameter. An export failing
+    midway ends with an {"error": ..., "after": ...} line before being aborted, and
+    only a few exports run at once; more are answered with a 503.
+
+    Query parameters:
+        ruleset (str, optional): The Ruleset to export scores for. Defaults to all of them.
+        user (int, optional): Id of the user to export scores for.
+        beatmap (int, optional): Id of the beatmap to export scores for.
+        after (int, optional): Id of the last score already exported.
+    """
+    map_md5 = None
+    if beatmap is not None:
+        _map = await maps.fetch_one(id=beatmap)
+        if isinstance(_map, ServiceError):
+            return JSONResponse(
+                content={"error": "Specified beatmap difficulty couldn't be found."},
+                status_code=status.HTTP_404_NOT_FOUND,
+            )
+
+        map_md5 = _map["md5"]
+
+    _scores = scores.iterate_many(
+        map_md5=map_md5,
+        user_id=user,
+        mode=GameMode.from_string(ruleset) if ruleset is not None else None,
+        after_id=after,
+    )
+    try:
+        # read upfront, so an export refused or failing right away gets an error status
+        first_score = await anext(_scores, None)
+    except Exception:
+        return JSONResponse(
+            content={"error": "Failed to export scores."},
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+    async def lines() -> AsyncIterator[bytes]:
+        chunk = bytearray()
+        last_id = after
+        score = first_score
+        try:
+            async with aclosing(_scores):
+                while score is not None:
+                    chunk += orjson.dumps(serializers.encode_score(score))
+                    chunk += b"\n"
+                    last_id = score["id"]
+
+                    if len(chunk) >= EXPORT_CHUNK_SIZE:
+                        yield bytes(chunk)
+                        chunk.clear()
+
+                    score = await anext(_scores, None)
+        except Exception:
+            # end with an error line, then abort the response, so the export doesn't look complete
+            chunk += orjson.dumps(
+                {
+                    "error": "Export interrupted, resume it after the last score.",
+                    "after": last_id,
+                },
+            )
+            chunk += b"\n"
+            yield bytes(chunk)
+            raise
+
+        if chunk:
+            yield bytes(chunk)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/api/v2/scores/{score}/download")
+async def download_score(score: int) -> Response:
+    """
+    Returns the replay of the specified score as an .osr file.
+
+    Parameters:
+        score (int): Id of the score.
+
+    More info: https://osu.ppy.sh/docs/index.html#get-apiv2scoresscoredownload
+    """
+    _score = await scores.fetch_one(id=score)
+
+    if isinstance(_score, ServiceError):
+        return JSONResponse(
+            content={"error": "Specified score couldn't be found."},
+            status_code=status.HTTP_404_NOT_FOUND,
+        )
+
+    replay = await replays.open_replay(_score["id"])
+    _user = await users.fetch_by_user_id(id=_score["userid"])
+
+    if replay is None or isinstance(_user, ServiceError):
+        if replay is not None:
+            replay.file.close()
+
+        return JSONResponse(
+            content={"error": "Replay not available."},
+            status_code=status.HTTP_404_NOT_FOUND,
+        )
+
+    header = replays.build_osr_header(
+        mode=_score["mode"],
+        map_md5=_score["map_md5"],
+        username=_user["name"],
+        n300=_score["n300"],
+        n100=_score["n100"],
+        n50=_score["n50"],
+        ngeki=_score["ngeki"],
+        nkatu=_score["nkatu"],
+        nmiss=_score["nmiss"],
+        score=_score["score"],
+        max_combo=_score["max_combo"],
+        perfect=bool(_score["perfect"]),
+        mods=_score["mods"],
+        play_time=_score["play_time"],
+        replay_md5=replay.md5,
+        replay_size=replay.size,
+    )
+    footer = replays.build_osr_footer(_score["id"])
+
+    async def content() -> AsyncIterator[bytes]:
+        try:
+            yield header
+            async for chunk in storage.read_chunks(replay.file):
+                yield chunk
+            yield footer
+        finally:
+            replay.file.close()
+
+    return StreamingResponse(
+        content(),
+        media_type="application/x-osu-replay",
+        headers={
+            "Content-Disposition": f'attachment; filename="{_score["id"]}.osr"',
+            "Content-Length": str(len(header) + replay.size + len(footer)),
+        },
+    )
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import functools
+from typing import Any
+
+from api.v2.beatmaps.models import CurrentUserAttributes
+from api.v2.beatmaps.models import Score
+from api.v2.beatmaps.models import ScoreStatistics
+from api.v2.beatmaps.models import ScoreType
+from common import beatmap_metadata
+from common import replays
+from common.beatmap_metadata import BeatmapMetadata
+from common.mods import Mods
+from common.utils import GameMode
+from common.utils import SubmissionStatus
+from fastapi.responses import ORJSONResponse
+from repositories.scores import Score as ScoreRow
+
+# parts of the payload which never change between scores are built only once
+_SCORE_TEMPLATE: dict[str, Any] = {
+    name: field.default if not field.is_required() else None
+    for name, field in Score.model_fields.items()
+}
+_CURRENT_USER_ATTRIBUTES = CurrentUserAttributes().model_dump()
+_MAXIMUM_STATISTICS = ScoreStatistics(
+    count_miss=0,
+    count_50=0,
+    count_100=0,
+    count_300=0,
+    count_geki=0,
+    count_katu=0,
+).model_dump()
+_MODE_NAMES = [repr(mode) for mode in GameMode]
+
+
+def _maximum_statistics(
+    mode: int,
+    metadata: BeatmapMetadata | None,
+) -> dict[str, Any]:
+    if metadata is None:
+        return _MAXIMUM_STATISTICS
+
+    if mode == GameMode.OSU:
+        count_300 = (
+            metadata["count_circles"]
+            + metadata["count_sliders"]
+            + metadata["count_spinners"]
+        )
+        return _MAXIMUM_STATISTICS | {"count_300": count_300}
+
+    if mode == GameMode.TAIKO:
+        # only notes are judged, drum rolls and swells are bonus objects
+        return _MAXIMUM_STATISTICS | {"count_300": metadata["count_circles"]}
+
+    if mode == GameMode.MANIA:
+        # every note and hold note can be judged as a MAX (geki)
+        count_geki = metadata["count_circles"] + metadata["count_sliders"]
+        return _MAXIMUM_STATISTICS | {"count_geki": count_geki}
+
+    # TODO: catch needs the slider droplets, which we don't parse yet
+    return _MAXIMUM_STATISTICS
+
+
+@functools.cache
+def _mods_to_array(mods: int) -> tuple[str, ...]:
+    return tuple(Mods.to_array(mods))
+
+
+def encode_score(
+    score: ScoreRow,
+    type: ScoreType = "score_best_osu",
+    metadata: BeatmapMetadata | None = None,
+) -> dict[str, Any]:
+    """
+    Turn a score row into the `Score` payload, skipping pydantic validation.
+
+    The output has the same shape as `Score.model_validate(...).model_dump()`.
+    `metadata` of the score's beatmap is used to fill `maximum_statistics`.
+    """
+    play_time = score["play_time"].strftime("%Y-%m-%dT%H:%M:%S+00:00")
+    mode = _MODE_NAMES[score["mode"]]
+
+    return _SCORE_TEMPLATE | {
+        "id": score["id"],
+        "best_id": score["id"],
+        "user_id": score["userid"],
+        "accuracy": score["acc"] / 100,
+        "max_combo": score["max_combo"],
+        "statistics": {
+            "count_miss": score["nmiss"],
+            "count_50": score["n50"],
+            "count_100": score["n100"],
+            "count_300": score["n300"],
+            "count_geki": score["ngeki"],
+            "count_katu": score["nkatu"],
+            "count_large_tick_miss": None,
+            "count_slider_tail_hit": None,
+        },
+        "pp": score["pp"],
+        "rank": score["grade"],
+        "passed": score["status"] != SubmissionStatus.FAILED,
+        "current_user_attributes": _CURRENT_USER_ATTRIBUTES,
+        "classic_total_score": score["score"],
+        "replay": score["id"] in replays.index,
+        "maximum_statistics": _maximum_statistics(score["mode"], metadata),
+        "mods": _mods_to_array(score["mods"]),
+        "ruleset_id": mode,
+        "ended_at": play_time,
+        "beatmap_id": score["beatmap_id"],
+        "total_score": score["score"],
+        "perfect": bool(score["perfect"]),
+        "mode": mode,
+        "type": type,
+    }
+
+
+async def encode_scores(
+    scores: list[ScoreRow],
+    type: ScoreType = "score_best_osu",
+) -> list[dict[str, Any]]:
+    """Encode several scores, looking up the metadata of their beatmaps at once."""
+    metadata = await beatmap_metadata.fetch_many(
+        list(
+            {
+                (score["beatmap_id"], score["map_md5"])
+                for score in scores
+                if score["beatmap_id"] is not None
+            },
+        ),
+    )
+    return [
+        encode_score(score, type, metadata.get(score["map_md5"])) for score in scores
+    ]
+
+
+def render(content: Any) -> ORJSONResponse:
+    """Serialize already encoded content straight to JSON bytes."""
+    return ORJSONResponse(content)
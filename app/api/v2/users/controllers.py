@@ -1,27 +1,26 @@
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime
 from datetime import timezone
-from typing import Any
 from typing import Literal
 
 import pycountry
-from api.v2.beatmaps.models import Score
+from api.v2.scores import serializers
 from api.v2.users.models import Gamemode
 from api.v2.users.models import User
-from common import clients
 from common import logger
 from common import utils
-from common.mods import Mods
 from common.utils import GameMode
-from common.utils import RankedStatus
-from common.utils import SubmissionStatus
 from errors import ServiceError
 from fastapi import APIRouter
 from fastapi import Query
-from services import clans
+from fastapi import Response
+from services import firsts
+from services import profiles
+from services import recent
 from services import scores
-from services import stats
+from services import top_plays
 from services import users
 
 router = APIRouter()
@@ -59,34 +58,34 @@ async def fetch_user(
     mode_int = GameMode.from_string(mode)
 
     if search_by_id:
-        _user = await users.fetch_by_user_id(id=int(user))
+        profile = await profiles.fetch_one(mode=mode_int, user_id=int(user))
     else:
-        _user = await users.fetch_by_username(
+        profile = await profiles.fetch_one(
+            mode=mode_int,
             username=user[1:] if user.startswith("@") else user,
         )
 
-    if isinstance(_user, ServiceError):
+    if isinstance(profile, ServiceError):
         return {}
 
-    _user_stats = await stats.fetch_one(user_id=_user["id"], mode=mode_int)
-    # TODO: fix crash when the user never played in the specified mode
-    global_rank = await clients.redis.zrevrank(
-        f"bancho:leaderboard:{mode_int}",
-        _user["id"],
-    )
-    country_rank = await clients.redis.zrevrank(
-        f"bancho:leaderboard:{mode_int}:{_user['country']}",
-        _user["id"],
+    top_play_count, first_count = await asyncio.gather(
+        top_plays.fetch_count(user_id=profile["user"]["id"], mode=mode_int),
+        firsts.fetch_count(user_id=profile["user"]["id"], mode=mode_int),
     )
 
-    if isinstance(_user_stats, ServiceError):
-        return {}
+    _user = profile["user"]
+    _user_stats = profile["stats"]
+    clan = profile["clan"]
+    global_rank = (
+        profile["global_rank"] + 1 if profile["global_rank"] is not None else None
+    )
+    country_rank = (
+        profile["country_rank"] + 1 if profile["country_rank"] is not None else None
+    )
 
     country = pycountry.countries.get(alpha_2=_user["country"])
     assert country is not None
 
-    clan = await clans.fetch_one(id=_user["clan_id"])
-
     return User.model_validate(
         {
             "avatar_url": "https://osu.ppy.sh/images/layout/avatar-guest@2x.png",  # TODO: add BANCHO_PY_URL to .env and use it here
@@ -185,8 +184,12 @@ async def fetch_user(
             },
             "ranked_beatmapset_count": 0,
             "replays_watched_counts": [],
-            "scores_best_count": 0,
-            "scores_first_count": 0,
+            "scores_best_count": (
+                top_play_count if not isinstance(top_play_count, ServiceError) else 0
+            ),
+            "scores_first_count": (
+                first_count if not isinstance(first_count, ServiceError) else 0
+            ),
             "scores_pinned_count": 0,
             "scores_recent_count": 0,
             "statistics": {
@@ -198,7 +201,7 @@ async def fetch_user(
                     "current": utils.get_level(_user_stats["tscore"]),
                     "progress": 0,  # TODO: modify get_level() to include this
                 },
-                "global_rank": global_rank + 1,
+                "global_rank": global_rank,
                 "global_rank_exp": None,
                 "pp": _user_stats["pp"],
                 "pp_exp": None,
@@ -218,9 +221,9 @@ async def fetch_user(
                     "sh": _user_stats["sh_count"],
                     "a": _user_stats["a_count"],
                 },
-                "country_rank": country_rank + 1,
+                "country_rank": country_rank,
                 "rank": {
-                    "country": country_rank + 1,
+                    "country": country_rank,
                 },
             },
             "support_level": 0,
@@ -231,7 +234,7 @@ async def fetch_user(
                     "name": clan["name"],
                     "short_name": clan["tag"],
                 }
-                if not isinstance(clan, ServiceError)
+                if clan is not None
                 else None
             ),
             "user_achievements": [],
@@ -251,7 +254,7 @@ async def fetch_user_scores(
     type: Literal[
         "best",
         "recent",
-        "firsts",  # TODO: to be implemented, not currently supported unless we made a big query i think, it's better to create a new table for this
+        "firsts",
     ],
     legacy_only: bool = Query(
         default=False,
@@ -273,7 +276,7 @@ async def fetch_user_scores(
         default="0",
         description="Result offset for pagination.",
     ),
-) -> Score | dict[str, str] | list[dict[Any, Any]]:
+) -> Response:
     """
     This endpoint returns the scores of specified user.
 
@@ -301,119 +304,59 @@ async def fetch_user_scores(
     _user = await users.fetch_by_user_id(id=user)
 
     if isinstance(_user, ServiceError):
-        return {"error": ""}
+        return serializers.render({"error": ""})
 
-    type_params: dict[Literal["best", "recent", "firsts"], Any] = {
-        "best": {
-            "sort_by": "pp",
-            "score_statuses": [SubmissionStatus.BEST],
-            "map_statuses": [RankedStatus.Ranked, RankedStatus.Approved],
-        },
-        "recent": {
-            "sort_by": "play_time",
-            "score_statuses": [
-                SubmissionStatus.SUBMITTED,
-                SubmissionStatus.BEST,
-                (
-                    SubmissionStatus.FAILED
-                    if include_fails == "1"
-                    else SubmissionStatus.SUBMITTED
-                ),
-                SubmissionStatus.BEST,
-            ],
-            "map_statuses": [RankedStatus.Ranked, RankedStatus.Approved],
-        },
-        # TODO: to be implemented
-        "firsts": {
-            "sort_by": "",
-            "score_statuses": "",
-            "map_statuses": "",
-        },
-    }
+    page = int(offset) + 1
 
-    _scores = await scores.fetch_many(
-        user_id=_user["id"],
-        mode=GameMode.from_string(mode),
-        sort_by=type_params[type]["sort_by"],
-        score_statuses=type_params[type]["score_statuses"],
-        map_statuses=type_params[type]["map_statuses"],
-        page=int(offset) + 1,
-        page_size=limit,
-    )
+    if type == "firsts":
+        _scores = await firsts.fetch_many(
+            user_id=_user["id"],
+            mode=GameMode.from_string(mode),
+            page=page,
+            page_size=limit,
+        )
 
-    if isinstance(_scores, ServiceError):
-        return []
+        if isinstance(_scores, ServiceError):
+            return serializers.render([])
 
-    validated_scores = [
-        Score.model_validate(
-            {
-                "beatmap_id": score["beatmap_id"],
-                "accuracy": score["acc"] / 100,
-                "classic_total_score": score["score"],
-                "best_id": score["id"],
-                "ended_at": score["play_time"].strftime("%Y-%m-%dT%H:%M:%SZ"),
-                "id": score["id"],
-                "max_combo": score["max_combo"],
-                "mode": repr(GameMode(score["mode"])),
-                "ruleset_id": repr(GameMode(score["mode"])),
-                "mode_int": score["mode"],
-                "mods": Mods.to_array(score["mods"]),
-                "passed": False if score["status"] == SubmissionStatus.FAILED else True,
-                "perfect": bool(score["perfect"]),
-                "pp": score["pp"],
-                "rank": score["grade"],
-                "replay": False,  # TODO: add .env with BANCHO_PY_PATH to search for replays
-                "total_score": score["score"],
-                "statistics": {
-                    "count_100": score["n100"],
-                    "count_300": score["n300"],
-                    "count_50": score["n50"],
-                    "count_geki": score["ngeki"],
-                    "count_katu": score["nkatu"],
-                    "count_miss": score["nmiss"],
-                },
-                "maximum_statistics": {
-                    "count_100": 0,
-                    "count_300": 0,
-                    "count_50": 0,
-                    "count_geki": 0,
-                    "count_katu": 0,
-                    "count_miss": 0,
-                },
-                "type": "score_best_osu",  # TODO: to be implemented
-                "user_id": score["userid"],
-                "current_user_attributes": {
-                    "pin": None,
-                },
-                "daily_challenge_user_stats": {
-                    "daily_streak_best": 0,
-                    "daily_streak_current": 0,
-                    "last_update": datetime(
-                        2000,
-                        1,
-                        1,
-                        0,
-                        0,
-                        0,
-                    ),  # TODO: this is returning 2000-01-01T00:00:00Z but it should be 2000-01-01T00:00:00+00:00
-                    "last_weekly_streak": datetime(
-                        2000,
-                        1,
-                        1,
-                        0,
-                        0,
-                        0,
-                    ),  # TODO: this is returning 2000-01-01T00:00:00Z but it should be 2000-01-01T00:00:00+00:00
-                    "playcount": 0,
-                    "top_10p_placements": 0,
-                    "top_50p_placements": 0,
-                    "user_id": _user["id"],
-                    "weekly_streak_best": 0,
-                    "weekly_streak_current": 0,
-                },
-            },
+        return serializers.render(await serializers.encode_scores(_scores))
+
+    # the top plays are cached, deeper pages still go through the database
+    if type == "best" and page * limit <= top_plays.TOP_PLAYS_SIZE:
+        _top_plays = await top_plays.fetch_top_plays(
+            user_id=_user["id"],
+            mode=GameMode.from_string(mode),
         )
-        for score in _scores
-    ]
 
-    return [score.model_dump() for score in validated_scores]
+        if isinstance(_top_plays, ServiceError):
+            return serializers.render([])
+
+        return serializers.render(
+            await serializers.encode_scores(
+                _top_plays["scores"][(page - 1) * limit : page * limit],
+            ),
+        )
+
+    if type == "recent":
+        _scores = await recent.fetch_recent(
+            user_id=_user["id"],
+            mode=GameMode.from_string(mode),
+            include_fails=include_fails == "1",
+            page=page,
+            page_size=limit,
+        )
+    else:
+        _scores = await scores.fetch_many(
+            user_id=_user["id"],
+            mode=GameMode.from_string(mode),
+            sort_by="pp",
+            score_statuses=top_plays.TOP_PLAYS_SCORE_STATUSES,
+            map_statuses=top_plays.TOP_PLAYS_MAP_STATUSES,
+            page=page,
+            page_size=limit,
+        )
+
+    if isinstance(_scores, ServiceError):
+        return serializers.render([])
+
+    return serializers.render(await serializers.encode_scores(_scores))
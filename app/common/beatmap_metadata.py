@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import sqlite3
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict
+from typing import TypeVar
+
+from common import logger
+from common import osu_parser
+from common import settings
+from common import storage
+from common.cache import LRUCache
+
+T = TypeVar("T")
+
+MEMORY_CACHE_SIZE = 20_000
+MEMORY_CACHE_TTL = 24 * 60 * 60
+# missing or outdated files are retried after this many seconds
+MEMORY_CACHE_NEGATIVE_TTL = 10 * 60
+# bumped whenever the stored metadata changes, to parse every file again
+SCHEMA_VERSION = 2
+
+COLUMNS = (
+    "md5",
+    "map_id",
+    "mode",
+    "count_circles",
+    "count_sliders",
+    "count_spinners",
+    "max_combo",
+    "hp",
+    "cs",
+    "od",
+    "ar",
+    "hit_window_300",
+    "hit_window_100",
+    "hit_window_50",
+)
+
+
+class BeatmapMetadata(TypedDict):
+    md5: str
+    map_id: int
+    mode: int
+    count_circles: int
+    count_sliders: int
+    count_spinners: int
+    # only known for osu!standard and osu!taiko maps
+    max_combo: int | None
+    hp: float
+    cs: float
+    od: float
+    ar: float
+    hit_window_300: float
+    hit_window_100: float
+    hit_window_50: float
+
+
+# sqlite connections can't be shared between threads, so a single
+# thread owns the connection and serializes every access to it
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="beatmap-metadata")
+_connection: sqlite3.Connection | None = None
+_memory_cache = LRUCache(MEMORY_CACHE_SIZE)
+
+
+def _connect() -> sqlite3.Connection:
+    global _connection
+
+    if _connection is None:
+        _connection = sqlite3.connect(settings.BEATMAP_METADATA_PATH)
+        _connection.row_factory = sqlite3.Row
+        _connection.execute("PRAGMA journal_mode = WAL")
+
+        # the table only caches what's parsed from the files, so it's rebuilt on change
+        (user_version,) = _connection.execute("PRAGMA user_version").fetchone()
+        if user_version != SCHEMA_VERSION:
+            _connection.execute("DROP TABLE IF EXISTS beatmaps")
+            _connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+        _connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS beatmaps (
+                md5 TEXT PRIMARY KEY,
+                map_id INTEGER NOT NULL,
+                mode INTEGER NOT NULL,
+                count_circles INTEGER NOT NULL,
+                count_sliders INTEGER NOT NULL,
+                count_spinners INTEGER NOT NULL,
+                max_combo INTEGER,
+                hp REAL NOT NULL,
+                cs REAL NOT NULL,
+                od REAL NOT NULL,
+                ar REAL NOT NULL,
+                hit_window_300 REAL NOT NULL,
+                hit_window_100 REAL NOT NULL,
+                hit_window_50 REAL NOT NULL
+            )
+            """,
+        )
+
+    return _connection
+
+
+async def _run(func: Callable[..., T], *args: object) -> T:
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+def _select(md5s: list[str]) -> list[BeatmapMetadata]:
+    placeholders = ", ".join("?" for _ in md5s)
+    rows = _connect().execute(
+        f"SELECT {', '.join(COLUMNS)} FROM beatmaps WHERE md5 IN ({placeholders})",
+        md5s,
+    )
+    return [BeatmapMetadata(**dict(row)) for row in rows]  # type: ignore[typeddict-item]
+
+
+def _insert(metadata: list[BeatmapMetadata]) -> None:
+    connection = _connect()
+    with connection:
+        connection.executemany(
+            f"""
+            INSERT OR REPLACE INTO beatmaps ({', '.join(COLUMNS)})
+            VALUES ({', '.join(f':{column}' for column in COLUMNS)})
+            """,
+            metadata,
+        )
+
+
+def build(map_id: int, md5: str, beatmap: osu_parser.Beatmap) -> BeatmapMetadata:
+    return {
+        "md5": md5,
+        "map_id": map_id,
+        "mode": beatmap.mode,
+        "count_circles": beatmap.count_circles,
+        "count_sliders": beatmap.count_sliders,
+        "count_spinners": beatmap.count_spinners,
+        "max_combo": beatmap.max_combo,
+        "hp": beatmap.hp,
+        "cs": beatmap.cs,
+        "od": beatmap.od,
+        "ar": beatmap.approach_rate,
+        # osu!standard hit windows, in milliseconds
+        "hit_window_300": 80 - 6 * beatmap.od,
+        "hit_window_100": 140 - 8 * beatmap.od,
+        "hit_window_50": 200 - 10 * beatmap.od,
+    }
+
+
+async def _parse_file(map_id: int, md5: str) -> BeatmapMetadata | None:
+    content = await storage.get_beatmap_file(map_id)
+    if content is None:
+        return None
+
+    # the file on disk is outdated if the map was updated since it was saved
+    if hashlib.md5(content).hexdigest() != md5:
+        logger.warning(f"Beatmap file of {map_id} doesn't match md5 {md5}")
+        return None
+
+    try:
+        beatmap = await _run(osu_parser.parse, content)
+    except Exception as exc:
+        logger.error(f"Failed to parse beatmap file of {map_id}", exc_info=exc)
+        return None
+
+    return build(map_id, md5, beatmap)
+
+
+async def fetch_many(maps: list[tuple[int, str]]) -> dict[str, BeatmapMetadata]:
+    """
+    Fetch the metadata of several beatmaps, keyed by md5.
+
+    Metadata is looked up in memory, then in the sqlite index, and only parsed
+    from the .osu files when missing from both. Since entries are keyed by
+    md5, updating a beatmap makes it miss and get parsed again.
+
+    Args:
+        maps (list[tuple[int, str]]): The (map id, md5) pairs to fetch.
+
+    Returns:
+        dict[str, BeatmapMetadata]: The metadata found, missing files are omitted.
+    """
+    results: dict[str, BeatmapMetadata] = {}
+    missing: dict[str, int] = {}
+
+    for map_id, md5 in maps:
+        metadata = _memory_cache.get(md5)
+        if isinstance(metadata, dict):
+            results[md5] = metadata  # type: ignore[assignment]
+        elif metadata is not False:
+            missing[md5] = map_id
+
+    if not missing:
+        return results
+
+    try:
+        for metadata in await _run(_select, list(missing)):
+            results[metadata["md5"]] = metadata
+            _memory_cache.set(metadata["md5"], metadata, MEMORY_CACHE_TTL)
+            del missing[metadata["md5"]]
+    except sqlite3.Error as exc:
+        logger.error("Failed to read the beatmap metadata index", exc_info=exc)
+
+    parsed = []
+    for md5, metadata in zip(
+        missing,
+        await asyncio.gather(
+            *(_parse_file(map_id, md5) for md5, map_id in missing.items()),
+        ),
+    ):
+        if metadata is None:
+            _memory_cache.set(md5, False, MEMORY_CACHE_NEGATIVE_TTL)
+            continue
+
+        parsed.append(metadata)
+        results[md5] = metadata
+        _memory_cache.set(md5, metadata, MEMORY_CACHE_TTL)
+
+    if parsed:
+        try:
+            await _run(_insert, parsed)
+        except sqlite3.Error as exc:
+            logger.error("Failed to write the beatmap metadata index", exc_info=exc)
+
+    return results
+
+
+async def fetch_one(map_id: int, md5: str) -> BeatmapMetadata | None:
+    return (await fetch_many([(map_id, md5)])).get(md5)
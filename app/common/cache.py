@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import random
+import time
+import types
+import typing
+from collections import OrderedDict
+from collections.abc import Awaitable
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+from typing import ParamSpec
+from typing import TypeVar
+
+import orjson
+from adapters import admission
+from adapters.admission import OverloadedError
+from common import clients
+from common import deadlines
+from common import logger
+from errors import ServiceError
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+L1_MAX_SIZE = 10_000
+TTL_JITTER = 0.1
+
+_MISSING = object()
+
+
+@dataclass
+class CacheStats:
+    l1_hits: int = 0
+    l2_hits: int = 0
+    misses: int = 0
+
+
+class Schema:
+    """
+    Explicit JSON representation of the values cached in redis.
+
+    Compiled from the type a cached function returns: TypedDicts (only their
+    declared keys are written, and read back), lists, optionals, datetimes and
+    scalars. Anything read back which doesn't match is rejected, so entries
+    never carry more than the schema declares nor deserialize into anything
+    else.
+    """
+
+    def __init__(self, tp: Any) -> None:
+        self.dump, self.load = _compile(tp)
+
+
+def _expect(value: Any, *types_: type) -> Any:
+    if not isinstance(value, types_):
+        raise ValueError(f"Expected {types_}, got {type(value).__name__}")
+    return value
+
+
+def _compile(tp: Any) -> tuple[Callable[[Any], Any], Callable[[Any], Any]]:
+    if typing.is_typeddict(tp):
+        fields = {
+            name: _compile(field_type)
+            for name, field_type in typing.get_type_hints(tp).items()
+        }
+        return (
+            lambda value: {
+                name: dump(value[name]) for name, (dump, _) in fields.items()
+            },
+            lambda data: {
+                name: load(_expect(data, dict)[name])
+                for name, (_, load) in fields.items()
+            },
+        )
+
+    origin = typing.get_origin(tp)
+    if origin is list:
+        dump_item, load_item = _compile(typing.get_args(tp)[0])
+        return (
+            lambda value: [dump_item(item) for item in value],
+            lambda data: [load_item(item) for item in _expect(data, list)],
+        )
+
+    if origin in (typing.Union, types.UnionType):
+        args = [arg for arg in typing.get_args(tp) if arg is not type(None)]
+        if len(args) != 1:
+            raise TypeError(f"Unsupported union in a cache schema: {tp}")
+
+        dump_arg, load_arg = _compile(args[0])
+        return (
+            lambda value: dump_arg(value) if value is not None else None,
+            lambda data: load_arg(data) if data is not None else None,
+        )
+
+    # scalars are checked both ways rather than coerced, so a NULL in a column
+    # typed as non optional fails the write instead of being cached as e.g. "None"
+    if tp is datetime:
+        return (
+            lambda value: _expect(value, datetime).isoformat(),
+            lambda data: datetime.fromisoformat(_expect(data, str)),
+        )
+    if tp is bool:
+        return (
+            lambda value: bool(_expect(value, bool, int)),
+            lambda data: bool(_expect(data, bool, int)),
+        )
+    if tp is int:
+        return (
+            lambda value: _expect(value, int),
+            lambda data: _expect(data, int),
+        )
+    if tp is float:
+        return (
+            lambda value: float(_expect(value, int, float)),
+            lambda data: float(_expect(data, int, float)),
+        )
+    if tp is str:
+        return (
+            lambda value: _expect(value, str),
+            lambda data: _expect(data, str),
+        )
+
+    raise TypeError(f"Unsupported type in a cache schema: {tp}")
+
+
+class LRUCache:
+    """Bounded in-process cache, evicting the least recently used key first."""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return _MISSING
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+
+_l1 = LRUCache(L1_MAX_SIZE)
+_inflight: dict[str, asyncio.Future[Any]] = {}
+stats: dict[str, CacheStats] = {}
+
+
+def _jitter(ttl: float) -> float:
+    return ttl * random.uniform(1 - TTL_JITTER, 1 + TTL_JITTER)
+
+
+def _is_cacheable(value: Any) -> bool:
+    return value is not ServiceError.INTERNAL_SERVER_ERROR
+
+
+def _encode(schema: Schema, value: Any) -> bytes:
+    if isinstance(value, ServiceError):
+        return orjson.dumps({"error": value.value})
+
+    return orjson.dumps({"value": schema.dump(value)})
+
+
+def _decode(schema: Schema, raw: bytes) -> Any:
+    entry = _expect(orjson.loads(raw), dict)
+    if "error" in entry:
+        return ServiceError(entry["error"])
+
+    return schema.load(entry["value"])
+
+
+async def _get_l2(schema: Schema, key: str) -> tuple[Any, float]:
+    try:
+        async with clients.redis.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.pttl(key)
+            raw, pttl = await pipe.execute()
+    except Exception as exc:
+        logger.warning("Failed to read from the redis cache", exc_info=exc)
+        return _MISSING, 0
+
+    if raw is None or pttl <= 0:
+        return _MISSING, 0
+
+    try:
+        return _decode(schema, raw), pttl / 1000
+    except Exception as exc:
+        # e.g. written by a previous version of the schema, refilled on the miss
+        logger.warning("Failed to decode a redis cache entry", exc_info=exc)
+        return _MISSING, 0
+
+
+async def _set_l2(schema: Schema, key: str, value: Any, ttl: float) -> None:
+    try:
+        await clients.redis.set(key, _encode(schema, value), px=int(ttl * 1000))
+    except Exception as exc:
+        logger.warning("Failed to write to the redis cache", exc_info=exc)
+
+
+async def invalidate(key: str) -> None:
+    _l1.delete(key)
+    try:
+        await clients.redis.delete(key)
+    except Exception as exc:
+        logger.warning("Failed to invalidate the redis cache", exc_info=exc)
+
+
+def make_key(namespace: str, *parts: Any) -> str:
+    return f"tomoe:cache:{namespace}:" + ":".join(str(part) for part in parts)
+
+
+def cached(
+    namespace: str,
+    ttl: float,
+    schema: Any,
+    negative_ttl: float = 10,
+) -> Callable[[Callable[P, Awaitable[T]]], Callable[P, Awaitable[T]]]:
+    """
+    Cache-aside decorator for service functions.
+
+    Results are kept in an in-process LRU (L1) and in redis (L2), so every
+    worker shares the same L2 entries. Concurrent misses on the same key are
+    collapsed into a single call, `ServiceError.*_NOT_FOUND` results are cached
+    for `negative_ttl` seconds and internal errors are never cached.
+
+    Cached values are shared between callers and must be treated as read-only.
+    In redis they're stored as JSON following `schema`, the type of the
+    positive results; keep it to what callers are allowed to see, as every
+    process with access to redis can read it.
+
+    Args:
+        namespace (str): Prefix for the keys of this function.
+        ttl (float): Lifetime of positive results, in seconds.
+        schema (Any): Type of the positive results, compiled into a `Schema`.
+        negative_ttl (float, optional): Lifetime of not found results, in seconds.
+    """
+
+    def decorator(func: Callable[P, Awaitable[T]]) -> Callable[P, Awaitable[T]]:
+        signature = inspect.signature(func)
+        value_schema = Schema(schema)
+        func_stats = stats.setdefault(namespace, CacheStats())
+
+        async def load(
+            key: str,
+            *args: P.args,
+            **kwargs: P.kwargs,
+        ) -> tuple[T, list[OverloadedError]]:
+            value, remaining_ttl = await _get_l2(value_schema, key)
+            if value is not _MISSING:
+                func_stats.l2_hits += 1
+                _l1.set(key, value, remaining_ttl)
+                return value, []
+
+            func_stats.misses += 1
+            with admission.track_rejections() as rejections:
+                value = await func(*args, **kwargs)
+
+            if _is_cacheable(value) and not rejections:
+                entry_ttl = _jitter(
+                    negative_ttl if isinstance(value, ServiceError) else ttl,
+                )
+                _l1.set(key, value, entry_ttl)
+                await _set_l2(value_schema, key, value, entry_ttl)
+
+            return value, rejections
+
+        @functools.wraps(func)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> T:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = make_key(namespace, *bound.arguments.values())
+
+            value = _l1.get(key)
+            if value is not _MISSING:
+                func_stats.l1_hits += 1
+                return value  # type: ignore[no-any-return]
+
+            future = _inflight.get(key)
+            if future is None:
+                future = asyncio.create_task(
+                    load(key, *args, **kwargs),
+                    context=deadlines.detached(),
+                )
+                _inflight[key] = future
+                future.add_done_callback(lambda _: _inflight.pop(key, None))
+
+            value, rejections = await deadlines.wait_shared(future)
+            # the queries refused for the shared load were refused for every caller
+            admission.record_rejections(rejections)
+            return value  # type: ignore[no-any-return]
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+from typing import Any
+
+from common import settings
+
+_SIGNATURE_SIZE = 16
+
+
+def _sign(data: bytes) -> bytes:
+    return hmac.digest(
+        settings.CURSOR_SECRET.encode(),
+        data,
+        hashlib.sha256,
+    )[:_SIGNATURE_SIZE]
+
+
+def encode(payload: dict[str, Any]) -> str:
+    """
+    Encode a pagination position into an opaque, signed cursor string.
+
+    Args:
+        payload (dict[str, Any]): JSON serializable position of the last row.
+
+    Returns:
+        str: The url-safe cursor string.
+    """
+    data = json.dumps(payload, separators=(",", ":")).encode()
+    token = _sign(data) + data
+    return base64.urlsafe_b64encode(token).rstrip(b"=").decode()
+
+
+def decode(cursor_string: str) -> dict[str, Any] | None:
+    """
+    Decode a cursor string previously emitted by `encode`.
+
+    Args:
+        cursor_string (str): The cursor string sent by the client.
+
+    Returns:
+        dict[str, Any] | None: The position if the cursor is valid, None otherwise.
+    """
+    try:
+        token = base64.urlsafe_b64decode(
+            cursor_string + "=" * (-len(cursor_string) % 4),
+        )
+    except (binascii.Error, ValueError):
+        return None
+
+    signature, data = token[:_SIGNATURE_SIZE], token[_SIGNATURE_SIZE:]
+    if not hmac.compare_digest(signature, _sign(data)):
+        return None
+
+    try:
+        payload = json.loads(data)
+    except ValueError:
+        return None
+
+    return payload if isinstance(payload, dict) else None
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Hashable
+from collections.abc import Mapping
+from typing import Generic
+from typing import TypeVar
+
+from common import deadlines
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class DataLoader(Generic[K, V]):
+    """
+    Coalesces single-key lookups into batched ones.
+
+    Every key requested during the same event loop tick (or within `window`
+    seconds of the first one) is deduplicated and resolved by a single call to
+    `batch_load`, which should run one `WHERE id IN (...)` query. Results are
+    not kept once the batch has been resolved, so a loader can be shared by all
+    requests without serving stale data.
+    """
+
+    def __init__(
+        self,
+        batch_load: Callable[[list[K]], Awaitable[Mapping[K, V]]],
+        max_batch_size: int = 500,
+        window: float = 0.0,
+    ) -> None:
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self._pending: dict[K, asyncio.Future[V | None]] = {}
+        self._inflight: dict[K, asyncio.Future[V | None]] = {}
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    async def load(self, key: K) -> V | None:
+        future = self._pending.get(key) or self._inflight.get(key)
+
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+
+            if not self._pending:
+                if self.window > 0:
+                    loop.call_later(self.window, self._dispatch)
+                else:
+                    loop.call_soon(self._dispatch)
+
+            self._pending[key] = future
+
+        # bounded by the deadline of this caller alone, and not cancelled along with it
+        return await deadlines.wait_shared(future)
+
+    async def load_many(self, keys: list[K]) -> list[V | None]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self) -> None:
+        pending, self._pending = self._pending, {}
+        self._inflight |= pending
+
+        keys = list(pending)
+        for i in range(0, len(keys), self.max_batch_size):
+            batch = {key: pending[key] for key in keys[i : i + self.max_batch_size]}
+            task = asyncio.create_task(
+                self._resolve(batch),
+                context=deadlines.detached(),
+            )
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, batch: dict[K, asyncio.Future[V | None]]) -> None:
+        try:
+            results = await self.batch_load(list(batch))
+        except Exception as exc:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(exc)
+        else:
+            for key, future in batch.items():
+                if not future.done():
+                    future.set_result(results.get(key))
+        finally:
+            for key in batch:
+                self._inflight.pop(key, None)
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import asyncio
+import re
+from collections.abc import Awaitable
+from contextvars import Context
+from contextvars import ContextVar
+from typing import TypeVar
+
+import orjson
+from adapters import admission
+from common import settings
+from starlette.types import ASGIApp
+from starlette.types import Message
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+T = TypeVar("T")
+
+# event loop time by which the current request must be answered
+_DEADLINE_CONTEXT: ContextVar[float | None] = ContextVar("deadline")
+
+# streams run for as long as their client listens, so they only get cancelled on disconnect
+_UNBOUNDED_ROUTES = re.compile(r"^/api/v2/scores/(stream|export)$")
+# files can be large and are read from disk, or fetched from bancho.py
+_FILE_ROUTES = re.compile(
+    r"^(/osu/\d+|/api/get_replay|/api/v2/scores/\d+/download)$",
+)
+
+
+def remaining() -> float | None:
+    """Seconds left before the deadline of the current request, if it has one."""
+    deadline = _DEADLINE_CONTEXT.get(None)
+    if deadline is None:
+        return None
+
+    return max(deadline - asyncio.get_running_loop().time(), 0)
+
+
+def timeout() -> asyncio.Timeout:
+    """Bound a block by the deadline of the current request, raising TimeoutError past it."""
+    return asyncio.timeout_at(_DEADLINE_CONTEXT.get(None))
+
+
+def detached() -> Context:
+    """
+    An empty context, for work shared by several requests rather than done on behalf of one.
+
+    Shared work has no deadline, so a request about to run out of time doesn't
+    make it fail for the others; every request only bounds its own wait for
+    it, with `wait_shared`.
+    """
+    return Context()
+
+
+async def wait_shared(work: Awaitable[T]) -> T:
+    """
+    Wait for shared work up to the deadline of the current request, without cancelling it.
+
+    Queries of the work refused by admission control are reported as refused
+    for the current request too.
+    """
+    try:
+        async with timeout():
+            return await asyncio.shield(work)
+    except admission.OverloadedError as exc:
+        admission.record_rejections([exc])
+        raise
+
+
+def timeout_for(path: str) -> float | None:
+    if _UNBOUNDED_ROUTES.match(path):
+        return None
+
+    if _FILE_ROUTES.match(path):
+        return settings.FILE_REQUEST_DEADLINE / 1000
+
+    return settings.REQUEST_DEADLINE / 1000
+
+
+class DeadlineMiddleware:
+    """
+    Give every request a deadline, according to its route, and cancel it once its client is gone.
+
+    The deadline is carried in a context variable, which the database, redis
+    and bancho.py adapters bound their calls by. A request still running past
+    its deadline is cancelled and answered with a 504, unless its response
+    has already started; a request whose client disconnected is cancelled,
+    along with any query still in flight for it.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        messages: asyncio.Queue[Message] = asyncio.Queue()
+        response_started = False
+        response_complete = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started, response_complete
+            if message["type"] == "http.response.start":
+                response_started = True
+                # the deadline is about producing a response, not sending a large one
+                request_timeout.reschedule(None)
+            elif message["type"] == "http.response.body" and not message.get(
+                "more_body",
+                False,
+            ):
+                response_complete = True
+
+            await send(message)
+
+        budget = timeout_for(scope["path"])
+        deadline = (
+            asyncio.get_running_loop().time() + budget if budget is not None else None
+        )
+        request_timeout = asyncio.timeout_at(deadline)
+
+        token = _DEADLINE_CONTEXT.set(deadline)
+        try:
+            # the task copies the context, deadline included
+            handler = asyncio.ensure_future(
+                self.app(scope, messages.get, send_wrapper),
+            )
+        finally:
+            _DEADLINE_CONTEXT.reset(token)
+
+        async def watch_for_disconnect() -> None:
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+
+                if message["type"] == "http.disconnect":
+                    # servers also report a disconnect once the response is sent
+                    if not response_complete:
+                        handler.cancel()
+                    return
+
+        watcher = asyncio.create_task(watch_for_disconnect())
+        try:
+            async with request_timeout:
+                await handler
+        except TimeoutError:
+            if not response_started:
+                await send(
+                    {
+                        "type": "http.response.start",
+                        "status": 504,
+                        "headers": [(b"content-type", b"application/json")],
+                    },
+                )
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": orjson.dumps({"error": "Request timed out."}),
+                    },
+                )
+        except asyncio.CancelledError:
+            if not watcher.done():
+                raise  # cancelled from outside, e.g. on shutdown
+        finally:
+            watcher.cancel()
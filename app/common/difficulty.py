@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import NamedTuple
+from typing import TypedDict
+
+import rosu_pp_py as rosu
+from common.mods import Mods
+from common.utils import GameMode
+
+KEY_MODS = (
+    Mods.KEY1
+    | Mods.KEY2
+    | Mods.KEY3
+    | Mods.KEY4
+    | Mods.KEY5
+    | Mods.KEY6
+    | Mods.KEY7
+    | Mods.KEY8
+    | Mods.KEY9
+    | Mods.KEYCOOP
+)
+
+# mods which change the difficulty attributes, every other mod can be ignored
+DIFFICULTY_MODS = (
+    Mods.EASY
+    | Mods.TOUCHSCREEN
+    | Mods.HIDDEN
+    | Mods.HARDROCK
+    | Mods.DOUBLETIME
+    | Mods.RELAX
+    | Mods.HALFTIME
+    | Mods.NIGHTCORE
+    | Mods.FLASHLIGHT
+    | Mods.AUTOPILOT
+    | KEY_MODS
+)
+
+# difficulty attributes kept by each worker process, per (md5, mode, mods)
+ATTRIBUTES_CACHE_SIZE = 1024
+
+_MODES = (
+    rosu.GameMode.Osu,
+    rosu.GameMode.Taiko,
+    rosu.GameMode.Catch,
+    rosu.GameMode.Mania,
+)
+
+
+class DifficultyAttributes(TypedDict):
+    mode: int
+    star_rating: float
+    max_combo: int
+    # only calculated for osu!standard
+    aim_difficulty: float | None
+    speed_difficulty: float | None
+    approach_rate: float
+    overall_difficulty: float
+    circle_size: float
+    drain_rate: float
+    speed_multiplier: float
+    count_circles: int
+    count_sliders: int
+    count_spinners: int
+
+
+def difficulty_mods(mods: int) -> int:
+    """Reduce a mod combination to the mods affecting difficulty, NC counting as DT."""
+    mods &= DIFFICULTY_MODS
+    if mods & Mods.NIGHTCORE:
+        mods = (mods & ~Mods.NIGHTCORE) | Mods.DOUBLETIME
+
+    return mods
+
+
+def is_supported_mode(map_mode: int, mode: int) -> bool:
+    """Maps can be played in their own mode, and osu!standard maps in any mode as converts."""
+    return 0 <= mode < len(_MODES) and (mode == map_mode or map_mode == GameMode.OSU)
+
+
+_attributes_cache: OrderedDict[
+    tuple[str, int | None, int],
+    rosu.DifficultyAttributes,
+] = OrderedDict()
+
+
+def _cache_attributes(
+    key: tuple[str, int | None, int],
+    attributes: rosu.DifficultyAttributes,
+) -> None:
+    _attributes_cache[key] = attributes
+    _attributes_cache.move_to_end(key)
+    if len(_attributes_cache) > ATTRIBUTES_CACHE_SIZE:
+        _attributes_cache.popitem(last=False)
+
+
+def _load(content: bytes, mode: int | None, mods: int) -> rosu.Beatmap:
+    beatmap = rosu.Beatmap(bytes=content)
+    if mode is not None and _MODES.index(beatmap.mode) != mode:
+        # osu!mania converts depend on the key mods
+        beatmap.convert(_MODES[mode], mods)
+
+    return beatmap
+
+
+def _attributes(
+    beatmap: rosu.Beatmap,
+    mods: int,
+    attributes: rosu.DifficultyAttributes,
+) -> DifficultyAttributes:
+    builder = rosu.BeatmapAttributesBuilder(mods=mods)
+    builder.set_map(beatmap)
+    settings = builder.build()
+
+    return {
+        "mode": _MODES.index(beatmap.mode),
+        "star_rating": attributes.stars,
+        "max_combo": attributes.max_combo,
+        "aim_difficulty": attributes.aim,
+        "speed_difficulty": attributes.speed,
+        "approach_rate": settings.ar,
+        "overall_difficulty": settings.od,
+        "circle_size": settings.cs,
+        "drain_rate": settings.hp,
+        "speed_multiplier": settings.clock_rate,
+        "count_circles": beatmap.n_circles,
+        "count_sliders": beatmap.n_sliders,
+        "count_spinners": beatmap.n_spinners,
+    }
+
+
+def calculate(content: bytes, md5: str, mode: int, mods: int) -> DifficultyAttributes:
+    """
+    Calculate the difficulty attributes of an .osu file in a mode, for a mod combination.
+
+    Attributes are calculated by rosu-pp, for osu!stable scores. osu!standard
+    maps are converted when another mode is requested. They're also kept by
+    the worker, for the performance calculations of the same map and mods.
+
+    This is CPU bound and meant to run in a worker process.
+    """
+    beatmap = _load(content, mode, mods)
+    attributes = rosu.Difficulty(mods=mods, lazer=False).calculate(beatmap)
+    _cache_attributes((md5, mode, mods), attributes)
+    return _attributes(beatmap, mods, attributes)
+
+
+class Play(NamedTuple):
+    mods: int
+    n300: int
+    n100: int
+    n50: int
+    nmiss: int
+    combo: int
+    ngeki: int = 0
+    nkatu: int = 0
+    # None for the beatmap's own mode
+    mode: int | None = None
+
+
+class PerformanceAttributes(TypedDict):
+    pp: float
+    pp_if_fc: float
+    star_rating: float
+
+
+def _performance(
+    attributes: rosu.DifficultyAttributes,
+    play: Play,
+    full_combo: bool = False,
+) -> float:
+    performance = rosu.Performance(
+        mods=play.mods,
+        lazer=False,
+        n300=play.n300 + play.nmiss if full_combo else play.n300,
+        n100=play.n100,
+        n50=play.n50,
+        misses=0 if full_combo else play.nmiss,
+        n_geki=play.ngeki,
+        n_katu=play.nkatu,
+    )
+    if not full_combo:
+        # the map's max combo otherwise
+        performance.set_combo(play.combo)
+
+    return performance.calculate(attributes).pp
+
+
+def calculate_batch(
+    content: bytes,
+    md5: str,
+    plays: list[Play],
+) -> list[PerformanceAttributes]:
+    """
+    Calculate the performance of several plays on the same beatmap with rosu-pp.
+
+    The difficulty is calculated once per mode and difficulty changing mods,
+    reusing the attributes this worker calculated earlier for them, and the
+    plays then only evaluate the pp formulas. pp_if_fc is the pp of the play
+    with its misses turned into 300s and full combo.
+
+    This is CPU bound and meant to run in a worker process.
+    """
+    results: list[PerformanceAttributes] = []
+
+    for play in plays:
+        key = (md5, play.mode, difficulty_mods(play.mods))
+        attributes = _attributes_cache.get(key)
+        if attributes is None:
+            beatmap = _load(content, play.mode, key[2])
+            attributes = rosu.Difficulty(mods=key[2], lazer=False).calculate(beatmap)
+        _cache_attributes(key, attributes)
+
+        results.append(
+            {
+                "pp": _performance(attributes, play),
+                "pp_if_fc": _performance(attributes, play, full_combo=True),
+                "star_rating": attributes.stars,
+            },
+        )
+
+    return results
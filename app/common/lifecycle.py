@@ -1,26 +1,56 @@
 from __future__ import annotations
 
+import asyncio
 import base64
 import ssl
+from collections.abc import Coroutine
+from typing import Any
 
 from adapters import database
 from adapters import redis
 from common import clients
 from common import logger
+from common import replays
 from common import settings
+from services import difficulty
+from services import firsts
+from services import leaderboards
+from services import recent
+from services import score_feed
+from services import score_stream
+from services import top_plays
+
+_background_tasks: list[asyncio.Task[None]] = []
+
+
+def _start_background_task(coro: Coroutine[Any, Any, None]) -> None:
+    _background_tasks.append(asyncio.create_task(coro))
+
+
+async def _shutdown_background_tasks() -> None:
+    for task in _background_tasks:
+        task.cancel()
+
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    _background_tasks.clear()
 
 
 async def _start_database() -> None:
     logger.info("Connecting to database...")
     clients.database = database.Database(
-        read_dsn=database.dsn(
-            scheme=settings.READ_DB_SCHEME,
-            user=settings.READ_DB_USER,
-            password=settings.READ_DB_PASS,
-            host=settings.READ_DB_HOST,
-            port=settings.READ_DB_PORT,
-            database=settings.READ_DB_NAME,
-        ),
+        read_dsns=[
+            database.dsn(
+                scheme=settings.READ_DB_SCHEME,
+                user=settings.READ_DB_USER,
+                password=settings.READ_DB_PASS,
+                host=host,
+                port=int(port) if port else settings.READ_DB_PORT,
+                database=settings.READ_DB_NAME,
+            )
+            for host, _, port in (
+                read_host.partition(":") for read_host in settings.READ_DB_HOST
+            )
+        ],
         read_db_ssl=(
             ssl.create_default_context(
                 purpose=ssl.Purpose.SERVER_AUTH,
@@ -45,8 +75,18 @@ async def _start_database() -> None:
             if settings.WRITE_DB_USE_SSL
             else False
         ),
-        min_pool_size=settings.READ_DB_MIN_POOL_SIZE,
-        max_pool_size=settings.READ_DB_MAX_POOL_SIZE,
+        read_min_pool_size=settings.READ_DB_MIN_POOL_SIZE,
+        read_max_pool_size=settings.READ_DB_MAX_POOL_SIZE,
+        write_min_pool_size=settings.WRITE_DB_MIN_POOL_SIZE,
+        write_max_pool_size=settings.WRITE_DB_MAX_POOL_SIZE,
+        read_weights=settings.READ_DB_WEIGHTS or None,
+        max_replication_lag=settings.READ_DB_MAX_REPLICATION_LAG,
+        hedge_reads=settings.READ_DB_HEDGE_READS,
+        slow_query_threshold=settings.SLOW_QUERY_THRESHOLD / 1000,
+        max_queue_depth=settings.DB_MAX_QUEUE_DEPTH,
+        queue_target=settings.DB_QUEUE_TARGET / 1000,
+        queue_timeout=settings.DB_QUEUE_TIMEOUT / 1000,
+        max_streams=settings.DB_MAX_STREAMS,
     )
     await clients.database.connect()
     logger.info("Connected to database(s)")
@@ -82,13 +122,57 @@ async def _shutdown_redis() -> None:
     logger.info("Closed Redis connection")
 
 
-async def start() -> None:
-    logger.info("Starting application...")
+async def _start_replay_index() -> None:
+    logger.info("Building replay index...")
+    await replays.index.refresh()
+    _start_background_task(replays.reconcile_periodically())
+    _start_background_task(replays.check_pending_periodically())
+    logger.info(f"Built replay index ({len(replays.index)} replays)")
+
+
+def _start_score_feed() -> None:
+    # shared subscribers keep redis state up to date, once for all processes
+    score_feed.feed.subscribe(leaderboards.submit, shared=True)
+    score_feed.feed.subscribe(recent.push, shared=True)
+    score_feed.feed.subscribe(firsts.submit, shared=True)
+    score_feed.feed.subscribe(top_plays.submit, shared=True)
+    score_feed.feed.subscribe(leaderboards.invalidate_score_count)
+    score_feed.feed.subscribe(score_stream.stream.publish)
+    # every process keeps its own replay index
+    score_feed.feed.subscribe(replays.on_score)
+
+    _start_background_task(score_feed.feed.run())
+    if settings.SCORE_FEED_CHANNEL:
+        _start_background_task(
+            score_feed.listen_for_scores(settings.SCORE_FEED_CHANNEL),
+        )
+    logger.info("Started score feed")
+
+
+async def connect() -> None:
+    """Only connect the database and redis, e.g. for scripts."""
     await _start_database()
     await _start_redis()
 
 
-async def shutdown() -> None:
-    logger.info("Shutting down application...")
+async def disconnect() -> None:
     await _shutdown_database()
     await _shutdown_redis()
+
+
+async def start() -> None:
+    logger.info("Starting application...")
+    await connect()
+    await _start_replay_index()
+    _start_score_feed()
+
+
+async def shutdown() -> None:
+    logger.info("Shutting down application...")
+    await _shutdown_background_tasks()
+    try:
+        await score_feed.feed.release()
+    except Exception as exc:
+        logger.warning("Failed to release the score feed leader lock", exc_info=exc)
+    difficulty.shutdown()
+    await disconnect()
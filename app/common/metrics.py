@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import functools
+import re
+import sys
+import time
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+
+# sub-buckets per power of two, bounding the relative error of quantiles to 12.5%
+_SUB_BUCKETS = 8
+# powers of two covered, from 1 microsecond up to about 12 days
+_EXPONENTS = 40
+
+# how often the plan of a given slow query is captured again, in seconds
+SLOW_QUERY_SAMPLE_INTERVAL = 60
+
+_WHITESPACE = re.compile(r"\s+")
+# IN lists expanded by the query builder, e.g. `(:s_status_0, :s_status_1)`
+_PARAMETER_LIST = re.compile(r"\(\s*:(\w+?)_0(?:\s*,\s*:\1_\d+)*\s*\)")
+
+
+class Histogram:
+    """
+    Latency histogram with logarithmic buckets, HDR histogram style.
+
+    Every power of two (in microseconds) is split into 8 linear sub-buckets,
+    so recording is a couple of integer operations and memory is constant,
+    while quantiles stay within 12.5% of the exact value.
+    """
+
+    def __init__(self) -> None:
+        self._counts = [0] * (_EXPONENTS * _SUB_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        micros = max(int(seconds * 1_000_000), 1)
+        exponent = min(micros.bit_length() - 1, _EXPONENTS - 1)
+        sub_bucket = min(
+            ((micros - (1 << exponent)) * _SUB_BUCKETS) >> exponent,
+            _SUB_BUCKETS - 1,
+        )
+        self._counts[exponent * _SUB_BUCKETS + sub_bucket] += 1
+
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile, in seconds, as the upper bound of its bucket."""
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank and count:
+                exponent, sub_bucket = divmod(index, _SUB_BUCKETS)
+                upper_bound = (1 << exponent) * (1 + (sub_bucket + 1) / _SUB_BUCKETS)
+                return min(upper_bound / 1_000_000, self.max)
+
+        return self.max
+
+    def summary(self) -> dict[str, float]:
+        """Summarize the histogram, in milliseconds."""
+        return {
+            "mean": self.total / self.count * 1000 if self.count else 0.0,
+            "p50": self.quantile(0.5) * 1000,
+            "p95": self.quantile(0.95) * 1000,
+            "p99": self.quantile(0.99) * 1000,
+            "max": self.max * 1000,
+        }
+
+
+@dataclass
+class SlowQuerySample:
+    duration: float
+    sampled_at: float
+    plan: list[dict[str, Any]] | None = None
+
+
+@dataclass
+class QueryStats:
+    fingerprint: str
+    caller: str | None
+    calls: int = 0
+    errors: int = 0
+    rows: int = 0
+    latency: Histogram = field(default_factory=Histogram)
+    pool_wait: Histogram = field(default_factory=Histogram)
+    slow_sample: SlowQuerySample | None = None
+
+
+queries: dict[str, QueryStats] = {}
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(query: str) -> str:
+    """
+    Normalize a query into the key its metrics are aggregated under.
+
+    Whitespace is collapsed and the IN lists expanded by the query builder
+    are folded, so every list size shares one fingerprint. The result is
+    cached per query text.
+    """
+    query = _WHITESPACE.sub(" ", query).strip()
+    return _PARAMETER_LIST.sub(r"(:\1_...)", query)
+
+
+def _find_caller() -> str | None:
+    """Find the repository function which issued the query being recorded."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("repositories."):
+            return f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back  # type: ignore[assignment]
+
+    return None
+
+
+def record_query(
+    query: str,
+    duration: float,
+    rows: int = 0,
+    pool_wait: float | None = None,
+    failed: bool = False,
+) -> QueryStats:
+    key = fingerprint(query)
+
+    stats = queries.get(key)
+    if stats is None:
+        # only looked up once per query, as walking the stack isn't free
+        stats = queries[key] = QueryStats(fingerprint=key, caller=_find_caller())
+
+    stats.calls += 1
+    stats.rows += rows
+    stats.latency.record(duration)
+    if pool_wait is not None:
+        stats.pool_wait.record(pool_wait)
+    if failed:
+        stats.errors += 1
+
+    return stats
+
+
+def should_sample_slow_query(
+    stats: QueryStats,
+    duration: float,
+    threshold: float,
+) -> bool:
+    """Whether the plan of a slow query should be captured, at most once a minute per query."""
+    if duration < threshold:
+        return False
+
+    now = time.time()
+    if (
+        stats.slow_sample is not None
+        and now - stats.slow_sample.sampled_at < SLOW_QUERY_SAMPLE_INTERVAL
+    ):
+        return False
+
+    stats.slow_sample = SlowQuerySample(duration=duration, sampled_at=now)
+    return True
+
+
+def snapshot() -> list[dict[str, Any]]:
+    """Export the query metrics, the queries taking the most total time first."""
+    return [
+        {
+            "fingerprint": stats.fingerprint,
+            "caller": stats.caller,
+            "calls": stats.calls,
+            "errors": stats.errors,
+            "rows": stats.rows,
+            "total_time_ms": stats.latency.total * 1000,
+            "latency_ms": stats.latency.summary(),
+            "pool_wait_ms": stats.pool_wait.summary(),
+            "slow_sample": (
+                {
+                    "duration_ms": stats.slow_sample.duration * 1000,
+                    "sampled_at": stats.slow_sample.sampled_at,
+                    "plan": stats.slow_sample.plan,
+                }
+                if stats.slow_sample is not None
+                else None
+            ),
+        }
+        for stats in sorted(
+            queries.values(),
+            key=lambda stats: stats.latency.total,
+            reverse=True,
+        )
+    ]
@@ -54,6 +54,14 @@ class Mods(IntFlag):
 
         return mod_str
 
+    @classmethod
+    def from_array(cls, mods: list[str]) -> Mods:
+        value = cls.NOMOD
+        for mod in mods:
+            value |= modstr2mod_dict[mod.upper()]
+
+        return value
+
 
 mod2modstr_dict = {
     Mods.NOFAIL: "NF",
@@ -88,3 +96,10 @@ mod2modstr_dict = {
     Mods.KEY9: "9K",
     Mods.KEYCOOP: "CO",
 }
+
+modstr2mod_dict = {modstr: mod for mod, modstr in mod2modstr_dict.items()} | {
+    "NM": Mods.NOMOD,
+    # acronyms used by osu!api v2
+    "AT": Mods.AUTOPLAY,
+    "RD": Mods.RANDOM,
+}
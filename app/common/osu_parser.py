@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import math
+from bisect import bisect_right
+from dataclasses import dataclass
+from dataclasses import field
+from typing import NamedTuple
+
+CIRCLE = 1 << 0
+SLIDER = 1 << 1
+SPINNER = 1 << 3
+HOLD = 1 << 7
+
+
+class TimingPoint(NamedTuple):
+    time: float
+    beat_length: float
+    uninherited: bool
+
+
+class HitObject(NamedTuple):
+    x: float
+    y: float
+    time: int
+    type: int
+    slides: int = 1
+    length: float = 0.0
+    end_time: int = 0
+
+
+@dataclass
+class Beatmap:
+    """The parts of an .osu file needed for metadata and difficulty calculation."""
+
+    mode: int = 0
+    hp: float = 5.0
+    cs: float = 5.0
+    od: float = 5.0
+    ar: float | None = None
+    slider_multiplier: float = 1.4
+    slider_tick_rate: float = 1.0
+    timing_points: list[TimingPoint] = field(default_factory=list)
+    hit_objects: list[HitObject] = field(default_factory=list)
+
+    @property
+    def approach_rate(self) -> float:
+        # maps older than v8 use the overall difficulty as approach rate
+        return self.ar if self.ar is not None else self.od
+
+    @property
+    def count_circles(self) -> int:
+        return sum(1 for obj in self.hit_objects if obj.type & CIRCLE)
+
+    @property
+    def count_sliders(self) -> int:
+        return sum(1 for obj in self.hit_objects if obj.type & (SLIDER | HOLD))
+
+    @property
+    def count_spinners(self) -> int:
+        return sum(1 for obj in self.hit_objects if obj.type & SPINNER)
+
+    def _timing(self) -> tuple[list[float], list[tuple[float, float]]]:
+        """
+        Resolve the beat length and slider velocity multiplier in effect at every timing point.
+
+        Returns the times of the timing points, to bisect, along with the
+        timing in effect from each of them on.
+        """
+        times: list[float] = []
+        timings: list[tuple[float, float]] = []
+
+        beat_length = 1000.0
+        sv_multiplier = 1.0
+        for point in self.timing_points:
+            if point.uninherited:
+                beat_length = point.beat_length
+                sv_multiplier = 1.0
+            elif point.beat_length < 0:
+                sv_multiplier = min(max(-100 / point.beat_length, 0.1), 10.0)
+
+            times.append(point.time)
+            timings.append((beat_length, sv_multiplier))
+
+        return times, timings
+
+    @property
+    def max_combo(self) -> int | None:
+        """
+        Max combo of the map in its own mode, None for modes it isn't known for.
+
+        osu!standard gives combo for every object plus every slider tick, repeat
+        and tail, while osu!taiko only gives combo for hit circles. osu!catch and
+        osu!mania combo depends on how the objects are converted, so it isn't
+        computed here.
+        """
+        if self.mode == 1:
+            return self.count_circles
+
+        if self.mode != 0:
+            return None
+
+        times, timings = self._timing()
+
+        combo = 0
+        for obj in self.hit_objects:
+            if not obj.type & SLIDER:
+                combo += 1
+                continue
+
+            # objects before the first timing point use it
+            i = max(bisect_right(times, obj.time) - 1, 0)
+            _, sv_multiplier = timings[i] if timings else (1000.0, 1.0)
+            px_per_beat = self.slider_multiplier * 100 * sv_multiplier
+            tick_distance = px_per_beat / self.slider_tick_rate
+
+            # ticks in a single span, the tail isn't a tick
+            ticks = max(math.ceil(round(obj.length / tick_distance, 2)) - 1, 0)
+            combo += 1 + obj.slides * (ticks + 1)
+
+        return combo
+
+
+def _parse_hit_object(line: str) -> HitObject | None:
+    parts = line.split(",")
+    if len(parts) < 4:
+        return None
+
+    x, y, time, type = float(parts[0]), float(parts[1]), int(parts[2]), int(parts[3])
+
+    if type & SLIDER and len(parts) >= 8:
+        return HitObject(x, y, time, type, int(parts[6]), float(parts[7]))
+
+    if type & (SPINNER | HOLD) and len(parts) >= 6:
+        end_time = int(parts[5].split(":", 1)[0])
+        return HitObject(x, y, time, type, end_time=end_time)
+
+    return HitObject(x, y, time, type)
+
+
+def parse(content: bytes) -> Beatmap:
+    """
+    Parse an .osu file in a single pass, skipping the sections we don't need.
+
+    More info: https://osu.ppy.sh/wiki/en/Client/File_formats/osu_%28file_format%29
+    """
+    beatmap = Beatmap()
+    section = ""
+
+    for raw_line in content.decode("utf-8-sig", errors="replace").splitlines():
+        line = raw_line.strip()
+        if not line or line.startswith("//"):
+            continue
+
+        if line.startswith("[") and line.endswith("]"):
+            section = line[1:-1]
+            continue
+
+        try:
+            if section == "HitObjects":
+                hit_object = _parse_hit_object(line)
+                if hit_object is not None:
+                    beatmap.hit_objects.append(hit_object)
+
+            elif section == "TimingPoints":
+                parts = line.split(",")
+                uninherited = len(parts) < 7 or parts[6].strip() == "1"
+                beatmap.timing_points.append(
+                    TimingPoint(float(parts[0]), float(parts[1]), uninherited),
+                )
+
+            elif section in ("General", "Difficulty"):
+                key, _, value = line.partition(":")
+                key, value = key.strip(), value.strip()
+
+                if key == "Mode":
+                    beatmap.mode = int(value)
+                elif key == "HPDrainRate":
+                    beatmap.hp = float(value)
+                elif key == "CircleSize":
+                    beatmap.cs = float(value)
+                elif key == "OverallDifficulty":
+                    beatmap.od = float(value)
+                elif key == "ApproachRate":
+                    beatmap.ar = float(value)
+                elif key == "SliderMultiplier":
+                    beatmap.slider_multiplier = float(value)
+                elif key == "SliderTickRate":
+                    beatmap.slider_tick_rate = float(value)
+        except (ValueError, IndexError):
+            # skip malformed lines like osu! does
+            continue
+
+    beatmap.timing_points.sort(key=lambda point: point.time)
+    return beatmap
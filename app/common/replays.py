@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import asyncio
+import struct
+import time
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from io import BufferedReader
+from typing import NamedTuple
+
+from common import logger
+from common import storage
+from repositories.scores import Score
+
+# the index is kept up to date incrementally, a full rescan only reconciles it
+RECONCILE_INTERVAL = 6 * 60 * 60
+# how often new scores whose replay wasn't written yet are checked again
+PENDING_CHECK_INTERVAL = 5
+# after which a new score is assumed to have no replay, in seconds
+PENDING_TIMEOUT = 60
+# how many ids are added before they're merged into the sorted array
+MERGE_THRESHOLD = 4096
+
+_WINDOWS_EPOCH = datetime(1, 1, 1)
+
+
+class ReplayIndex:
+    """
+    Set of the score ids which have a replay on disk.
+
+    Ids are kept in a sorted array of unsigned 64-bit ints (8 bytes per
+    replay), plus a small set of ids added since, so membership checks never
+    touch the filesystem. New replays are added as their scores come through
+    the score feed, and the directory is only rescanned once in a while to
+    reconcile the index with it.
+    """
+
+    def __init__(self) -> None:
+        self._ids = array("Q")
+        self._added: set[int] = set()
+        # ids added while a rescan is in progress, which it may have missed
+        self._added_during_rescan: set[int] | None = None
+
+    def __contains__(self, score_id: int) -> bool:
+        if score_id in self._added:
+            return True
+
+        i = bisect_left(self._ids, score_id)
+        return i < len(self._ids) and self._ids[i] == score_id
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._added)
+
+    def add(self, score_id: int) -> None:
+        if score_id in self:
+            return
+
+        self._added.add(score_id)
+        if self._added_during_rescan is not None:
+            self._added_during_rescan.add(score_id)
+
+        if len(self._added) >= MERGE_THRESHOLD:
+            self._ids = array("Q", sorted((*self._ids, *self._added)))
+            self._added = set()
+
+    async def refresh(self) -> None:
+        self._added_during_rescan = set()
+        try:
+            keys = await storage.list_keys("osr", "osr")
+            ids = array("Q", sorted(int(key) for key in keys if key.isdecimal()))
+            self._ids, self._added = ids, self._added_during_rescan
+        finally:
+            self._added_during_rescan = None
+
+
+index = ReplayIndex()
+
+# score ids whose replay wasn't written yet, with when they were first checked
+_pending: dict[int, float] = {}
+
+
+async def on_score(score: Score) -> None:
+    """Score feed subscriber adding the replay of a new score to the index."""
+    if await storage.file_exists(str(score["id"]), "osr", "osr"):
+        index.add(score["id"])
+    else:
+        # bancho.py writes the replay once the score is inserted
+        _pending[score["id"]] = time.monotonic()
+
+
+async def check_pending_periodically() -> None:
+    while True:
+        await asyncio.sleep(PENDING_CHECK_INTERVAL)
+        if not _pending:
+            continue
+
+        score_ids = list(_pending)
+        try:
+            exist = await storage.files_exist(
+                [str(score_id) for score_id in score_ids],
+                "osr",
+                "osr",
+            )
+        except Exception as exc:
+            logger.error("Failed to check for new replays", exc_info=exc)
+            continue
+
+        now = time.monotonic()
+        for score_id, exists in zip(score_ids, exist):
+            if exists:
+                index.add(score_id)
+                del _pending[score_id]
+            elif now - _pending[score_id] > PENDING_TIMEOUT:
+                del _pending[score_id]
+
+
+async def reconcile_periodically() -> None:
+    while True:
+        await asyncio.sleep(RECONCILE_INTERVAL)
+        try:
+            await index.refresh()
+        except Exception as exc:
+            logger.error("Failed to reconcile the replay index", exc_info=exc)
+
+
+async def _has_replay(score_id: int) -> bool:
+    return score_id in index or await storage.file_exists(str(score_id), "osr", "osr")
+
+
+async def get_replay(score_id: int) -> bytes | None:
+    """Return the raw (lzma compressed) replay frames of a score."""
+    if not await _has_replay(score_id):
+        return None
+
+    # replays are rarely fetched twice in a row, keep them out of the memory cache
+    replay = await storage.get(str(score_id), "osr", "osr", cache=False)
+    if replay is not None:
+        index.add(score_id)
+
+    return replay
+
+
+class ReplayFile(NamedTuple):
+    file: BufferedReader
+    size: int
+    md5: str
+
+
+async def open_replay(score_id: int) -> ReplayFile | None:
+    """
+    Open the raw replay frames of a score to be streamed, the caller closes them.
+
+    The frames are hashed upfront, as the .osr header carries their md5.
+    """
+    if not await _has_replay(score_id):
+        return None
+
+    opened = await storage.open_file(storage.get_filepath(str(score_id), "osr", "osr"))
+    if opened is None:
+        return None
+
+    file, size = opened
+    try:
+        md5 = await storage.hash_file(file, "md5")
+    except BaseException:
+        file.close()
+        raise
+
+    index.add(score_id)
+    return ReplayFile(file, size, md5)
+
+
+def _write_uleb128(value: int) -> bytes:
+    buf = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            buf.append(byte | 0x80)
+        else:
+            buf.append(byte)
+            return bytes(buf)
+
+
+def _write_string(value: str) -> bytes:
+    if not value:
+        return b"\x00"
+
+    data = value.encode()
+    return b"\x0b" + _write_uleb128(len(data)) + data
+
+
+def build_osr_header(
+    *,
+    mode: int,
+    map_md5: str,
+    username: str,
+    n300: int,
+    n100: int,
+    n50: int,
+    ngeki: int,
+    nkatu: int,
+    nmiss: int,
+    score: int,
+    max_combo: int,
+    perfect: bool,
+    mods: int,
+    play_time: datetime,
+    replay_md5: str,
+    replay_size: int,
+) -> bytes:
+    """
+    Build the part of an .osr file preceding the raw replay frames stored by bancho.py.
+
+    The frames follow it, then `build_osr_footer`, so they can be streamed
+    from disk in between.
+
+    More info: https://osu.ppy.sh/wiki/en/Client/File_formats/osr_%28file_format%29
+    """
+    osu_version = int(play_time.strftime("%Y%m%d"))
+    timestamp = int((play_time - _WINDOWS_EPOCH).total_seconds() * 10_000_000)
+
+    return b"".join(
+        (
+            struct.pack("<Bi", mode, osu_version),
+            _write_string(map_md5),
+            _write_string(username),
+            _write_string(replay_md5),
+            struct.pack(
+                "<6HiHBi",
+                n300,
+                n100,
+                n50,
+                ngeki,
+                nkatu,
+                nmiss,
+                score,
+                max_combo,
+                perfect,
+                mods,
+            ),
+            _write_string(""),  # life bar graph
+            struct.pack("<qi", timestamp, replay_size),
+        ),
+    )
+
+
+def build_osr_footer(score_id: int) -> bytes:
+    return struct.pack("<q", score_id)
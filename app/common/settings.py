@@ -3,6 +3,7 @@ from __future__ import annotations
 import os
 
 from common.settings_utils import read_bool
+from common.settings_utils import read_list
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,13 +17,18 @@ APP_DEBUG = read_bool(os.environ["APP_DEBUG"])
 
 # bancho.py folder
 BANCHOPY_FOLDER = os.environ["BANCHOPY_FOLDER"]
+STORAGE_CACHE_FOLDER = os.environ["STORAGE_CACHE_FOLDER"]
+BEATMAP_METADATA_PATH = os.environ["BEATMAP_METADATA_PATH"]
 
 # domain
 DOMAIN = os.environ["DOMAIN"]
 
+# pagination
+CURSOR_SECRET = os.environ["CURSOR_SECRET"]
+
 # database
 READ_DB_SCHEME = os.environ["READ_DB_SCHEME"]
-READ_DB_HOST = os.environ["READ_DB_HOST"]
+READ_DB_HOST = read_list(os.environ["READ_DB_HOST"])
 READ_DB_PORT = int(os.environ["READ_DB_PORT"])
 READ_DB_USER = os.environ["READ_DB_USER"]
 READ_DB_PASS = os.environ["READ_DB_PASS"]
@@ -31,6 +37,17 @@ READ_DB_CA_CERT_BASE64 = os.environ["READ_DB_CA_CERT_BASE64"]
 READ_DB_MIN_POOL_SIZE = int(os.environ["READ_DB_MIN_POOL_SIZE"])
 READ_DB_MAX_POOL_SIZE = int(os.environ["READ_DB_MAX_POOL_SIZE"])
 READ_DB_USE_SSL = read_bool(os.environ["READ_DB_USE_SSL"])
+READ_DB_WEIGHTS = [int(w) for w in read_list(os.environ["READ_DB_WEIGHTS"]) if w]
+READ_DB_MAX_REPLICATION_LAG = float(os.environ["READ_DB_MAX_REPLICATION_LAG"])
+READ_DB_HEDGE_READS = read_bool(os.environ["READ_DB_HEDGE_READS"])
+
+# request deadlines, in msec
+REQUEST_DEADLINE = float(os.environ["REQUEST_DEADLINE"])
+FILE_REQUEST_DEADLINE = float(os.environ["FILE_REQUEST_DEADLINE"])
+
+# query metrics
+SLOW_QUERY_THRESHOLD = float(os.environ["SLOW_QUERY_THRESHOLD"])
+METRICS_TOKEN = os.environ["METRICS_TOKEN"]
 
 WRITE_DB_SCHEME = os.environ["WRITE_DB_SCHEME"]
 WRITE_DB_HOST = os.environ["WRITE_DB_HOST"]
@@ -43,6 +60,12 @@ WRITE_DB_MIN_POOL_SIZE = int(os.environ["WRITE_DB_MIN_POOL_SIZE"])
 WRITE_DB_MAX_POOL_SIZE = int(os.environ["WRITE_DB_MAX_POOL_SIZE"])
 WRITE_DB_USE_SSL = read_bool(os.environ["WRITE_DB_USE_SSL"])
 
+# admission control, in front of every database pool
+DB_MAX_QUEUE_DEPTH = int(os.environ["DB_MAX_QUEUE_DEPTH"])
+DB_QUEUE_TARGET = float(os.environ["DB_QUEUE_TARGET"])
+DB_QUEUE_TIMEOUT = float(os.environ["DB_QUEUE_TIMEOUT"])
+DB_MAX_STREAMS = int(os.environ["DB_MAX_STREAMS"])
+
 # redis
 REDIS_SCHEME = os.environ["REDIS_SCHEME"]
 REDIS_USER = os.environ["REDIS_USER"]
@@ -51,5 +74,9 @@ REDIS_HOST = os.environ["REDIS_HOST"]
 REDIS_PORT = int(os.environ["REDIS_PORT"])
 REDIS_DB = int(os.environ["REDIS_DB"])
 
+# score feed
+SCORE_FEED_POLL_INTERVAL = float(os.environ["SCORE_FEED_POLL_INTERVAL"])
+SCORE_FEED_CHANNEL = os.environ["SCORE_FEED_CHANNEL"]
+
 # bancho.py urls
 BANCHOPY_MAPS_BASE_URL = os.environ["BANCHOPY_MAPS_BASE_URL"]
@@ -1,27 +1,383 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from collections.abc import AsyncGenerator
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from io import BufferedReader
 from pathlib import Path
+from typing import BinaryIO
+from typing import NamedTuple
+from typing import Protocol
+from typing import TypeVar
 
 from common import logger
 from common import settings
 
+T = TypeVar("T")
+
 DATA_PATH = Path(settings.BANCHOPY_FOLDER) / ".data"
 
+MAX_WORKERS = 8
+MEMORY_CACHE_MAX_BYTES = 64 * 1024 * 1024
+MEMORY_CACHE_MAX_FILE_BYTES = 1024 * 1024
+# streamed files are read in chunks of this many bytes
+STREAM_CHUNK_SIZE = 64 * 1024
+# permissions of written files, as mkstemp creates them readable by their owner only
+FILE_MODE = 0o644
+
+
+class Version(NamedTuple):
+    """Identifies the contents of a file, as files are only ever replaced whole."""
+
+    mtime_ns: int
+    size: int
+
+    @classmethod
+    def of(cls, stat_result: os.stat_result) -> Version:
+        return cls(stat_result.st_mtime_ns, stat_result.st_size)
+
+
+class StorageBackend(Protocol):
+    """Synchronous file storage, always called from the storage thread pool."""
+
+    def stat(self, filepath: str) -> tuple[Path, os.stat_result] | None: ...
+
+    def read(self, filepath: str) -> tuple[bytes, Version] | None: ...
+
+    def write(self, filepath: str, content: bytes) -> None: ...
+
+    def remove(self, filepath: str) -> None: ...
+
+    def exists(self, filepath: str) -> bool: ...
+
+    def list(self, bucket: str) -> list[str]: ...
+
+
+def _atomic_write(
+    path: Path,
+    write: Callable[[BinaryIO], object],
+    mtime_ns: int | None = None,
+) -> None:
+    """
+    Write a file through a temporary file in the same directory, then move it in place.
 
-def get_file_content(filepath: str) -> bytes | None:
+    Readers never see partial files, and every writer gets its own temporary
+    file, so concurrent writers of the same file don't interfere.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp_name = tempfile.mkstemp(
+        dir=path.parent,
+        prefix=f".{path.name}.",
+        suffix=".tmp",
+    )
     try:
-        with open(f"{DATA_PATH}/{filepath}", "rb") as f:
-            return f.read()
+        with os.fdopen(fd, "wb") as file:
+            write(file)
+
+        os.chmod(tmp_name, FILE_MODE)
+        if mtime_ns is not None:
+            os.utime(tmp_name, ns=(mtime_ns, mtime_ns))
+
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+class LocalStorage:
+    """Files stored under a local directory."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+
+    def path(self, filepath: str) -> Path:
+        return self.root / filepath
+
+    def stat(self, filepath: str) -> tuple[Path, os.stat_result] | None:
+        path = self.path(filepath)
+        try:
+            return path, path.stat()
+        except FileNotFoundError:
+            return None
+
+    def read(self, filepath: str) -> tuple[bytes, Version] | None:
+        try:
+            with self.path(filepath).open("rb") as file:
+                # files are replaced, never modified, so this is the version read
+                return file.read(), Version.of(os.fstat(file.fileno()))
+        except FileNotFoundError:
+            return None
+
+    def write(
+        self,
+        filepath: str,
+        content: bytes,
+        mtime_ns: int | None = None,
+    ) -> None:
+        _atomic_write(self.path(filepath), lambda file: file.write(content), mtime_ns)
+
+    def remove(self, filepath: str) -> None:
+        self.path(filepath).unlink(missing_ok=True)
+
+    def exists(self, filepath: str) -> bool:
+        return self.path(filepath).is_file()
+
+    def list(self, bucket: str) -> list[str]:
+        try:
+            with os.scandir(self.path(bucket)) as entries:
+                return [entry.name for entry in entries if entry.is_file()]
+        except FileNotFoundError:
+            return []
+
+
+class TieredStorage:
+    """
+    A fast local cache (e.g. an SSD) in front of a slower storage.
+
+    Cached copies keep the mtime of their source, and are only used while
+    their mtime and size still match it, so updated files are copied again.
+    """
+
+    def __init__(self, fast: LocalStorage, slow: StorageBackend) -> None:
+        self.fast = fast
+        self.slow = slow
+
+    def _promote(self, filepath: str, src: Path, src_stat: os.stat_result) -> None:
+        def copy(file: BinaryIO) -> None:
+            with src.open("rb") as src_file:
+                shutil.copyfileobj(src_file, file)
+
+        _atomic_write(self.fast.path(filepath), copy, src_stat.st_mtime_ns)
+
+    def stat(self, filepath: str) -> tuple[Path, os.stat_result] | None:
+        slow_stat = self.slow.stat(filepath)
+        if slow_stat is None:
+            self.fast.remove(filepath)
+            return None
+
+        fast_stat = self.fast.stat(filepath)
+        if fast_stat is not None and Version.of(fast_stat[1]) == Version.of(
+            slow_stat[1],
+        ):
+            return fast_stat
+
+        try:
+            self._promote(filepath, *slow_stat)
+        except OSError as exc:
+            logger.warning(f'Failed to cache file "{filepath}": {exc}')
+            return slow_stat
+
+        return self.fast.stat(filepath)
+
+    def read(self, filepath: str) -> tuple[bytes, Version] | None:
+        slow_stat = self.slow.stat(filepath)
+        if slow_stat is None:
+            self.fast.remove(filepath)
+            return None
+
+        cached = self.fast.read(filepath)
+        if cached is not None and cached[1] == Version.of(slow_stat[1]):
+            return cached
+
+        read = self.slow.read(filepath)
+        if read is not None:
+            content, version = read
+            try:
+                self.fast.write(filepath, content, version.mtime_ns)
+            except OSError as exc:
+                logger.warning(f'Failed to cache file "{filepath}": {exc}')
+
+        return read
+
+    def write(self, filepath: str, content: bytes) -> None:
+        self.slow.write(filepath, content)
+
+        slow_stat = self.slow.stat(filepath)
+        if slow_stat is not None:
+            self.fast.write(filepath, content, slow_stat[1].st_mtime_ns)
+
+    def remove(self, filepath: str) -> None:
+        self.slow.remove(filepath)
+        self.fast.remove(filepath)
+
+    def exists(self, filepath: str) -> bool:
+        return self.fast.exists(filepath) or self.slow.exists(filepath)
+
+    def list(self, bucket: str) -> list[str]:
+        return self.slow.list(bucket)
+
+
+class CachedFile(NamedTuple):
+    content: bytes
+    version: Version
+
+
+class MemoryCache:
+    """
+    In-memory LRU of file contents, bounded by the total number of bytes.
+
+    Entries carry the version of the file they were read from, which readers
+    check against the source before using them.
+    """
+
+    def __init__(self, max_bytes: int, max_file_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, CachedFile] = OrderedDict()
+
+    def get(self, filepath: str) -> CachedFile | None:
+        cached = self._entries.get(filepath)
+        if cached is not None:
+            self._entries.move_to_end(filepath)
+
+        return cached
+
+    def set(self, filepath: str, content: bytes, version: Version) -> None:
+        self.delete(filepath)
+
+        if len(content) > self.max_file_bytes:
+            return
+
+        self._entries[filepath] = CachedFile(content, version)
+        self.size += len(content)
+
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.content)
+
+    def delete(self, filepath: str) -> None:
+        cached = self._entries.pop(filepath, None)
+        if cached is not None:
+            self.size -= len(cached.content)
+
+
+def _create_backend() -> StorageBackend:
+    local = LocalStorage(DATA_PATH)
+
+    if settings.STORAGE_CACHE_FOLDER:
+        return TieredStorage(LocalStorage(Path(settings.STORAGE_CACHE_FOLDER)), local)
+
+    return local
+
+
+backend = _create_backend()
+memory_cache = MemoryCache(MEMORY_CACHE_MAX_BYTES, MEMORY_CACHE_MAX_FILE_BYTES)
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="storage")
+
+
+async def _run(func: Callable[..., T], *args: object) -> T:
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+def get_filepath(key: str, extension: str, bucket: str) -> str:
+    return f"{bucket}/{key}.{extension}"
+
+
+async def stat(filepath: str) -> tuple[Path, os.stat_result] | None:
+    try:
+        return await _run(backend.stat, filepath)
     except Exception as e:
+        logger.error(f'Failed to stat file "{filepath}": {e}')
+        return None
+
+
+def _read_if_changed(filepath: str, cached: CachedFile | None) -> CachedFile | None:
+    """Stat the source, and only read it again if it changed since it was cached."""
+    stat_result = backend.stat(filepath)
+    if stat_result is None:
+        return None
+
+    if cached is not None and cached.version == Version.of(stat_result[1]):
+        return cached
+
+    read = backend.read(filepath)
+    if read is None:
+        return None
+
+    return CachedFile(*read)
+
+
+async def get_file_content(filepath: str, cache: bool = True) -> bytes | None:
+    cached = memory_cache.get(filepath) if cache else None
+
+    try:
+        current = await _run(_read_if_changed, filepath, cached)
+    except Exception as e:
+        logger.error(f'Failed to read file "{filepath}": {e}')
+        return None
+
+    if current is None:
+        memory_cache.delete(filepath)
         logger.error(f'The file "{filepath}" doesn\'t exist')
         return None
 
+    if cache and current is not cached:
+        memory_cache.set(filepath, current.content, current.version)
+
+    return current.content
+
+
+async def open_file(filepath: str) -> tuple[BufferedReader, int] | None:
+    """
+    Open a file to be streamed, along with its size, bypassing the memory cache.
+
+    The caller closes the file. As files are only ever replaced whole, what
+    is read through it stays consistent with the size returned.
+    """
+
+    def open_() -> tuple[BufferedReader, int] | None:
+        stat_result = backend.stat(filepath)
+        if stat_result is None:
+            return None
+
+        try:
+            file = stat_result[0].open("rb")
+        except FileNotFoundError:
+            return None
+
+        return file, os.fstat(file.fileno()).st_size
 
-def save_to_file(filepath: str, content: bytes) -> bool:
     try:
-        with open(f"{DATA_PATH}/{filepath}", "wb") as f:
-            f.write(content)
+        return await _run(open_)
+    except Exception as e:
+        logger.error(f'Failed to open file "{filepath}": {e}')
+        return None
+
+
+async def hash_file(file: BufferedReader, digest: str) -> str:
+    """Hash an open file in chunks, then rewind it."""
+
+    def hash_() -> str:
+        hexdigest = hashlib.file_digest(file, digest).hexdigest()
+        file.seek(0)
+        return hexdigest
+
+    return await _run(hash_)
+
+
+async def read_chunks(
+    file: BufferedReader,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+) -> AsyncGenerator[bytes]:
+    while chunk := await _run(file.read, chunk_size):
+        yield chunk
+
+
+async def save_to_file(filepath: str, content: bytes) -> bool:
+    # not cached here, as the version written is only known once read back
+    memory_cache.delete(filepath)
+
+    try:
+        await _run(backend.write, filepath, content)
     except Exception as e:
         logger.error(f'Failed to save file "{filepath}": {e}')
         return False
@@ -29,9 +385,11 @@ def save_to_file(filepath: str, content: bytes) -> bool:
     return True
 
 
-def remove_file(filepath: str) -> bool:
+async def remove_file(filepath: str) -> bool:
+    memory_cache.delete(filepath)
+
     try:
-        os.remove(f"{DATA_PATH}/{filepath}")
+        await _run(backend.remove, filepath)
     except Exception as e:
         logger.error(f'Failed to file "{filepath}": "{e}"')
         return False
@@ -39,13 +397,41 @@ def remove_file(filepath: str) -> bool:
     return True
 
 
-def file_exists(key: str, extension: str, bucket: str) -> bool:
-    return os.path.isfile(f"{DATA_PATH}/{bucket}/{key}.{extension}")
+async def file_exists(key: str, extension: str, bucket: str) -> bool:
+    return await _run(backend.exists, get_filepath(key, extension, bucket))
+
+
+async def files_exist(keys: list[str], extension: str, bucket: str) -> list[bool]:
+    """Check the existence of several files with a single thread pool hop."""
+
+    def check() -> list[bool]:
+        return [backend.exists(get_filepath(key, extension, bucket)) for key in keys]
+
+    return await _run(check)
+
+
+async def list_keys(extension: str, bucket: str) -> list[str]:
+    suffix = f".{extension}"
+    filenames = await _run(backend.list, bucket)
+    return [
+        filename.removesuffix(suffix)
+        for filename in filenames
+        if filename.endswith(suffix)
+    ]
+
+
+async def get(
+    key: str,
+    extension: str,
+    bucket: str,
+    cache: bool = True,
+) -> bytes | None:
+    return await get_file_content(get_filepath(key, extension, bucket), cache)
 
 
-def get(key: str, extension: str, bucket: str) -> bytes | None:
-    return get_file_content(f"{bucket}/{key}.{extension}")
+async def stat_beatmap_file(id: int) -> tuple[Path, os.stat_result] | None:
+    return await stat(get_filepath(str(id), "osu", "osu"))
 
 
-def get_beatmap_file(id: int) -> bytes | None:
-    return get(str(id), "osu", "osu")
+async def get_beatmap_file(id: int) -> bytes | None:
+    return await get(str(id), "osu", "osu")
@@ -9,5 +9,8 @@ class ServiceError(str, Enum):
     USERS_NOT_FOUND = "users.not_found"
 
     MAPS_NOT_FOUND = "maps.not_found"
+    MAPS_UNSUPPORTED_MODE = "maps.unsupported_mode"
 
     CLANS_NOT_FOUND = "clans.not_found"
+
+    SCORES_NOT_FOUND = "scores.not_found"
@@ -5,6 +5,8 @@ from typing import TypedDict
 from typing import cast
 
 from common import clients
+from repositories import query_builder
+from repositories.query_builder import Filter
 
 READ_PARAMS = """
     id,
@@ -33,3 +35,16 @@ async def fetch_one(id: int) -> Clan | None:
         values={"id": id},
     )
     return cast(Clan, clan) if clan is not None else None
+
+
+async def fetch_many_by_ids(ids: list[int]) -> list[Clan]:
+    predicates, values = query_builder.build(Filter("id", "IN", ids))
+    clans = await clients.database.fetch_all(
+        query=f"""
+            SELECT {READ_PARAMS}
+            FROM clans
+            WHERE {predicates}
+        """,
+        values=values,
+    )
+    return [cast(Clan, clan) for clan in clans]
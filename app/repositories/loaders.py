@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from collections import defaultdict
+
+from common.dataloader import DataLoader
+from repositories import clans as _clans
+from repositories import maps as _maps
+from repositories import stats as _stats
+from repositories import users as _users
+from repositories.clans import Clan
+from repositories.maps import Map
+from repositories.stats import Stat
+from repositories.users import User
+
+
+async def _load_users(ids: list[int]) -> dict[int, User]:
+    return {user["id"]: user for user in await _users.fetch_many_by_ids(ids)}
+
+
+async def _load_stats(keys: list[tuple[int, int]]) -> dict[tuple[int, int], Stat]:
+    user_ids_by_mode: dict[int, list[int]] = defaultdict(list)
+    for user_id, mode in keys:
+        user_ids_by_mode[mode].append(user_id)
+
+    results = {}
+    for mode, user_ids in user_ids_by_mode.items():
+        for stat in await _stats.fetch_many(user_ids, mode):
+            results[(stat["id"], stat["mode"])] = stat
+
+    return results
+
+
+async def _load_clans(ids: list[int]) -> dict[int, Clan]:
+    return {clan["id"]: clan for clan in await _clans.fetch_many_by_ids(ids)}
+
+
+async def _load_maps(ids: list[int]) -> dict[int, Map]:
+    return {map["id"]: map for map in await _maps.fetch_many_by_ids(ids)}
+
+
+users: DataLoader[int, User] = DataLoader(_load_users)
+stats: DataLoader[tuple[int, int], Stat] = DataLoader(_load_stats)
+clans: DataLoader[int, Clan] = DataLoader(_load_clans)
+maps: DataLoader[int, Map] = DataLoader(_load_maps)
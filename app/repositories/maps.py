@@ -5,6 +5,8 @@ from typing import TypedDict
 from typing import cast
 
 from common import clients
+from repositories import query_builder
+from repositories.query_builder import Filter
 
 READ_PARAMS = """
     id,
@@ -69,23 +71,48 @@ async def fetch_one(id: int) -> Map | None:
     return cast(Map, map) if map is not None else None
 
 
+async def fetch_many_by_ids(ids: list[int]) -> list[Map]:
+    predicates, values = query_builder.build(Filter("id", "IN", ids))
+    maps = await clients.database.fetch_all(
+        query=f"""
+            SELECT {READ_PARAMS}
+            FROM maps
+            WHERE {predicates}
+        """,
+        values=values,
+    )
+    return [cast(Map, map) for map in maps]
+
+
+async def fetch_many_by_md5s(md5s: list[str]) -> list[Map]:
+    predicates, values = query_builder.build(Filter("md5", "IN", md5s))
+    maps = await clients.database.fetch_all(
+        query=f"""
+            SELECT {READ_PARAMS}
+            FROM maps
+            WHERE {predicates}
+        """,
+        values=values,
+    )
+    return [cast(Map, map) for map in maps]
+
+
 async def fetch_many(
     server: str | None = None,
     set_id: int | None = None,
     mode: int | None = None,
 ) -> list[Map]:
+    predicates, values = query_builder.build(
+        Filter("server", "=", server),
+        Filter("set_id", "=", set_id),
+        Filter("mode", "=", mode),
+    )
     maps = await clients.database.fetch_all(
         query=f"""
             SELECT {READ_PARAMS}
             FROM maps
-            WHERE server = COALESCE(:server, server)
-            AND set_id = COALESCE(:set_id, set_id)
-            AND mode = COALESCE(:mode, mode)
+            WHERE {predicates}
         """,
-        values={
-            "server": server,
-            "set_id": set_id,
-            "mode": mode,
-        },
+        values=values,
     )
     return [cast(Map, map) for map in maps]
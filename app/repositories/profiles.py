@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from typing import Any
+from typing import TypedDict
+from typing import cast
+
+from common import clients
+from repositories import clans
+from repositories import stats
+from repositories import users
+from repositories.clans import Clan
+from repositories.stats import Stat
+from repositories.users import User
+
+
+def _columns(read_params: str) -> list[str]:
+    return [column.strip() for column in read_params.split(",")]
+
+
+USER_COLUMNS = _columns(users.READ_PARAMS)
+STATS_COLUMNS = _columns(stats.READ_PARAMS)
+CLAN_COLUMNS = _columns(clans.READ_PARAMS)
+
+READ_PARAMS = ",\n".join(
+    [f"u.{column}" for column in USER_COLUMNS]
+    + [f"st.{column} AS stats_{column}" for column in STATS_COLUMNS]
+    + [f"c.{column} AS clan_{column}" for column in CLAN_COLUMNS],
+)
+
+
+class Profile(TypedDict):
+    user: User
+    stats: Stat | None
+    clan: Clan | None
+
+
+def _split(row: dict[str, Any]) -> Profile:
+    user = {column: row[column] for column in USER_COLUMNS}
+    stat = {column: row[f"stats_{column}"] for column in STATS_COLUMNS}
+    clan = {column: row[f"clan_{column}"] for column in CLAN_COLUMNS}
+
+    return {
+        "user": cast(User, user),
+        "stats": cast(Stat, stat) if stat["id"] is not None else None,
+        "clan": cast(Clan, clan) if clan["id"] is not None else None,
+    }
+
+
+async def fetch_one(
+    mode: int,
+    user_id: int | None = None,
+    username: str | None = None,
+) -> Profile | None:
+    """
+    Fetch a user together with their stats for a mode and their clan.
+
+    Args:
+        mode (int): The mode of the stats to fetch.
+        user_id (int | None): The ID of the user to fetch.
+        username (str | None): The username of the user to fetch, used if no ID is given.
+
+    Returns:
+        Profile | None: The profile if the user was found, None otherwise.
+    """
+    if user_id is not None:
+        predicate = "u.id = :id"
+        values: dict[str, Any] = {"id": user_id}
+    elif username is not None:
+        predicate = "(u.name = :username OR u.safe_name = :safe_name)"
+        values = {"username": username, "safe_name": username.lower()}
+    else:
+        raise ValueError("Either user_id or username must be given")
+
+    row = await clients.database.fetch_one(
+        query=f"""
+            SELECT {READ_PARAMS}
+            FROM users u
+            LEFT JOIN stats st ON st.id = u.id AND st.mode = :mode
+            LEFT JOIN clans c ON c.id = u.clan_id
+            WHERE {predicate}
+        """,
+        values=values | {"mode": mode},
+    )
+    return _split(row) if row is not None else None
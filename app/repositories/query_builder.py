@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import functools
+from collections.abc import Sequence
+from typing import Any
+from typing import Literal
+from typing import NamedTuple
+
+# "&" matches rows where all the bits of the value are set in the column
+Operator = Literal["=", "IN", "&"]
+
+# (column, operator, number of values for IN lists, None for scalars)
+_Shape = tuple[tuple[str, Operator, int | None], ...]
+
+
+class Filter(NamedTuple):
+    """An optional `column <operator> value` predicate, skipped when value is None."""
+
+    column: str
+    operator: Operator
+    value: Any
+
+
+def _param_name(column: str, operator: Operator) -> str:
+    param = column.replace(".", "_")
+    # keeps bitmask filters apart from equality filters on the same column
+    return f"{param}_mask" if operator == "&" else param
+
+
+@functools.lru_cache(maxsize=512)
+def _render(shape: _Shape) -> str:
+    predicates = []
+    for column, operator, size in shape:
+        param = _param_name(column, operator)
+
+        if operator == "&":
+            predicates.append(f"({column} & :{param}) = :{param}")
+        elif size is None:
+            predicates.append(f"{column} {operator} :{param}")
+        elif size == 0:
+            # an empty IN list can never match
+            predicates.append("FALSE")
+        else:
+            placeholders = ", ".join(f":{param}_{i}" for i in range(size))
+            predicates.append(f"{column} {operator} ({placeholders})")
+
+    return " AND ".join(predicates) if predicates else "TRUE"
+
+
+def build(*filters: Filter) -> tuple[str, dict[str, Any]]:
+    """
+    Build a WHERE predicate out of the filters which were actually supplied.
+
+    Unlike `col = COALESCE(:x, col)`, the emitted SQL only mentions the columns
+    being filtered, which lets MySQL pick an index for them. The SQL text is
+    cached per filter shape (columns, operators and IN list sizes).
+
+    Args:
+        *filters (Filter): The optional filters of the query.
+
+    Returns:
+        tuple[str, dict[str, Any]]: The predicate and its bound values.
+    """
+    shape: list[tuple[str, Operator, int | None]] = []
+    values: dict[str, Any] = {}
+
+    for column, operator, value in filters:
+        if value is None:
+            continue
+
+        param = _param_name(column, operator)
+
+        if operator == "IN":
+            items: Sequence[Any] = value
+            shape.append((column, operator, len(items)))
+            values |= {f"{param}_{i}": item for i, item in enumerate(items)}
+        else:
+            shape.append((column, operator, None))
+            values[param] = value
+
+    return _render(tuple(shape)), values
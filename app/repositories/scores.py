@@ -1,12 +1,18 @@
 from __future__ import annotations
 
+from collections.abc import AsyncGenerator
+from contextlib import aclosing
 from datetime import datetime
+from typing import Any
 from typing import Literal
 from typing import TypedDict
 from typing import cast
 
 from common import clients
-from services import maps
+from repositories import query_builder
+from repositories.query_builder import Filter
+
+MAX_PAGE_SIZE = 1000
 
 READ_PARAMS = """\
     s.id,
@@ -69,6 +75,95 @@ class Score(TypedDict):
     version: str
 
 
+async def fetch_one(id: int) -> Score | None:
+    score = await clients.database.fetch_one(
+        query=f"""
+            SELECT {READ_PARAMS}
+            FROM scores s
+            LEFT JOIN maps m ON s.map_md5 = m.md5
+            WHERE s.id = :id
+        """,
+        values={"id": id},
+    )
+    return cast(Score, score) if score is not None else None
+
+
+async def fetch_many_by_ids(ids: list[int]) -> list[Score]:
+    predicates, values = query_builder.build(Filter("s.id", "IN", ids))
+    scores = await clients.database.raw.fetch_all(
+        query=f"""
+            SELECT {READ_PARAMS}
+            FROM scores s
+            LEFT JOIN maps m ON s.map_md5 = m.md5
+            WHERE {predicates}
+        """,
+        values=values,
+    )
+    return [cast(Score, score) for score in scores]
+
+
+class FirstPlace(TypedDict):
+    id: int
+    map_md5: str
+    mode: int
+    score: int
+    userid: int
+
+
+async def fetch_first_places(
+    score_statuses: list[int],
+    map_statuses: list[int],
+) -> list[FirstPlace]:
+    """Fetch the top score of every (beatmap, mode) leaderboard, ties going to the oldest."""
+    predicates, values = query_builder.build(
+        Filter("s.status", "IN", score_statuses),
+        Filter("m.status", "IN", map_statuses),
+    )
+    first_places = await clients.database.fetch_all(
+        query=f"""
+            SELECT id, map_md5, mode, score, userid
+            FROM (
+                SELECT
+                    s.id,
+                    s.map_md5,
+                    s.mode,
+                    s.score,
+                    s.userid,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY s.map_md5, s.mode
+                        ORDER BY s.score DESC, s.id ASC
+                    ) AS position
+                FROM scores s
+                INNER JOIN maps m ON s.map_md5 = m.md5
+                WHERE {predicates}
+            ) ranked
+            WHERE position = 1
+        """,
+        values=values,
+    )
+    return [cast(FirstPlace, first_place) for first_place in first_places]
+
+
+def _build_predicates(
+    map_md5: str | None,
+    user_id: int | None,
+    mode: int | None,
+    score_statuses: list[int] | None,
+    map_statuses: list[int] | None,
+    mods: int | None,
+    mods_include: int | None,
+) -> tuple[str, dict[str, Any]]:
+    return query_builder.build(
+        Filter("s.map_md5", "=", map_md5),
+        Filter("s.userid", "=", user_id),
+        Filter("s.mode", "=", mode),
+        Filter("s.status", "IN", score_statuses),
+        Filter("m.status", "IN", map_statuses),
+        Filter("s.mods", "=", mods),
+        Filter("s.mods", "&", mods_include),
+    )
+
+
 async def fetch_many(
     map_md5: str | None = None,
     user_id: int | None = None,
@@ -84,44 +179,171 @@ async def fetch_many(
     order: Literal["asc", "desc"] = "desc",
     page: int | None = None,
     page_size: int | None = None,
+    cursor: tuple[Any, int] | None = None,
+    mods: int | None = None,
+    mods_include: int | None = None,
 ) -> list[Score]:
+    """
+    Fetch scores matching the given filters.
+
+    Pages are either addressed with `page` (offset pagination) or, preferably,
+    with `cursor`: the (sort value, id) pair of the last row of the previous
+    page, which seeks straight to the next row instead of scanning the skipped
+    ones. Page sizes are capped at `MAX_PAGE_SIZE`.
+
+    `mods` only matches scores played with exactly that mod combination, while
+    `mods_include` matches scores having at least those mods enabled.
+    """
+    predicates, values = _build_predicates(
+        map_md5=map_md5,
+        user_id=user_id,
+        mode=mode,
+        score_statuses=score_statuses,
+        map_statuses=map_statuses,
+        mods=mods,
+        mods_include=mods_include,
+    )
     query = f"""
         SELECT {READ_PARAMS}
         FROM scores s
         LEFT JOIN maps m ON s.map_md5 = m.md5
-        WHERE s.map_md5 = COALESCE(:map_md5, s.map_md5)
-        AND s.userid = COALESCE(:user_id, s.userid)
-        AND s.mode = COALESCE(:mode, s.mode)
+        WHERE {predicates}
     """
-    values = {
-        "map_md5": map_md5,
-        "user_id": user_id,
-        "mode": mode,
-    }
-
-    if score_statuses is not None:
-        placeholders = ", ".join(
-            [f":score_status_{i}" for i in range(len(score_statuses))],
-        )
-        values |= {
-            f"score_status_{i}": status for i, status in enumerate(score_statuses)
-        }
-        query += f" AND s.status IN ({placeholders})"
-
-    if map_statuses is not None:
-        placeholders = ", ".join([f":map_status_{i}" for i in range(len(map_statuses))])
-        values |= {f"map_status_{i}": status for i, status in enumerate(map_statuses)}
-        query += f" AND m.status IN ({placeholders})"
-
-    query += f" ORDER BY {sort_by} {order.upper()}"
-
-    if page is not None and page_size is not None:
+
+    if cursor is not None:
+        operator = ">" if order == "asc" else "<"
         query += f"""\
-            LIMIT :page_size
-            OFFSET :offset
+            AND (
+                s.{sort_by} {operator} :cursor_value
+                OR (s.{sort_by} = :cursor_value AND s.id {operator} :cursor_id)
+            )
         """
+        values["cursor_value"], values["cursor_id"] = cursor
+
+    query += f" ORDER BY s.{sort_by} {order.upper()}, s.id {order.upper()}"
+
+    if page_size is not None:
+        page_size = min(page_size, MAX_PAGE_SIZE)
+        query += " LIMIT :page_size"
         values["page_size"] = page_size
-        values["offset"] = (page - 1) * page_size
 
-    scores = await clients.database.fetch_all(query, values)
+        if page is not None and cursor is None:
+            query += " OFFSET :offset"
+            values["offset"] = (page - 1) * page_size
+
+    scores = await clients.database.raw.fetch_all(query, values)
     return [cast(Score, score) for score in scores] if scores else []
+
+
+async def count_many(
+    map_md5: str | None = None,
+    user_id: int | None = None,
+    mode: int | None = None,
+    score_statuses: list[int] | None = None,
+    map_statuses: list[int] | None = None,
+    mods: int | None = None,
+    mods_include: int | None = None,
+) -> int:
+    predicates, values = _build_predicates(
+        map_md5=map_md5,
+        user_id=user_id,
+        mode=mode,
+        score_statuses=score_statuses,
+        map_statuses=map_statuses,
+        mods=mods,
+        mods_include=mods_include,
+    )
+    # the maps join is only needed when filtering by map status
+    join = "LEFT JOIN maps m ON s.map_md5 = m.md5" if map_statuses is not None else ""
+    query = f"""
+        SELECT COUNT(*)
+        FROM scores s
+        {join}
+        WHERE {predicates}
+    """
+
+    count = await clients.database.fetch_val(query, values)
+    return int(count or 0)
+
+
+async def fetch_max_id(
+    user_id: int | None = None,
+    mode: int | None = None,
+    score_statuses: list[int] | None = None,
+) -> int | None:
+    """Fetch the id of the latest matching score, or None if there are none."""
+    predicates, values = query_builder.build(
+        Filter("s.userid", "=", user_id),
+        Filter("s.mode", "=", mode),
+        Filter("s.status", "IN", score_statuses),
+    )
+    max_id = await clients.database.fetch_val(
+        query=f"SELECT MAX(s.id) FROM scores s WHERE {predicates}",
+        values=values,
+    )
+    return int(max_id) if max_id is not None else None
+
+
+async def fetch_ids_after(id: int, limit: int) -> list[int]:
+    """Fetch the ids of the scores set after the given score id, in order, off the primary key alone."""
+    rows = await clients.database.raw.fetch_all(
+        query="""
+            SELECT id
+            FROM scores
+            WHERE id > :id
+            ORDER BY id ASC
+            LIMIT :limit
+        """,
+        values={"id": id, "limit": limit},
+    )
+    return [row["id"] for row in rows]
+
+
+async def fetch_many_after(id: int, limit: int) -> list[Score]:
+    """Fetch the scores set after the given score id, oldest first."""
+    scores = await clients.database.raw.fetch_all(
+        query=f"""
+            SELECT {READ_PARAMS}
+            FROM scores s
+            LEFT JOIN maps m ON s.map_md5 = m.md5
+            WHERE s.id > :id
+            ORDER BY s.id ASC
+            LIMIT :limit
+        """,
+        values={"id": id, "limit": limit},
+    )
+    return [cast(Score, score) for score in scores]
+
+
+async def iterate_many(
+    map_md5: str | None = None,
+    user_id: int | None = None,
+    mode: int | None = None,
+    score_statuses: list[int] | None = None,
+    after_id: int = 0,
+) -> AsyncGenerator[Score]:
+    """Stream every score matching the given filters set after `after_id`, oldest first."""
+    predicates, values = _build_predicates(
+        map_md5=map_md5,
+        user_id=user_id,
+        mode=mode,
+        score_statuses=score_statuses,
+        map_statuses=None,
+        mods=None,
+        mods_include=None,
+    )
+    values["after_id"] = after_id
+
+    rows = clients.database.iterate(
+        query=f"""
+            SELECT {READ_PARAMS}
+            FROM scores s
+            LEFT JOIN maps m ON s.map_md5 = m.md5
+            WHERE {predicates} AND s.id > :after_id
+            ORDER BY s.id ASC
+        """,
+        values=values,
+    )
+    async with aclosing(rows):
+        async for score in rows:
+            yield cast(Score, score)
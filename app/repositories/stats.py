@@ -4,6 +4,8 @@ from typing import TypedDict
 from typing import cast
 
 from common import clients
+from repositories import query_builder
+from repositories.query_builder import Filter
 
 READ_PARAMS = """
     id,
@@ -54,3 +56,19 @@ async def fetch_one(user_id: int, mode: int) -> Stat | None:
         values={"id": user_id, "mode": mode},
     )
     return cast(Stat, stats) if stats is not None else None
+
+
+async def fetch_many(user_ids: list[int], mode: int) -> list[Stat]:
+    predicates, values = query_builder.build(
+        Filter("id", "IN", user_ids),
+        Filter("mode", "=", mode),
+    )
+    stats = await clients.database.fetch_all(
+        query=f"""
+            SELECT {READ_PARAMS}
+            FROM stats
+            WHERE {predicates}
+        """,
+        values=values,
+    )
+    return [cast(Stat, stat) for stat in stats]
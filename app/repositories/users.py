@@ -4,6 +4,8 @@ from typing import TypedDict
 from typing import cast
 
 from common import clients
+from repositories import query_builder
+from repositories.query_builder import Filter
 
 READ_PARAMS = """
     id,
@@ -44,10 +46,10 @@ class User(TypedDict):
     clan_priv: int
     preferred_mode: int
     play_style: int
-    custom_badge_name: str
-    custom_badge_icon: str
-    userpage_content: str
-    api_key: str
+    custom_badge_name: str | None
+    custom_badge_icon: str | None
+    userpage_content: str | None
+    api_key: str | None
     online: bool
 
 
@@ -96,3 +98,25 @@ async def fetch_by_username(username: str) -> User | None:
         },
     )
     return cast(User, user) if user is not None else None
+
+
+async def fetch_many_by_ids(ids: list[int]) -> list[User]:
+    """
+    Fetch several users by user ID in a single query.
+
+    Args:
+        ids (list[int]): The IDs of the users to fetch.
+
+    Returns:
+        list[User]: The users found, in no particular order.
+    """
+    predicates, values = query_builder.build(Filter("id", "IN", ids))
+    users = await clients.database.fetch_all(
+        query=f"""
+            SELECT {READ_PARAMS}
+            FROM users
+            WHERE {predicates}
+        """,
+        values=values,
+    )
+    return [cast(User, user) for user in users]
@@ -1,14 +1,16 @@
 from __future__ import annotations
 
+from common import cache
 from common import logger
 from errors import ServiceError
-from repositories import clans
+from repositories import loaders
 from repositories.clans import Clan
 
 
+@cache.cached("clans", ttl=300, schema=Clan)
 async def fetch_one(id: int) -> Clan | ServiceError:
     try:
-        clan = await clans.fetch_one(id)
+        clan = await loaders.clans.load(id)
     except Exception as exc:
         logger.error("Failed to fetch clan", exc_info=exc)
         return ServiceError.INTERNAL_SERVER_ERROR
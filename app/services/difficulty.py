@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from common import cache
+from common import difficulty
+from common import logger
+from common import storage
+from common.difficulty import DifficultyAttributes
+from common.difficulty import PerformanceAttributes
+from common.difficulty import Play
+from errors import ServiceError
+from repositories import maps
+from repositories.maps import Map
+
+MAX_WORKERS = 4
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+
+    if _executor is None:
+        # spawn the workers instead of forking the process running the event loop
+        _executor = ProcessPoolExecutor(
+            max_workers=MAX_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+
+    return _executor
+
+
+def shutdown() -> None:
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def calculate(
+    content: bytes,
+    md5: str,
+    mode: int,
+    mods: int,
+) -> DifficultyAttributes:
+    """Run the difficulty calculation of an .osu file in the worker processes."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(),
+        difficulty.calculate,
+        content,
+        md5,
+        mode,
+        mods,
+    )
+
+
+@cache.cached(
+    "difficulty",
+    ttl=24 * 60 * 60,
+    schema=DifficultyAttributes,
+    negative_ttl=60,
+)
+async def _fetch_attributes(
+    map_id: int,
+    md5: str,
+    mode: int,
+    mods: int,
+) -> DifficultyAttributes | ServiceError:
+    content = await storage.get_beatmap_file(map_id)
+
+    if content is None or hashlib.md5(content).hexdigest() != md5:
+        return ServiceError.MAPS_NOT_FOUND
+
+    try:
+        return await calculate(content, md5, mode, mods)
+    except Exception as exc:
+        logger.error("Failed to calculate difficulty attributes", exc_info=exc)
+        return ServiceError.INTERNAL_SERVER_ERROR
+
+
+async def fetch_attributes(
+    map: Map,
+    mods: int,
+    mode: int | None = None,
+) -> DifficultyAttributes | ServiceError:
+    """
+    Fetch the difficulty attributes of a beatmap in a mode, for a mod combination.
+
+    Attributes are memoized per (md5, mode, difficulty changing mods), so e.g.
+    HDDT and DT share the same entry. The mode defaults to the beatmap's own,
+    osu!standard maps can also be converted to the other modes.
+    """
+    if mode is None:
+        mode = map["mode"]
+
+    if not difficulty.is_supported_mode(map["mode"], mode):
+        return ServiceError.MAPS_UNSUPPORTED_MODE
+
+    return await _fetch_attributes(
+        map_id=map["id"],
+        md5=map["md5"],
+        mode=mode,
+        mods=difficulty.difficulty_mods(mods),
+    )
+
+
+async def _calculate_map_batch(
+    map: Map,
+    plays: list[Play],
+) -> list[PerformanceAttributes] | None:
+    content = await storage.get_beatmap_file(map["id"])
+    if content is None or hashlib.md5(content).hexdigest() != map["md5"]:
+        return None
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            _get_executor(),
+            difficulty.calculate_batch,
+            content,
+            map["md5"],
+            plays,
+        )
+    except Exception as exc:
+        logger.error("Failed to calculate performance", exc_info=exc)
+        return None
+
+
+async def calculate_performance(
+    plays: list[tuple[str, Play]],
+) -> list[PerformanceAttributes | None] | ServiceError:
+    """
+    Calculate the performance of many (map md5, play) pairs at once.
+
+    Plays are grouped by beatmap so every .osu file is read once, and the
+    groups are calculated in parallel in the worker processes.
+
+    Returns:
+        list[PerformanceAttributes | None]: The results in the order of `plays`,
+            None for the plays which couldn't be calculated.
+        ServiceError.MAPS_UNSUPPORTED_MODE: If a play is in a mode its beatmap
+            can't be played in.
+    """
+    plays_by_md5: dict[str, list[int]] = {}
+    for i, (md5, _) in enumerate(plays):
+        plays_by_md5.setdefault(md5, []).append(i)
+
+    try:
+        _maps = await maps.fetch_many_by_md5s(list(plays_by_md5))
+    except Exception as exc:
+        logger.error("Failed to fetch maps", exc_info=exc)
+        return ServiceError.INTERNAL_SERVER_ERROR
+
+    groups: list[tuple[Map, list[int], list[Play]]] = []
+    for map in _maps:
+        indexes = plays_by_md5.get(map["md5"])
+        if indexes is None:
+            continue
+
+        map_plays = []
+        for i in indexes:
+            play = plays[i][1]
+            if play.mode is None:
+                play = play._replace(mode=map["mode"])
+            elif not difficulty.is_supported_mode(map["mode"], play.mode):
+                return ServiceError.MAPS_UNSUPPORTED_MODE
+
+            map_plays.append(play)
+
+        groups.append((map, indexes, map_plays))
+
+    batches = await asyncio.gather(
+        *(_calculate_map_batch(map, map_plays) for map, _, map_plays in groups),
+    )
+
+    results: list[PerformanceAttributes | None] = [None] * len(plays)
+    for (_, indexes, _), batch in zip(groups, batches):
+        if batch is not None:
+            for i, result in zip(indexes, batch):
+                results[i] = result
+
+    return results
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import uuid
+
+from common import clients
+from common import logger
+from common.utils import RankedStatus
+from common.utils import SubmissionStatus
+from errors import ServiceError
+from repositories import maps
+from repositories import scores
+from repositories.scores import MAX_PAGE_SIZE
+from repositories.scores import FirstPlace
+from repositories.scores import Score
+
+# statuses of the beatmaps whose leaderboards hand out first places
+FIRSTS_MAP_STATUSES: list[int] = [
+    RankedStatus.Ranked,
+    RankedStatus.Approved,
+    RankedStatus.Loved,
+]
+
+# only the best score of each player can hold a first place
+FIRSTS_SCORE_STATUSES: list[int] = [SubmissionStatus.BEST]
+
+_REBUILD_BATCH_SIZE = 1000
+# scores before the rebuild's snapshot applied again too, as ids can commit out of order
+_REBUILD_LOOKBACK = 1000
+
+_KEY_PREFIX = "tomoe:firsts"
+
+# Replaces the first place of a beatmap when the new score beats it, moving
+# the score id from the previous holder's set to the new holder's one. Ties
+# keep the oldest score. Resubmitting the holding score only makes sure it's
+# in its holder's set.
+#
+# KEYS: holders | ARGV: md5, score, score id, user id, holder set key prefix
+_SUBMIT_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+local score, id = tonumber(ARGV[2]), tonumber(ARGV[3])
+if current then
+    local current_score, current_id, current_user = string.match(current, '^(%d+):(%d+):(%d+)$')
+    current_score, current_id = tonumber(current_score), tonumber(current_id)
+    if current_id == id then
+        redis.call('ZADD', ARGV[5] .. ARGV[4], id, id)
+        return 0
+    end
+    if current_score > score or (current_score == score and current_id < id) then
+        return 0
+    end
+    redis.call('ZREM', ARGV[5] .. current_user, current_id)
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2] .. ':' .. ARGV[3] .. ':' .. ARGV[4])
+redis.call('ZADD', ARGV[5] .. ARGV[4], id, id)
+return 1
+"""
+
+
+def _holders_key(mode: int, prefix: str = _KEY_PREFIX) -> str:
+    return f"{prefix}:{mode}"
+
+
+def _user_key_prefix(mode: int, prefix: str = _KEY_PREFIX) -> str:
+    return f"{prefix}:{mode}:user:"
+
+
+def _submit_args(
+    first_place: Score | FirstPlace,
+    prefix: str = _KEY_PREFIX,
+) -> list[str | int]:
+    return [
+        first_place["map_md5"],
+        first_place["score"],
+        first_place["id"],
+        first_place["userid"],
+        _user_key_prefix(first_place["mode"], prefix),
+    ]
+
+
+async def submit(score: Score) -> bool:
+    """
+    Record a new score in the firsts index, if it takes the first place of its beatmap.
+
+    Returns whether the score became the new first place.
+    """
+    if score["status"] not in FIRSTS_SCORE_STATUSES:
+        return False
+
+    _maps = await maps.fetch_many_by_md5s([score["map_md5"]])
+    if not _maps or _maps[0]["status"] not in FIRSTS_MAP_STATUSES:
+        return False
+
+    script = clients.redis.register_script(_SUBMIT_SCRIPT)
+    replaced = await script(
+        keys=[_holders_key(score["mode"])],
+        args=_submit_args(score),
+    )
+    return bool(replaced)
+
+
+async def _swap_in(prefix: str) -> None:
+    """Rename the keys built under a prefix over the live ones, removing the live keys left."""
+    stale_keys = {key async for key in clients.redis.scan_iter(f"{_KEY_PREFIX}:*")}
+    new_keys = [key async for key in clients.redis.scan_iter(f"{prefix}:*")]
+
+    for i in range(0, len(new_keys), _REBUILD_BATCH_SIZE):
+        async with clients.redis.pipeline(transaction=False) as pipe:
+            for key in new_keys[i : i + _REBUILD_BATCH_SIZE]:
+                live_key = _KEY_PREFIX.encode() + key.removeprefix(prefix.encode())
+                stale_keys.discard(live_key)
+                pipe.rename(key, live_key)
+            await pipe.execute()
+
+    stale = list(stale_keys)
+    for i in range(0, len(stale), _REBUILD_BATCH_SIZE):
+        await clients.redis.delete(*stale[i : i + _REBUILD_BATCH_SIZE])
+
+
+async def rebuild() -> int:
+    """
+    Rebuild the firsts index of every mode from the scores table.
+
+    The index is built under temporary keys and renamed over the live ones,
+    which keep being served and updated meanwhile. Submissions made during
+    the rebuild may land in keys it replaces, so the scores set since its
+    snapshot are submitted again once it's swapped in.
+
+    Returns the number of first places indexed.
+    """
+    last_score_id = max((await scores.fetch_max_id() or 0) - _REBUILD_LOOKBACK, 0)
+    first_places = await scores.fetch_first_places(
+        score_statuses=FIRSTS_SCORE_STATUSES,
+        map_statuses=FIRSTS_MAP_STATUSES,
+    )
+
+    prefix = f"tomoe:firsts_rebuild:{uuid.uuid4().hex}"
+    script = clients.redis.register_script(_SUBMIT_SCRIPT)
+    try:
+        for i in range(0, len(first_places), _REBUILD_BATCH_SIZE):
+            async with clients.redis.pipeline(transaction=False) as pipe:
+                for first_place in first_places[i : i + _REBUILD_BATCH_SIZE]:
+                    await script(
+                        keys=[_holders_key(first_place["mode"], prefix)],
+                        args=_submit_args(first_place, prefix),
+                        client=pipe,
+                    )
+                await pipe.execute()
+
+        await _swap_in(prefix)
+    finally:
+        leftover_keys = [key async for key in clients.redis.scan_iter(f"{prefix}:*")]
+        if leftover_keys:
+            await clients.redis.delete(*leftover_keys)
+
+    while True:
+        new_scores = await scores.fetch_many_after(last_score_id, _REBUILD_BATCH_SIZE)
+        for score in new_scores:
+            await submit(score)
+
+        if len(new_scores) < _REBUILD_BATCH_SIZE:
+            break
+        last_score_id = new_scores[-1]["id"]
+
+    return len(first_places)
+
+
+async def fetch_many(
+    user_id: int,
+    mode: int,
+    page: int = 1,
+    page_size: int = 100,
+) -> list[Score] | ServiceError:
+    """Fetch the first places of a user, most recent first, in pages of at most `MAX_PAGE_SIZE`."""
+    # a page size of 0 would end the range at -1, which ZREVRANGE reads as the last member
+    page_size = min(max(page_size, 1), MAX_PAGE_SIZE)
+    start = (max(page, 1) - 1) * page_size
+
+    try:
+        score_ids = await clients.redis.zrevrange(
+            _user_key_prefix(mode) + str(user_id),
+            start,
+            start + page_size - 1,
+        )
+        if not score_ids:
+            return []
+
+        ids = [int(score_id) for score_id in score_ids]
+        _scores = {score["id"]: score for score in await scores.fetch_many_by_ids(ids)}
+    except Exception as exc:
+        logger.error("Failed to fetch first places", exc_info=exc)
+        return ServiceError.INTERNAL_SERVER_ERROR
+
+    # scores deleted since they were indexed are skipped until the next rebuild
+    return [_scores[id] for id in ids if id in _scores]
+
+
+async def fetch_count(user_id: int, mode: int) -> int | ServiceError:
+    try:
+        count: int = await clients.redis.zcard(_user_key_prefix(mode) + str(user_id))
+    except Exception as exc:
+        logger.error("Failed to count first places", exc_info=exc)
+        return ServiceError.INTERNAL_SERVER_ERROR
+
+    return count
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+from typing import Literal
+
+from common import cache
+from common import clients
+from common import logger
+from common.utils import SubmissionStatus
+from errors import ServiceError
+from repositories import scores
+from repositories.scores import Score
+from services.scores import deserialize
+from services.scores import serialize
+
+LEADERBOARD_SIZE = 100
+LEADERBOARD_TTL = 5 * 60
+
+RankingType = Literal["global"]
+
+# statuses of the scores shown on beatmap leaderboards
+LEADERBOARD_STATUSES: list[int] = [SubmissionStatus.SUBMITTED, SubmissionStatus.BEST]
+
+# scores submitted while a leaderboard is cold are kept this long, for a fill in progress
+PENDING_TTL = 60
+
+# KEYS: meta, ranking, payloads | ARGV: limit
+_READ_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local ids = redis.call('ZREVRANGE', KEYS[2], 0, tonumber(ARGV[1]) - 1)
+if #ids == 0 then
+    return {}
+end
+return redis.call('HMGET', KEYS[3], unpack(ids))
+"""
+
+# keeps the best `size` scores of a ranking and their payloads
+_TRIM = """
+local function trim(ranking, payloads, size)
+    local evicted = redis.call('ZRANGE', ranking, 0, -(size + 1))
+    if #evicted > 0 then
+        redis.call('ZREMRANGEBYRANK', ranking, 0, -(size + 1))
+        redis.call('HDEL', payloads, unpack(evicted))
+    end
+end
+"""
+
+# Adds a score to a warm leaderboard. Scores submitted while it's cold are
+# set aside, for a fill which may have read the database before they were set.
+#
+# KEYS: meta, ranking, payloads, pending ranking, pending payloads
+# ARGV: member, sort value, payload, size, pending ttl
+_SUBMIT_SCRIPT = _TRIM + """
+local size = tonumber(ARGV[4])
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('ZADD', KEYS[4], ARGV[2], ARGV[1])
+    redis.call('HSET', KEYS[5], ARGV[1], ARGV[3])
+    trim(KEYS[4], KEYS[5], size)
+    redis.call('EXPIRE', KEYS[4], ARGV[5])
+    redis.call('EXPIRE', KEYS[5], ARGV[5])
+    return 0
+end
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[3])
+trim(KEYS[2], KEYS[3], size)
+return 1
+"""
+
+# Fills a leaderboard with the scores read from the database, along with the
+# scores submitted since they were read, and warms it up.
+#
+# KEYS: meta, ranking, payloads, pending ranking, pending payloads
+# ARGV: size, ttl, then (member, sort value, payload) for every score
+_FILL_SCRIPT = _TRIM + """
+redis.call('DEL', KEYS[2], KEYS[3])
+for i = 3, #ARGV, 3 do
+    redis.call('ZADD', KEYS[2], ARGV[i + 1], ARGV[i])
+    redis.call('HSET', KEYS[3], ARGV[i], ARGV[i + 2])
+end
+local pending = redis.call('ZRANGE', KEYS[4], 0, -1, 'WITHSCORES')
+for i = 1, #pending, 2 do
+    redis.call('ZADD', KEYS[2], pending[i + 1], pending[i])
+    redis.call('HSET', KEYS[3], pending[i], redis.call('HGET', KEYS[5], pending[i]))
+end
+redis.call('DEL', KEYS[4], KEYS[5])
+trim(KEYS[2], KEYS[3], tonumber(ARGV[1]))
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+redis.call('EXPIRE', KEYS[3], ARGV[2])
+redis.call('SET', KEYS[1], 1, 'EX', ARGV[2])
+local ids = redis.call('ZREVRANGE', KEYS[2], 0, -1)
+if #ids == 0 then
+    return {}
+end
+return redis.call('HMGET', KEYS[3], unpack(ids))
+"""
+
+
+def _keys(md5: str, mode: int, type: RankingType) -> list[str]:
+    prefix = f"tomoe:leaderboard:{md5}:{mode}:{type}"
+    return [
+        f"{prefix}:meta",
+        prefix,
+        f"{prefix}:scores",
+        f"{prefix}:pending",
+        f"{prefix}:pending_scores",
+    ]
+
+
+def _member(score_id: int) -> str:
+    # zero padded, so tied scores are ordered by id (descending) like in the database
+    return f"{score_id:020d}"
+
+
+async def _fill(md5: str, mode: int, type: RankingType) -> list[Score]:
+    _scores = await scores.fetch_many(
+        map_md5=md5,
+        mode=mode,
+        score_statuses=LEADERBOARD_STATUSES,
+        sort_by="score",
+        page_size=LEADERBOARD_SIZE,
+    )
+
+    script = clients.redis.register_script(_FILL_SCRIPT)
+    payloads = await script(
+        keys=_keys(md5, mode, type),
+        args=[
+            LEADERBOARD_SIZE,
+            LEADERBOARD_TTL,
+            *(
+                arg
+                for score in _scores
+                for arg in (_member(score["id"]), score["score"], serialize(score))
+            ),
+        ],
+    )
+
+    return [deserialize(payload) for payload in payloads]
+
+
+async def fetch_leaderboard(
+    md5: str,
+    mode: int,
+    type: RankingType = "global",
+    limit: int = LEADERBOARD_SIZE,
+    mods: int | None = None,
+    mods_include: int | None = None,
+) -> list[Score] | ServiceError:
+    """
+    Fetch the top scores of a beatmap, sorted by score.
+
+    Leaderboards are cached in a redis sorted set of score ids plus a hash of
+    the score rows, filled from the database on the first request and kept up
+    to date by `submit` until they expire. Mod filtered leaderboards are read
+    straight from the database.
+    """
+    limit = min(limit, LEADERBOARD_SIZE)
+
+    if mods is not None or mods_include is not None:
+        try:
+            return await scores.fetch_many(
+                map_md5=md5,
+                mode=mode,
+                score_statuses=LEADERBOARD_STATUSES,
+                sort_by="score",
+                page_size=limit,
+                mods=mods,
+                mods_include=mods_include,
+            )
+        except Exception as exc:
+            logger.error("Failed to fetch leaderboard", exc_info=exc)
+            return ServiceError.INTERNAL_SERVER_ERROR
+
+    try:
+        script = clients.redis.register_script(_READ_SCRIPT)
+        payloads = await script(keys=_keys(md5, mode, type), args=[limit])
+    except Exception as exc:
+        logger.warning("Failed to read cached leaderboard", exc_info=exc)
+        payloads = None
+
+    if payloads is not None:
+        return [deserialize(payload) for payload in payloads if payload is not None]
+
+    try:
+        _scores = await _fill(md5, mode, type)
+    except Exception as exc:
+        logger.error("Failed to fetch leaderboard", exc_info=exc)
+        return ServiceError.INTERNAL_SERVER_ERROR
+
+    return _scores[:limit]
+
+
+@cache.cached("leaderboards.count", ttl=60, schema=int)
+async def fetch_score_count(
+    md5: str,
+    mode: int,
+    mods: int | None = None,
+    mods_include: int | None = None,
+) -> int | ServiceError:
+    """Count the scores of a beatmap leaderboard, including those past its top 100."""
+    try:
+        return await scores.count_many(
+            map_md5=md5,
+            mode=mode,
+            score_statuses=LEADERBOARD_STATUSES,
+            mods=mods,
+            mods_include=mods_include,
+        )
+    except Exception as exc:
+        logger.error("Failed to count leaderboard scores", exc_info=exc)
+        return ServiceError.INTERNAL_SERVER_ERROR
+
+
+async def submit(score: Score) -> None:
+    """
+    Add a new score to its cached leaderboard.
+
+    Scores submitted while the leaderboard is cold are only merged into it by
+    the next fill, which may have read the database before they were set.
+    """
+    if score["status"] not in LEADERBOARD_STATUSES:
+        return
+
+    script = clients.redis.register_script(_SUBMIT_SCRIPT)
+    await script(
+        keys=_keys(score["map_md5"], score["mode"], "global"),
+        args=[
+            _member(score["id"]),
+            score["score"],
+            serialize(score),
+            LEADERBOARD_SIZE,
+            PENDING_TTL,
+        ],
+    )
+
+
+async def invalidate_score_count(score: Score) -> None:
+    """Drop the cached (unfiltered) score count of the leaderboard of a new score."""
+    if score["status"] not in LEADERBOARD_STATUSES:
+        return
+
+    await cache.invalidate(
+        cache.make_key(
+            "leaderboards.count",
+            score["map_md5"],
+            score["mode"],
+            None,
+            None,
+        ),
+    )
+
+
+async def invalidate(md5: str, mode: int, type: RankingType = "global") -> None:
+    await clients.redis.delete(*_keys(md5, mode, type))
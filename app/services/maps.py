@@ -1,14 +1,17 @@
 from __future__ import annotations
 
+from common import cache
 from common import logger
 from errors import ServiceError
+from repositories import loaders
 from repositories import maps
 from repositories.maps import Map
 
 
+@cache.cached("maps.id", ttl=300, schema=Map)
 async def fetch_one(id: int) -> Map | ServiceError:
     try:
-        map = await maps.fetch_one(id)
+        map = await loaders.maps.load(id)
     except Exception as exc:
         logger.error("Failed to fetch map", exc_info=exc)
         return ServiceError.INTERNAL_SERVER_ERROR
@@ -19,6 +22,7 @@ async def fetch_one(id: int) -> Map | ServiceError:
     return map
 
 
+@cache.cached("maps.many", ttl=300, schema=list[Map])
 async def fetch_many(
     server: str | None = None,
     set_id: int | None = None,
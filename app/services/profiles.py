@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from typing import TypedDict
+
+from common import cache
+from common import clients
+from common import logger
+from errors import ServiceError
+from repositories import profiles
+from repositories.clans import Clan
+from repositories.stats import Stat
+from services.users import PublicUser
+from services.users import to_public
+
+
+class CachedProfile(TypedDict):
+    user: PublicUser
+    stats: Stat
+    clan: Clan | None
+
+
+class AssembledProfile(TypedDict):
+    user: PublicUser
+    stats: Stat
+    clan: Clan | None
+    global_rank: int | None
+    country_rank: int | None
+
+
+@cache.cached("profiles", ttl=30, schema=CachedProfile)
+async def _fetch_profile(
+    mode: int,
+    user_id: int | None,
+    username: str | None,
+) -> CachedProfile | ServiceError:
+    try:
+        profile = await profiles.fetch_one(
+            mode=mode,
+            user_id=user_id,
+            username=username,
+        )
+    except Exception as exc:
+        logger.error("Failed to fetch profile", exc_info=exc)
+        return ServiceError.INTERNAL_SERVER_ERROR
+
+    if profile is None or profile["stats"] is None:
+        return ServiceError.USERS_NOT_FOUND
+
+    # only what may be shown is cached, credentials stay in the database
+    return {
+        "user": to_public(profile["user"]),
+        "stats": profile["stats"],
+        "clan": profile["clan"],
+    }
+
+
+async def _fetch_ranks(
+    user_id: int,
+    country: str,
+    mode: int,
+) -> tuple[int | None, int | None]:
+    try:
+        async with clients.redis.pipeline(transaction=False) as pipe:
+            pipe.zrevrank(f"bancho:leaderboard:{mode}", user_id)
+            pipe.zrevrank(f"bancho:leaderboard:{mode}:{country}", user_id)
+            global_rank, country_rank = await pipe.execute()
+    except Exception as exc:
+        logger.error("Failed to fetch user ranks", exc_info=exc)
+        return None, None
+
+    return global_rank, country_rank
+
+
+async def fetch_one(
+    mode: int,
+    user_id: int | None = None,
+    username: str | None = None,
+) -> AssembledProfile | ServiceError:
+    """
+    Assemble everything a user profile needs in two round trips: one joined
+    query for the user, stats and clan, and one redis pipeline for both ranks.
+
+    Ranks are 0-indexed and None when the user isn't ranked in the mode.
+    """
+    profile = await _fetch_profile(mode=mode, user_id=user_id, username=username)
+
+    if isinstance(profile, ServiceError):
+        return profile
+
+    user = profile["user"]
+    stats = profile["stats"]
+
+    global_rank, country_rank = await _fetch_ranks(user["id"], user["country"], mode)
+
+    return {
+        "user": user,
+        "stats": stats,
+        "clan": profile["clan"],
+        "global_rank": global_rank,
+        "country_rank": country_rank,
+    }
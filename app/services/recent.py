@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+from common import clients
+from common import logger
+from common.utils import RankedStatus
+from common.utils import SubmissionStatus
+from errors import ServiceError
+from repositories import scores
+from repositories.scores import Score
+from services import maps
+from services.scores import deserialize
+from services.scores import serialize
+
+RECENT_SIZE = 100
+RECENT_TTL = 24 * 60 * 60
+
+RECENT_SCORE_STATUSES: list[int] = [
+    SubmissionStatus.FAILED,
+    SubmissionStatus.SUBMITTED,
+    SubmissionStatus.BEST,
+]
+RECENT_MAP_STATUSES: list[int] = [RankedStatus.Ranked, RankedStatus.Approved]
+
+# scores pushed while a buffer is cold are kept this long, for a fill in progress
+PENDING_TTL = 60
+
+# Pushes a score unless the buffer already holds a newer score, which would
+# mean it was filled from the database after this score was set. Scores
+# pushed while the buffer is cold are set aside, for a fill which may have
+# read the database before they were set.
+#
+# KEYS: meta, head, buffer, pending | ARGV: score id, payload, size, ttl, pending ttl
+_PUSH_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    redis.call('ZADD', KEYS[4], ARGV[1], ARGV[2])
+    redis.call('ZREMRANGEBYRANK', KEYS[4], 0, -tonumber(ARGV[3]) - 1)
+    redis.call('EXPIRE', KEYS[4], ARGV[5])
+    return 0
+end
+if tonumber(redis.call('GET', KEYS[2]) or 0) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('LPUSH', KEYS[3], ARGV[2])
+redis.call('LTRIM', KEYS[3], 0, tonumber(ARGV[3]) - 1)
+redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('EXPIRE', KEYS[3], ARGV[4])
+return 1
+"""
+
+# Fills a buffer with the scores read from the database, newest first, along
+# with the scores pushed since they were read, merged by id, and warms it up.
+#
+# KEYS: meta, head, buffer, pending | ARGV: head id, size, ttl, payloads...
+_FILL_SCRIPT = """
+local head = tonumber(ARGV[1])
+redis.call('DEL', KEYS[3])
+if #ARGV > 3 then
+    redis.call('RPUSH', KEYS[3], unpack(ARGV, 4))
+end
+local pending = redis.call('ZRANGEBYSCORE', KEYS[4], '(' .. head, '+inf', 'WITHSCORES')
+for i = 1, #pending, 2 do
+    redis.call('LPUSH', KEYS[3], pending[i])
+    head = math.max(head, tonumber(pending[i + 1]))
+end
+redis.call('DEL', KEYS[4])
+redis.call('LTRIM', KEYS[3], 0, tonumber(ARGV[2]) - 1)
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+redis.call('SET', KEYS[2], head, 'EX', ARGV[3])
+redis.call('SET', KEYS[1], 1, 'EX', ARGV[3])
+return redis.call('LRANGE', KEYS[3], 0, -1)
+"""
+
+
+def _keys(user_id: int, mode: int) -> list[str]:
+    prefix = f"tomoe:recent:{user_id}:{mode}"
+    return [f"{prefix}:meta", f"{prefix}:head", prefix, f"{prefix}:pending"]
+
+
+async def _fill(user_id: int, mode: int) -> list[Score]:
+    _scores = await scores.fetch_many(
+        user_id=user_id,
+        mode=mode,
+        score_statuses=RECENT_SCORE_STATUSES,
+        map_statuses=RECENT_MAP_STATUSES,
+        sort_by="play_time",
+        page_size=RECENT_SIZE,
+    )
+
+    script = clients.redis.register_script(_FILL_SCRIPT)
+    payloads = await script(
+        keys=_keys(user_id, mode),
+        args=[
+            max((score["id"] for score in _scores), default=0),
+            RECENT_SIZE,
+            RECENT_TTL,
+            *[serialize(score) for score in _scores],
+        ],
+    )
+
+    return [deserialize(payload) for payload in payloads]
+
+
+async def _fetch_buffer(user_id: int, mode: int) -> list[Score] | None:
+    meta_key, _, buffer_key, _ = _keys(user_id, mode)
+
+    async with clients.redis.pipeline(transaction=True) as pipe:
+        pipe.exists(meta_key)
+        pipe.lrange(buffer_key, 0, RECENT_SIZE - 1)
+        is_warm, payloads = await pipe.execute()
+
+    if not is_warm:
+        return None
+
+    return [deserialize(payload) for payload in payloads]
+
+
+async def fetch_recent(
+    user_id: int,
+    mode: int,
+    include_fails: bool = False,
+    page: int = 1,
+    page_size: int = 100,
+) -> list[Score] | ServiceError:
+    """
+    Fetch the latest scores of a user, newest first.
+
+    The last 100 scores of every (user, mode) are kept in a redis list, filled
+    from the database when it's cold and extended by `push` as new scores come
+    in. Pages reaching past the buffer are read from the database.
+    """
+    score_statuses: list[int] = (
+        RECENT_SCORE_STATUSES
+        if include_fails
+        else [SubmissionStatus.SUBMITTED, SubmissionStatus.BEST]
+    )
+    start, end = (page - 1) * page_size, page * page_size
+
+    try:
+        buffer = await _fetch_buffer(user_id, mode)
+        if buffer is None:
+            buffer = await _fill(user_id, mode)
+    except Exception as exc:
+        logger.warning("Failed to read recent scores buffer", exc_info=exc)
+        buffer = None
+
+    if buffer is not None:
+        _scores = [score for score in buffer if score["status"] in score_statuses]
+
+        # a buffer which isn't full holds every recent score of the user
+        if end <= len(_scores) or len(buffer) < RECENT_SIZE:
+            return _scores[start:end]
+
+    try:
+        return await scores.fetch_many(
+            user_id=user_id,
+            mode=mode,
+            score_statuses=score_statuses,
+            map_statuses=RECENT_MAP_STATUSES,
+            sort_by="play_time",
+            page=page,
+            page_size=page_size,
+        )
+    except Exception as exc:
+        logger.error("Failed to fetch recent scores", exc_info=exc)
+        return ServiceError.INTERNAL_SERVER_ERROR
+
+
+async def push(score: Score) -> bool:
+    """
+    Add a new score to the recent scores buffer of its user.
+
+    Scores pushed while the buffer is cold are only merged into it by the
+    next fill, if that fill read the database before they were set.
+
+    Returns whether the score was added to a warm buffer.
+    """
+    if score["status"] not in RECENT_SCORE_STATUSES or score["beatmap_id"] is None:
+        return False
+
+    _map = await maps.fetch_one(id=score["beatmap_id"])
+    if isinstance(_map, ServiceError) or _map["status"] not in RECENT_MAP_STATUSES:
+        return False
+
+    script = clients.redis.register_script(_PUSH_SCRIPT)
+    pushed = await script(
+        keys=_keys(score["userid"], score["mode"]),
+        args=[score["id"], serialize(score), RECENT_SIZE, RECENT_TTL, PENDING_TTL],
+    )
+    return bool(pushed)
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import asyncio
+import uuid
+from collections.abc import Awaitable
+from collections.abc import Callable
+from typing import Any
+
+from common import clients
+from common import logger
+from common import settings
+from repositories import scores
+from repositories.scores import Score
+
+BATCH_SIZE = 500
+# how many ids behind the newest one are scanned again, for ids committed out of
+# order (a transaction committing after one which got a higher id), kept well
+# below BATCH_SIZE so every batch still moves forward
+LOOKBACK = 200
+
+# how long a process stays the leader without renewing its lock, in seconds
+LEADER_TTL = 30
+
+_LEADER_KEY = "tomoe:score_feed:leader"
+_CURSOR_KEY = "tomoe:score_feed:cursor"
+# ids published to the shared subscribers within the lookback window
+_PUBLISHED_KEY = "tomoe:score_feed:published"
+
+# KEYS: leader | ARGV: process id, ttl
+_ACQUIRE_LEADERSHIP_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+    return 1
+end
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# KEYS: leader | ARGV: process id
+_RELEASE_LEADERSHIP_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+Subscriber = Callable[[Score], Awaitable[Any]]
+
+
+class ScoreFeed:
+    """
+    Tails the scores table and publishes every new score to its subscribers.
+
+    Local subscribers (e.g. in-process caches) are called by every process.
+    Shared subscribers update state kept in redis, so they are only called by
+    the process holding the leader lock, which also stores its position in
+    redis for the next leader to resume from.
+
+    Ids aren't committed in order, so every poll scans the last LOOKBACK ids
+    again and only publishes the ones it hasn't published yet, tracked in
+    memory for the local subscribers and in redis for the shared ones. The
+    scan only reads ids; the rows of the scores to publish are read after.
+    """
+
+    def __init__(self) -> None:
+        self._id = uuid.uuid4().hex
+        self._local: list[Subscriber] = []
+        self._shared: list[Subscriber] = []
+        self._last_seen: int | None = None
+        # ids published to the local subscribers within the lookback window
+        self._published: set[int] = set()
+        self._wakeup = asyncio.Event()
+
+    def subscribe(self, subscriber: Subscriber, shared: bool = False) -> None:
+        (self._shared if shared else self._local).append(subscriber)
+
+    def wakeup(self) -> None:
+        self._wakeup.set()
+
+    async def _is_leader(self) -> bool:
+        script = clients.redis.register_script(_ACQUIRE_LEADERSHIP_SCRIPT)
+        return bool(await script(keys=[_LEADER_KEY], args=[self._id, LEADER_TTL]))
+
+    async def release(self) -> None:
+        """Give up the leader lock, if this process holds it, for another one to take over."""
+        script = clients.redis.register_script(_RELEASE_LEADERSHIP_SCRIPT)
+        await script(keys=[_LEADER_KEY], args=[self._id])
+
+    async def _publish(self, score: Score, subscribers: list[Subscriber]) -> None:
+        results = await asyncio.gather(
+            *(subscriber(score) for subscriber in subscribers),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("Score feed subscriber failed", exc_info=result)
+
+    async def _start(self) -> int:
+        last_seen = await scores.fetch_max_id() or 0
+
+        # the scores before the start aren't new, late ones included
+        window = await scores.fetch_ids_after(max(last_seen - LOOKBACK, 0), LOOKBACK)
+        self._published = {id for id in window if id <= last_seen}
+
+        return last_seen
+
+    async def _fetch_shared_published(self, ids: list[int]) -> set[int]:
+        if not ids:
+            return set()
+
+        published: list[float | None] = await clients.redis.zmscore(
+            _PUBLISHED_KEY,
+            [str(id) for id in ids],
+        )
+        return {id for id, score in zip(ids, published) if score is not None}
+
+    async def poll(self) -> int:
+        """Publish the next batch of new scores, returning how many were fetched."""
+        if self._last_seen is None:
+            self._last_seen = await self._start()
+
+        shared_cursor: int | None = None
+        if self._shared and await self._is_leader():
+            cursor = await clients.redis.get(_CURSOR_KEY)
+            if cursor is not None:
+                shared_cursor = int(cursor)
+            else:
+                # the first leader starts from the present rather than replaying history
+                shared_cursor = self._last_seen
+                async with clients.redis.pipeline(transaction=True) as pipe:
+                    if self._published:
+                        pipe.zadd(
+                            _PUBLISHED_KEY,
+                            {str(id): id for id in self._published},
+                        )
+                    pipe.set(_CURSOR_KEY, shared_cursor)
+                    await pipe.execute()
+
+        start = (
+            self._last_seen
+            if shared_cursor is None
+            else min(self._last_seen, shared_cursor)
+        )
+        # the window is scanned again by id alone, only unpublished scores are read whole
+        ids = await scores.fetch_ids_after(max(start - LOOKBACK, 0), BATCH_SIZE)
+
+        shared_published: set[int] = set()
+        if shared_cursor is not None:
+            shared_published = await self._fetch_shared_published(ids)
+
+        subscribers_by_id: dict[int, list[Subscriber]] = {}
+        for id in ids:
+            subscribers: list[Subscriber] = []
+            if id > self._last_seen - LOOKBACK and id not in self._published:
+                subscribers += self._local
+            if (
+                shared_cursor is not None
+                and id > shared_cursor - LOOKBACK
+                and id not in shared_published
+            ):
+                subscribers += self._shared
+
+            if subscribers:
+                subscribers_by_id[id] = subscribers
+
+        new_scores: list[Score] = []
+        if subscribers_by_id:
+            new_scores = await scores.fetch_many_by_ids(list(subscribers_by_id))
+            new_scores.sort(key=lambda score: score["id"])
+
+        for score in new_scores:
+            await self._publish(score, subscribers_by_id[score["id"]])
+        self._published.update(ids)
+
+        if ids:
+            self._last_seen = max(self._last_seen, ids[-1])
+            self._published = {
+                id for id in self._published if id > self._last_seen - LOOKBACK
+            }
+
+            if shared_cursor is not None:
+                shared_cursor = max(shared_cursor, ids[-1])
+                async with clients.redis.pipeline(transaction=True) as pipe:
+                    pipe.zadd(_PUBLISHED_KEY, {str(id): id for id in ids})
+                    pipe.zremrangebyscore(
+                        _PUBLISHED_KEY,
+                        "-inf",
+                        shared_cursor - LOOKBACK,
+                    )
+                    pipe.set(_CURSOR_KEY, shared_cursor)
+                    await pipe.execute()
+
+        return len(ids)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                # keep going without waiting while catching up
+                if await self.poll() == BATCH_SIZE:
+                    continue
+            except Exception as exc:
+                logger.error("Failed to poll the score feed", exc_info=exc)
+
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(),
+                    timeout=settings.SCORE_FEED_POLL_INTERVAL,
+                )
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+feed = ScoreFeed()
+
+
+async def listen_for_scores(channel: str) -> None:
+    """Wake the score feed up as soon as a message is published on a redis channel."""
+    while True:
+        try:
+            async with clients.redis.pubsub() as pubsub:
+                await pubsub.subscribe(channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        feed.wakeup()
+        except Exception as exc:
+            logger.warning("Lost the score feed channel subscription", exc_info=exc)
+
+        # polling keeps the feed going in the meantime
+        await asyncio.sleep(settings.SCORE_FEED_POLL_INTERVAL)
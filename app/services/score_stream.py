@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from dataclasses import field
+
+from repositories.scores import Score
+
+# scores buffered per client before it's considered too slow and dropped
+QUEUE_SIZE = 256
+
+
+@dataclass(eq=False)
+class Subscription:
+    mode: int | None = None
+    user_id: int | None = None
+    beatmap_id: int | None = None
+    queue: asyncio.Queue[Score] = field(
+        default_factory=lambda: asyncio.Queue(maxsize=QUEUE_SIZE),
+    )
+    overflowed: bool = False
+
+    def matches(self, score: Score) -> bool:
+        return (
+            (self.mode is None or score["mode"] == self.mode)
+            and (self.user_id is None or score["userid"] == self.user_id)
+            and (self.beatmap_id is None or score["beatmap_id"] == self.beatmap_id)
+        )
+
+
+class ScoreStream:
+    """
+    Fans the scores published by the score feed out to the connected clients.
+
+    Every client gets a bounded queue; a client which doesn't keep up is
+    flagged as overflowed instead of buffering without limit, and is expected
+    to reconnect and resume from the last score it received.
+    """
+
+    def __init__(self) -> None:
+        self._subscriptions: set[Subscription] = set()
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(
+        self,
+        mode: int | None = None,
+        user_id: int | None = None,
+        beatmap_id: int | None = None,
+    ) -> Subscription:
+        subscription = Subscription(mode=mode, user_id=user_id, beatmap_id=beatmap_id)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    async def publish(self, score: Score) -> None:
+        for subscription in self._subscriptions:
+            if subscription.overflowed or not subscription.matches(score):
+                continue
+
+            try:
+                subscription.queue.put_nowait(score)
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+
+
+stream = ScoreStream()
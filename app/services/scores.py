@@ -1,13 +1,43 @@
 from __future__ import annotations
 
+from collections.abc import AsyncGenerator
+from contextlib import aclosing
+from datetime import datetime
+from typing import Any
 from typing import Literal
+from typing import cast
 
+import orjson
 from common import logger
 from errors import ServiceError
 from repositories import scores
 from repositories.scores import Score
 
 
+def serialize(score: Score) -> bytes:
+    """Serialize a score row into a compact payload for caching."""
+    return orjson.dumps(score)
+
+
+def deserialize(payload: bytes | str) -> Score:
+    score: dict[str, Any] = orjson.loads(payload)
+    score["play_time"] = datetime.fromisoformat(score["play_time"])
+    return cast(Score, score)
+
+
+async def fetch_one(id: int) -> Score | ServiceError:
+    try:
+        score = await scores.fetch_one(id)
+    except Exception as exc:
+        logger.error("Failed to fetch score", exc_info=exc)
+        return ServiceError.INTERNAL_SERVER_ERROR
+
+    if score is None:
+        return ServiceError.SCORES_NOT_FOUND
+
+    return score
+
+
 async def fetch_many(
     map_md5: str | None = None,
     user_id: int | None = None,
@@ -23,6 +53,9 @@ async def fetch_many(
     order: Literal["asc", "desc"] = "desc",
     page: int | None = None,
     page_size: int | None = None,
+    cursor: tuple[Any, int] | None = None,
+    mods: int | None = None,
+    mods_include: int | None = None,
 ) -> list[Score] | ServiceError:
     try:
         _scores = await scores.fetch_many(
@@ -35,9 +68,34 @@ async def fetch_many(
             order=order,
             page=page,
             page_size=page_size,
+            cursor=cursor,
+            mods=mods,
+            mods_include=mods_include,
         )
     except Exception as exc:
         logger.error("Failed to fetch scores", exc_info=exc)
         return ServiceError.INTERNAL_SERVER_ERROR
 
     return _scores
+
+
+async def iterate_many(
+    map_md5: str | None = None,
+    user_id: int | None = None,
+    mode: int | None = None,
+    after_id: int = 0,
+) -> AsyncGenerator[Score]:
+    """Stream scores oldest first; a failure is logged and raised again, so the stream doesn't look complete."""
+    _scores = scores.iterate_many(
+        map_md5=map_md5,
+        user_id=user_id,
+        mode=mode,
+        after_id=after_id,
+    )
+    try:
+        async with aclosing(_scores):
+            async for score in _scores:
+                yield score
+    except Exception as exc:
+        logger.error("Failed to stream scores", exc_info=exc)
+        raise
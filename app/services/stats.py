@@ -1,14 +1,16 @@
 from __future__ import annotations
 
+from common import cache
 from common import logger
 from errors import ServiceError
-from repositories import stats
+from repositories import loaders
 from repositories.stats import Stat
 
 
+@cache.cached("stats", ttl=30, schema=Stat)
 async def fetch_one(user_id: int, mode: int) -> Stat | ServiceError:
     try:
-        user_stats = await stats.fetch_one(user_id, mode)
+        user_stats = await loaders.stats.load((user_id, mode))
     except Exception as exc:
         logger.error("Failed to fetch user stats", exc_info=exc)
         return ServiceError.INTERNAL_SERVER_ERROR
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import asyncio
+from typing import TypedDict
+
+import orjson
+from common import clients
+from common import logger
+from common.utils import RankedStatus
+from common.utils import SubmissionStatus
+from errors import ServiceError
+from repositories import scores
+from repositories.scores import Score
+from services.scores import deserialize
+from services.scores import serialize
+
+TOP_PLAYS_SIZE = 100
+
+# entries are revalidated on every read, the ttl only evicts inactive users
+TOP_PLAYS_TTL = 24 * 60 * 60
+
+TOP_PLAYS_SCORE_STATUSES: list[int] = [SubmissionStatus.BEST]
+TOP_PLAYS_MAP_STATUSES: list[int] = [RankedStatus.Ranked, RankedStatus.Approved]
+
+
+class TopPlays(TypedDict):
+    scores: list[Score]
+    count: int
+
+
+def _key(user_id: int, mode: int) -> str:
+    # a hash, unlike the string entries once kept under tomoe:top_plays:*
+    return f"tomoe:user_top_plays:{user_id}:{mode}"
+
+
+async def _store(user_id: int, mode: int, fields: dict[str, bytes]) -> None:
+    # replaces the whole entry, so no field of another max_id survives
+    async with clients.redis.pipeline(transaction=True) as pipe:
+        pipe.delete(_key(user_id, mode))
+        pipe.hset(_key(user_id, mode), mapping=fields)
+        pipe.expire(_key(user_id, mode), TOP_PLAYS_TTL)
+        await pipe.execute()
+
+
+async def _count(user_id: int, mode: int) -> int:
+    return await scores.count_many(
+        user_id=user_id,
+        mode=mode,
+        score_statuses=TOP_PLAYS_SCORE_STATUSES,
+        map_statuses=TOP_PLAYS_MAP_STATUSES,
+    )
+
+
+async def _fill(user_id: int, mode: int, max_id: int | None) -> TopPlays:
+    _scores, count = await asyncio.gather(
+        scores.fetch_many(
+            user_id=user_id,
+            mode=mode,
+            score_statuses=TOP_PLAYS_SCORE_STATUSES,
+            map_statuses=TOP_PLAYS_MAP_STATUSES,
+            sort_by="pp",
+            page_size=TOP_PLAYS_SIZE,
+        ),
+        _count(user_id, mode),
+    )
+
+    # score rows are stored pre-serialized, so reads only decode the list
+    await _store(
+        user_id,
+        mode,
+        {
+            "max_id": orjson.dumps(max_id),
+            "count": orjson.dumps(count),
+            "scores": orjson.dumps(
+                [serialize(score).decode() for score in _scores],
+            ),
+        },
+    )
+
+    return {"scores": _scores, "count": count}
+
+
+async def _fetch_cached(user_id: int, mode: int, *fields: str) -> list[bytes | None]:
+    cached: list[bytes | None] = await clients.redis.hmget(  # type: ignore[misc]
+        _key(user_id, mode),
+        list(fields),
+    )
+    return cached
+
+
+async def _fetch_max_id(user_id: int, mode: int) -> int | None:
+    return await scores.fetch_max_id(
+        user_id=user_id,
+        mode=mode,
+        score_statuses=TOP_PLAYS_SCORE_STATUSES,
+    )
+
+
+async def fetch_top_plays(user_id: int, mode: int) -> TopPlays | ServiceError:
+    """
+    Fetch the 100 best scores of a user along with their total number of best scores.
+
+    The cached entry is tagged with the id of the user's latest best score and
+    is only rebuilt once that id changes, which costs a single MAX(id) lookup
+    per request instead of sorting the user's scores.
+    """
+    try:
+        max_id, (cached_max_id, count, entry) = await asyncio.gather(
+            _fetch_max_id(user_id, mode),
+            _fetch_cached(user_id, mode, "max_id", "count", "scores"),
+        )
+
+        if (
+            entry is not None
+            and count is not None
+            and cached_max_id is not None
+            and orjson.loads(cached_max_id) == max_id
+        ):
+            return {
+                "scores": [deserialize(score) for score in orjson.loads(entry)],
+                "count": orjson.loads(count),
+            }
+
+        return await _fill(user_id, mode, max_id)
+    except Exception as exc:
+        logger.error("Failed to fetch top plays", exc_info=exc)
+        return ServiceError.INTERNAL_SERVER_ERROR
+
+
+async def fetch_count(user_id: int, mode: int) -> int | ServiceError:
+    """
+    Fetch only the total number of best scores of a user, e.g. for their profile.
+
+    Reads the count field of the cached entry alone, and on a miss counts
+    the scores without fetching the top 100 ones.
+    """
+    try:
+        max_id, (cached_max_id, cached_count) = await asyncio.gather(
+            _fetch_max_id(user_id, mode),
+            _fetch_cached(user_id, mode, "max_id", "count"),
+        )
+
+        if (
+            cached_count is not None
+            and cached_max_id is not None
+            and orjson.loads(cached_max_id) == max_id
+        ):
+            return int(orjson.loads(cached_count))
+
+        count = await _count(user_id, mode)
+        await _store(
+            user_id,
+            mode,
+            {"max_id": orjson.dumps(max_id), "count": orjson.dumps(count)},
+        )
+        return count
+    except Exception as exc:
+        logger.error("Failed to count top plays", exc_info=exc)
+        return ServiceError.INTERNAL_SERVER_ERROR
+
+
+async def invalidate(user_id: int, mode: int) -> None:
+    await clients.redis.delete(_key(user_id, mode))
+
+
+async def submit(score: Score) -> None:
+    """Drop the cached top plays of the user of a new best score."""
+    if score["status"] in TOP_PLAYS_SCORE_STATUSES:
+        await invalidate(score["userid"], score["mode"])
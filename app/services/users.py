@@ -1,16 +1,61 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import TypedDict
 
+from common import cache
 from common import logger
 from errors import ServiceError
+from repositories import loaders
 from repositories import users
 from repositories.users import User
 
 
-async def fetch_by_user_id(id: int) -> User | ServiceError:
+class PublicUser(TypedDict):
+    """The columns of a user which may be shown, leaving credentials and contact details out."""
+
+    id: int
+    name: str
+    safe_name: str
+    priv: int
+    country: str
+    silence_end: int
+    donor_end: int
+    creation_time: int
+    latest_activity: int
+    clan_id: int
+    clan_priv: int
+    preferred_mode: int
+    play_style: int
+    custom_badge_name: str | None
+    custom_badge_icon: str | None
+    userpage_content: str | None
+
+
+def to_public(user: User) -> PublicUser:
+    return {
+        "id": user["id"],
+        "name": user["name"],
+        "safe_name": user["safe_name"],
+        "priv": user["priv"],
+        "country": user["country"],
+        "silence_end": user["silence_end"],
+        "donor_end": user["donor_end"],
+        "creation_time": user["creation_time"],
+        "latest_activity": user["latest_activity"],
+        "clan_id": user["clan_id"],
+        "clan_priv": user["clan_priv"],
+        "preferred_mode": user["preferred_mode"],
+        "play_style": user["play_style"],
+        "custom_badge_name": user["custom_badge_name"],
+        "custom_badge_icon": user["custom_badge_icon"],
+        "userpage_content": user["userpage_content"],
+    }
+
+
+@cache.cached("users.id", ttl=60, schema=PublicUser)
+async def fetch_by_user_id(id: int) -> PublicUser | ServiceError:
     try:
-        user = await users.fetch_by_user_id(id)
+        user = await loaders.users.load(id)
     except Exception as exc:
         logger.error("Failed to fetch account", exc_info=exc)
         return ServiceError.INTERNAL_SERVER_ERROR
@@ -18,10 +63,11 @@ async def fetch_by_user_id(id: int) -> User | ServiceError:
     if user is None:
         return ServiceError.USERS_NOT_FOUND
 
-    return user
+    return to_public(user)
 
 
-async def fetch_by_username(username: str) -> User | ServiceError:
+@cache.cached("users.name", ttl=60, schema=PublicUser)
+async def fetch_by_username(username: str) -> PublicUser | ServiceError:
     try:
         user = await users.fetch_by_username(username)
     except Exception as exc:
@@ -31,4 +77,4 @@ async def fetch_by_username(username: str) -> User | ServiceError:
     if user is None:
         return ServiceError.USERS_NOT_FOUND
 
-    return user
+    return to_public(user)
@@ -5,12 +5,20 @@ from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 from typing import Any
 
+from adapters import admission
 from api import rest_api_router
+from common import clients
+from common import deadlines
 from common import lifecycle
 from common import logger
 from common import settings
 from fastapi import FastAPI
+from fastapi import Request
+from fastapi import Response
+from fastapi import status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import RequestResponseEndpoint
 
 logger.configure_logging(
     app_env=settings.APP_ENV,
@@ -29,6 +37,42 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[Any, Any]:
 
 app = FastAPI(lifespan=lifespan)
 
+
+def _overloaded() -> Response:
+    return JSONResponse(
+        content={"error": "Server is overloaded, try again later."},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.middleware("http")
+async def shed_load(request: Request, call_next: RequestResponseEndpoint) -> Response:
+    """
+    Fail fast with a 503 while the database is overloaded.
+
+    Requests are refused upfront while every pool they could read from has
+    a full queue, and answered with a 503 if any of their queries got refused,
+    rather than with whatever the services made of the missing data.
+    """
+    if request.url.path == "/metrics":
+        return await call_next(request)
+
+    if clients.database.overloaded:
+        return _overloaded()
+
+    with admission.track_rejections() as rejections:
+        response = await call_next(request)
+
+    if rejections:
+        return _overloaded()
+
+    return response
+
+
+app.add_middleware(deadlines.DeadlineMiddleware)
+
+# added last, so it wraps every other middleware and the 503s get cors headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -0,0 +1,217 @@
+"""
+Benchmark of the `databases` read path against the raw driver path, on a 100-score query.
+
+By default the driver underneath both paths is replaced by an in-memory one,
+returning the same 100 synthetic score rows for every query, so what is
+measured is their client side cost alone (query compilation, row mapping and
+dict building) and no database is needed. With --live, the query runs against
+the configured database instead.
+
+Usage (from the repository root, with a populated .env):
+    python scripts/bench_database.py [--live]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Generator
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from adapters import database  # noqa: E402
+from common import clients  # noqa: E402
+from common import lifecycle  # noqa: E402
+from pymysql.constants import FIELD_TYPE  # type: ignore[import-untyped]  # noqa: E402
+from repositories.scores import READ_PARAMS  # noqa: E402
+
+ROUNDS = 500
+
+QUERY = f"""
+    SELECT {READ_PARAMS}
+    FROM scores s
+    LEFT JOIN maps m ON s.map_md5 = m.md5
+    WHERE s.mode = :mode
+    ORDER BY s.id DESC
+    LIMIT :page_size
+"""
+VALUES = {"mode": 0, "page_size": 100}
+
+# columns of READ_PARAMS, as the driver describes them
+COLUMNS = (
+    ("id", FIELD_TYPE.LONGLONG),
+    ("map_md5", FIELD_TYPE.VAR_STRING),
+    ("score", FIELD_TYPE.LONG),
+    ("pp", FIELD_TYPE.FLOAT),
+    ("acc", FIELD_TYPE.FLOAT),
+    ("max_combo", FIELD_TYPE.LONG),
+    ("mods", FIELD_TYPE.LONG),
+    ("n300", FIELD_TYPE.LONG),
+    ("n100", FIELD_TYPE.LONG),
+    ("n50", FIELD_TYPE.LONG),
+    ("nmiss", FIELD_TYPE.LONG),
+    ("ngeki", FIELD_TYPE.LONG),
+    ("nkatu", FIELD_TYPE.LONG),
+    ("grade", FIELD_TYPE.VAR_STRING),
+    ("status", FIELD_TYPE.TINY),
+    ("mode", FIELD_TYPE.TINY),
+    ("play_time", FIELD_TYPE.DATETIME),
+    ("time_elapsed", FIELD_TYPE.LONG),
+    ("client_flags", FIELD_TYPE.LONG),
+    ("userid", FIELD_TYPE.LONG),
+    ("perfect", FIELD_TYPE.TINY),
+    ("beatmap_id", FIELD_TYPE.LONG),
+    ("artist", FIELD_TYPE.VAR_STRING),
+    ("title", FIELD_TYPE.VAR_STRING),
+    ("version", FIELD_TYPE.VAR_STRING),
+)
+DESCRIPTION = tuple(
+    (name, type_code, None, None, None, None, True) for name, type_code in COLUMNS
+)
+ROWS = [
+    (
+        i,
+        "0" * 32,
+        1_000_000 + i,
+        727.27,
+        98.76,
+        1337,
+        72,
+        900,
+        20,
+        1,
+        0,
+        200,
+        10,
+        "S",
+        2,
+        0,
+        datetime(2025, 1, 1, 12, 0, 0),
+        120_000,
+        0,
+        3,
+        0,
+        1000000000 + i,
+        "artist",
+        "title",
+        "version",
+    )
+    for i in range(VALUES["page_size"])
+]
+
+
+class _Acquired:
+    """Like aiomysql's context managers, both awaitable and usable with `async with`."""
+
+    def __init__(self, value: Any) -> None:
+        self._value = value
+
+    def __await__(self) -> Generator[Any, None, Any]:
+        yield from asyncio.sleep(0).__await__()
+        return self._value
+
+    async def __aenter__(self) -> Any:
+        return self._value
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        pass
+
+
+class _Cursor:
+    description = DESCRIPTION
+
+    async def execute(self, query: str, args: Any = None) -> int:
+        return len(ROWS)
+
+    async def fetchall(self) -> list[tuple[Any, ...]]:
+        return ROWS
+
+    async def fetchone(self) -> tuple[Any, ...]:
+        return ROWS[0]
+
+    async def close(self) -> None:
+        pass
+
+
+class _Connection:
+    def cursor(self, *args: Any) -> _Acquired:
+        return _Acquired(_Cursor())
+
+
+class _Pool:
+    def acquire(self) -> _Acquired:
+        return _Acquired(_Connection())
+
+    def release(self, connection: _Connection) -> asyncio.Future[None]:
+        released = asyncio.get_running_loop().create_future()
+        released.set_result(None)
+        return released
+
+
+def synthetic_database() -> database.Database:
+    """A `Database` whose pools are all backed by the in-memory driver."""
+    dsn = database.dsn("mysql", "bench", "bench", "localhost", 3306, "bench")
+    db = database.Database(
+        read_dsns=[dsn],
+        read_db_ssl=False,
+        write_dsn=dsn,
+        write_db_ssl=False,
+        read_min_pool_size=1,
+        read_max_pool_size=10,
+        write_min_pool_size=1,
+        write_max_pool_size=10,
+    )
+    for replica in (*db.replicas, db.primary):
+        replica.pool._backend._pool = _Pool()
+        replica.pool.is_connected = True
+        replica.raw_pool._pool = _Pool()
+
+    return db
+
+
+async def measure(
+    name: str,
+    fetch: Callable[[str, dict[str, Any]], Awaitable[Any]],
+) -> None:
+    await fetch(QUERY, VALUES)  # warm up the pool and the caches
+
+    started_at = time.perf_counter()
+    for _ in range(ROUNDS):
+        await fetch(QUERY, VALUES)
+    elapsed = time.perf_counter() - started_at
+
+    print(f"{name:>12}: {elapsed / ROUNDS * 1000:.3f} msec per query")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--live",
+        action="store_true",
+        help="query the configured database rather than synthetic rows",
+    )
+    args = parser.parse_args()
+
+    if args.live:
+        await lifecycle.connect()
+        db = clients.database
+    else:
+        db = synthetic_database()
+
+    try:
+        await measure("databases", db.fetch_all)
+        await measure("raw", db.raw.fetch_all)
+    finally:
+        if args.live:
+            await lifecycle.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
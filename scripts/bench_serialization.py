@@ -0,0 +1,124 @@
+"""
+Micro-benchmark of the v2 score serialization paths for a 100-score payload.
+
+Usage (from the repository root, with a populated .env):
+    python scripts/bench_serialization.py
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import timeit
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from api.v2.beatmaps.models import Score  # noqa: E402
+from api.v2.scores import serializers  # noqa: E402
+from common.mods import Mods  # noqa: E402
+from common.utils import GameMode  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from repositories.scores import Score as ScoreRow  # noqa: E402
+
+PAYLOAD_SIZE = 100
+ROUNDS = 200
+
+
+def make_rows() -> list[ScoreRow]:
+    return [
+        {
+            "id": i,
+            "map_md5": "0" * 32,
+            "score": 1_000_000 + i,
+            "pp": 727.27,
+            "acc": 98.76,
+            "max_combo": 1337,
+            "mods": int(Mods.HIDDEN | Mods.DOUBLETIME),
+            "n300": 900,
+            "n100": 20,
+            "n50": 1,
+            "nmiss": 0,
+            "ngeki": 200,
+            "nkatu": 10,
+            "grade": "S",
+            "status": 2,
+            "mode": 0,
+            "play_time": datetime(2025, 1, 1, 12, 0, 0),
+            "time_elapsed": 120_000,
+            "client_flags": 0,
+            "userid": 3,
+            "perfect": False,
+            "beatmap_id": 1000000000 + i,
+            "artist": "artist",
+            "title": "title",
+            "version": "version",
+        }
+        for i in range(PAYLOAD_SIZE)
+    ]
+
+
+def pydantic_path(rows: list[ScoreRow]) -> bytes:
+    # what the controllers used to do, followed by FastAPI's serialization
+    validated = [
+        Score.model_validate(
+            {
+                "accuracy": row["acc"] / 100,
+                "best_id": row["id"],
+                "ended_at": row["play_time"].strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "id": row["id"],
+                "max_combo": row["max_combo"],
+                "mode": repr(GameMode(row["mode"])),
+                "ruleset_id": repr(GameMode(row["mode"])),
+                "mods": Mods.to_array(row["mods"]),
+                "passed": True,
+                "perfect": bool(row["perfect"]),
+                "pp": row["pp"],
+                "rank": row["grade"],
+                "replay": False,
+                "classic_total_score": row["score"],
+                "total_score": row["score"],
+                "statistics": {
+                    "count_100": row["n100"],
+                    "count_300": row["n300"],
+                    "count_50": row["n50"],
+                    "count_geki": row["ngeki"],
+                    "count_katu": row["nkatu"],
+                    "count_miss": row["nmiss"],
+                },
+                "maximum_statistics": {
+                    "count_100": 0,
+                    "count_300": 0,
+                    "count_50": 0,
+                    "count_geki": 0,
+                    "count_katu": 0,
+                    "count_miss": 0,
+                },
+                "type": "score_best_osu",
+                "user_id": row["userid"],
+                "current_user_attributes": {"pin": None},
+            },
+        )
+        for row in rows
+    ]
+    content: Any = jsonable_encoder([score.model_dump() for score in validated])
+    return json.dumps(content, separators=(",", ":")).encode()
+
+
+def encoder_path(rows: list[ScoreRow]) -> bytes:
+    response = serializers.render([serializers.encode_score(row) for row in rows])
+    return bytes(response.body)
+
+
+def main() -> None:
+    rows = make_rows()
+
+    for name, path in (("pydantic", pydantic_path), ("encoder", encoder_path)):
+        elapsed = timeit.timeit(lambda: path(rows), number=ROUNDS)
+        print(f"{name:>10}: {elapsed / ROUNDS * 1000:.3f} msec per payload")
+
+
+if __name__ == "__main__":
+    main()
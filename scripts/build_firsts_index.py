@@ -0,0 +1,38 @@
+"""
+Rebuild the first places index served by /api/v2/users/{user}/scores/firsts.
+
+The index is kept up to date as new scores come in; this job only needs to
+run once to bootstrap it, and again whenever scores were deleted or beatmaps
+changed status behind the API's back.
+
+Usage (from the repository root, with a populated .env):
+    python scripts/build_firsts_index.py
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from common import lifecycle  # noqa: E402
+from services import firsts  # noqa: E402
+
+
+async def main() -> None:
+    await lifecycle.connect()
+
+    try:
+        started_at = time.perf_counter()
+        count = await firsts.rebuild()
+        elapsed = time.perf_counter() - started_at
+        print(f"Indexed {count} first places in {elapsed:.2f} seconds")
+    finally:
+        await lifecycle.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
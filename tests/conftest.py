@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from dotenv import load_dotenv
+from fakeredis import FakeAsyncRedis
+from redis.asyncio import Redis
+
+# settings are read from the environment on import, so fall back to the example ones
+load_dotenv(Path(__file__).resolve().parent.parent / ".env.example")
+
+from common import clients  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture
+def redis(monkeypatch: pytest.MonkeyPatch) -> Iterator[Redis]:
+    fake_redis = FakeAsyncRedis()
+    monkeypatch.setattr(clients, "redis", fake_redis, raising=False)
+    yield fake_redis
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any
+
+from common.utils import SubmissionStatus
+from repositories.scores import Score
+
+
+def make_score(**fields: Any) -> Score:
+    score: Score = {
+        "id": 1,
+        "map_md5": "a" * 32,
+        "score": 1_000_000,
+        "pp": 100.0,
+        "acc": 99.0,
+        "max_combo": 500,
+        "mods": 0,
+        "n300": 400,
+        "n100": 10,
+        "n50": 0,
+        "nmiss": 0,
+        "ngeki": 80,
+        "nkatu": 5,
+        "grade": "S",
+        "status": SubmissionStatus.BEST,
+        "mode": 0,
+        "play_time": datetime(2025, 1, 1, 12, 0),
+        "time_elapsed": 120_000,
+        "client_flags": 0,
+        "userid": 3,
+        "perfect": False,
+        "beatmap_id": 75,
+        "artist": "Kenji Ninuma",
+        "title": "DISCO PRINCE",
+        "version": "Normal",
+    }
+    return score | fields  # type: ignore[return-value]
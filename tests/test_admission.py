@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from adapters import admission
+from adapters.admission import AdmissionController
+from adapters.admission import OverloadedError
+
+pytestmark = pytest.mark.anyio
+
+
+def make_controller(
+    capacity: int = 1,
+    max_queue_depth: int = 1,
+    queue_target: float = 0.01,
+    queue_timeout: float = 1.0,
+) -> AdmissionController:
+    return AdmissionController(
+        name="test",
+        capacity=capacity,
+        max_queue_depth=max_queue_depth,
+        queue_target=queue_target,
+        queue_timeout=queue_timeout,
+    )
+
+
+async def test_queries_within_capacity_run_right_away() -> None:
+    controller = make_controller(capacity=2)
+
+    await controller.acquire()
+    await controller.acquire()
+
+    assert controller.in_use == 2
+    assert controller.waiting == 0
+
+    controller.release()
+    controller.release()
+    assert controller.in_use == 0
+
+
+async def test_slots_are_handed_over_in_order() -> None:
+    controller = make_controller(max_queue_depth=2)
+    await controller.acquire()
+    order: list[int] = []
+
+    async def query(i: int) -> None:
+        async with controller.slot():
+            order.append(i)
+
+    queued = [asyncio.ensure_future(query(i)) for i in range(2)]
+    await asyncio.sleep(0)
+    assert controller.waiting == 2
+
+    controller.release()
+    await asyncio.gather(*queued)
+
+    assert order == [0, 1]
+    assert controller.in_use == 0
+
+
+async def test_full_queue_refuses_queries() -> None:
+    controller = make_controller(max_queue_depth=1)
+    await controller.acquire()
+    queued = asyncio.ensure_future(controller.acquire())
+    await asyncio.sleep(0)
+
+    assert controller.saturated
+    with admission.track_rejections() as rejections:
+        with pytest.raises(OverloadedError, match="queue full"):
+            await controller.acquire()
+
+    assert len(rejections) == 1
+    assert controller.rejected == 1
+
+    controller.release()
+    await queued
+    assert controller.in_use == 1
+
+
+async def test_queue_timeout_refuses_queries() -> None:
+    controller = make_controller(queue_timeout=0.01)
+    await controller.acquire()
+
+    with pytest.raises(OverloadedError, match="queue timeout"):
+        await controller.acquire()
+
+    assert controller.waiting == 0
+    assert controller.in_use == 1
+
+
+async def test_cancelled_waiters_leave_the_queue() -> None:
+    controller = make_controller()
+    await controller.acquire()
+    queued = asyncio.ensure_future(controller.acquire())
+    await asyncio.sleep(0)
+
+    queued.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+
+    assert controller.waiting == 0
+    controller.release()
+    assert controller.in_use == 0
+
+
+async def test_standing_queue_marks_the_pool_overloaded(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(admission, "_INTERVAL", 0.02)
+    controller = make_controller(
+        max_queue_depth=2,
+        queue_target=0.005,
+        queue_timeout=1.0,
+    )
+    await controller.acquire()
+    queued = asyncio.ensure_future(controller.acquire())
+
+    # the first interval still saw a query admitted without delay
+    await asyncio.sleep(0.03)
+    assert not controller.overloaded
+
+    # while nothing left the queue for the whole next one
+    await asyncio.sleep(0.03)
+    assert controller.overloaded
+
+    # once overloaded, queries only wait up to the target delay
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    with pytest.raises(OverloadedError, match="queue timeout"):
+        await controller.acquire()
+    assert loop.time() - started_at < 0.5
+
+    controller.release()
+    await queued
+    controller.release()
+
+
+async def test_rejections_outside_a_tracked_block_are_not_recorded() -> None:
+    controller = make_controller(max_queue_depth=0)
+    await controller.acquire()
+
+    with pytest.raises(OverloadedError):
+        await controller.acquire()
+
+    with admission.track_rejections() as rejections:
+        pass
+    assert rejections == []
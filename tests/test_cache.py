@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from datetime import datetime
+from typing import TypedDict
+
+import orjson
+import pytest
+from common import cache
+from common.cache import Schema
+from errors import ServiceError
+from redis.asyncio import Redis
+
+
+class Badge(TypedDict):
+    name: str
+    icon: str | None
+
+
+class Player(TypedDict):
+    id: int
+    pp: float
+    verified: bool
+    joined_at: datetime
+    badge_name: str | None
+    badges: list[Badge]
+
+
+PLAYER: Player = {
+    "id": 3,
+    "pp": 727.27,
+    "verified": True,
+    "joined_at": datetime(2025, 1, 1, 12, 30),
+    "badge_name": None,
+    "badges": [{"name": "dev", "icon": None}, {"name": "gmt", "icon": "gmt.png"}],
+}
+
+
+def round_trip(schema: Schema, value: object) -> object:
+    return schema.load(orjson.loads(orjson.dumps(schema.dump(value))))
+
+
+def test_typed_dict_round_trip() -> None:
+    assert round_trip(Schema(Player), PLAYER) == PLAYER
+
+
+def test_none_round_trips_as_none() -> None:
+    assert round_trip(Schema(str | None), None) is None
+    assert round_trip(Schema(Player), PLAYER)["badge_name"] is None  # type: ignore[index]
+
+
+def test_undeclared_keys_are_dropped() -> None:
+    dumped = Schema(Badge).dump({"name": "dev", "icon": None, "secret": "hunter2"})
+
+    assert dumped == {"name": "dev", "icon": None}
+
+
+def test_scalars_are_not_coerced() -> None:
+    assert Schema(float).load(1) == 1.0
+    assert round_trip(Schema(bool), 1) is True
+
+    with pytest.raises(ValueError):
+        Schema(int).load("1")
+    with pytest.raises(ValueError):
+        Schema(str).load(1)
+
+
+@pytest.mark.parametrize("tp", [int, float, bool, str, datetime])
+def test_null_in_a_non_optional_field_is_rejected(tp: type) -> None:
+    with pytest.raises(ValueError):
+        Schema(tp).dump(None)
+    with pytest.raises(ValueError):
+        Schema(tp).load(None)
+
+
+def test_missing_key_is_rejected() -> None:
+    with pytest.raises(KeyError):
+        Schema(Badge).load({"name": "dev"})
+
+
+def test_unsupported_types_are_rejected() -> None:
+    with pytest.raises(TypeError):
+        Schema(int | str)
+    with pytest.raises(TypeError):
+        Schema(dict[str, int])
+
+
+@pytest.mark.anyio
+async def test_cached_values_round_trip_through_redis(
+    redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    calls = 0
+
+    @cache.cached("tests.players", ttl=60, schema=Player | None)
+    async def fetch_player(player_id: int) -> Player | ServiceError | None:
+        nonlocal calls
+        calls += 1
+        if player_id == 404:
+            return ServiceError.USERS_NOT_FOUND
+        return PLAYER if player_id == 3 else None
+
+    for player_id, expected in (
+        (3, PLAYER),
+        (4, None),
+        (404, ServiceError.USERS_NOT_FOUND),
+    ):
+        assert await fetch_player(player_id) == expected
+        # a fresh process only has the redis copy to go by
+        monkeypatch.setattr(cache, "_l1", cache.LRUCache(cache.L1_MAX_SIZE))
+        assert await fetch_player(player_id) == expected
+
+    assert calls == 3
+
+
+@pytest.mark.anyio
+async def test_internal_errors_are_not_cached(redis: Redis) -> None:
+    calls = 0
+
+    @cache.cached("tests.errors", ttl=60, schema=int)
+    async def fetch() -> int | ServiceError:
+        nonlocal calls
+        calls += 1
+        return ServiceError.INTERNAL_SERVER_ERROR
+
+    await fetch()
+    await fetch()
+
+    assert calls == 2
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import base64
+
+from common import cursor
+
+
+def test_round_trip() -> None:
+    payload = {"id": 123, "pp": 727.5, "name": "cookiezi"}
+
+    assert cursor.decode(cursor.encode(payload)) == payload
+
+
+def test_encoded_cursor_is_url_safe() -> None:
+    cursor_string = cursor.encode({"name": "???>>>" * 10})
+
+    assert "=" not in cursor_string
+    assert "+" not in cursor_string
+    assert "/" not in cursor_string
+
+
+def test_tampered_payload_is_rejected() -> None:
+    token = base64.urlsafe_b64decode(cursor.encode({"id": 1}) + "==")
+    forged = token.replace(b'"id":1', b'"id":9')
+    forged_string = base64.urlsafe_b64encode(forged).rstrip(b"=").decode()
+
+    assert cursor.decode(forged_string) is None
+
+
+def test_unsigned_payload_is_rejected() -> None:
+    unsigned = base64.urlsafe_b64encode(b"\0" * 16 + b'{"id":1}').decode()
+
+    assert cursor.decode(unsigned) is None
+
+
+def test_garbage_is_rejected() -> None:
+    assert cursor.decode("") is None
+    assert cursor.decode("not a cursor!") is None
+    assert cursor.decode("a") is None
+
+
+def test_non_object_payload_is_rejected() -> None:
+    assert cursor.decode(cursor.encode([1, 2, 3])) is None  # type: ignore[arg-type]
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Mapping
+
+import pytest
+from common.dataloader import DataLoader
+
+pytestmark = pytest.mark.anyio
+
+
+class Recorder:
+    def __init__(self, fail: bool = False) -> None:
+        self.batches: list[list[int]] = []
+        self.fail = fail
+
+    async def __call__(self, keys: list[int]) -> Mapping[int, str]:
+        self.batches.append(keys)
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("batch failed")
+
+        # key 0 stands for a missing row
+        return {key: f"row {key}" for key in keys if key != 0}
+
+
+async def test_same_tick_loads_are_batched() -> None:
+    batch_load = Recorder()
+    loader = DataLoader(batch_load)
+
+    results = await asyncio.gather(loader.load(1), loader.load(2), loader.load(3))
+
+    assert list(results) == ["row 1", "row 2", "row 3"]
+    assert batch_load.batches == [[1, 2, 3]]
+
+
+async def test_duplicate_keys_are_loaded_once() -> None:
+    batch_load = Recorder()
+    loader = DataLoader(batch_load)
+
+    results = await loader.load_many([1, 1, 2])
+
+    assert results == ["row 1", "row 1", "row 2"]
+    assert batch_load.batches == [[1, 2]]
+
+
+async def test_inflight_keys_are_not_loaded_again() -> None:
+    batch_load = Recorder()
+    loader = DataLoader(batch_load)
+
+    first = asyncio.ensure_future(loader.load(1))
+    await asyncio.sleep(0)  # the batch of key 1 is now being loaded
+    second = await loader.load(1)
+
+    assert await first == second == "row 1"
+    assert batch_load.batches == [[1]]
+
+
+async def test_missing_keys_resolve_to_none() -> None:
+    loader = DataLoader(Recorder())
+
+    assert await loader.load_many([0, 1]) == [None, "row 1"]
+
+
+async def test_batches_are_split_by_max_size() -> None:
+    batch_load = Recorder()
+    loader = DataLoader(batch_load, max_batch_size=2)
+
+    await loader.load_many([1, 2, 3, 4, 5])
+
+    assert batch_load.batches == [[1, 2], [3, 4], [5]]
+
+
+async def test_later_ticks_get_a_new_batch() -> None:
+    batch_load = Recorder()
+    loader = DataLoader(batch_load)
+
+    await loader.load(1)
+    await loader.load(1)
+
+    assert batch_load.batches == [[1], [1]]
+
+
+async def test_window_widens_the_batch() -> None:
+    batch_load = Recorder()
+    loader = DataLoader(batch_load, window=0.01)
+
+    async def load_later(key: int) -> str | None:
+        await asyncio.sleep(0)
+        return await loader.load(key)
+
+    await asyncio.gather(loader.load(1), load_later(2))
+
+    assert batch_load.batches == [[1, 2]]
+
+
+async def test_errors_fail_every_key_of_the_batch() -> None:
+    loader = DataLoader(Recorder(fail=True))
+
+    results = await asyncio.gather(
+        loader.load(1),
+        loader.load(2),
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_errors_are_not_remembered() -> None:
+    batch_load = Recorder(fail=True)
+    loader = DataLoader(batch_load)
+
+    with pytest.raises(RuntimeError):
+        await loader.load(1)
+
+    batch_load.fail = False
+    assert await loader.load(1) == "row 1"
+
+
+async def test_cancelled_caller_does_not_cancel_the_others() -> None:
+    loader = DataLoader(Recorder())
+
+    cancelled = asyncio.ensure_future(loader.load(1))
+    other = asyncio.ensure_future(loader.load(1))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+
+    assert await other == "row 1"
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable
+from collections.abc import Callable
+from collections.abc import Mapping
+from typing import Any
+from typing import TypeVar
+
+import httpx
+import pytest
+from adapters import admission
+from adapters.admission import OverloadedError
+from common import cache
+from common import deadlines
+from common import settings
+from common.dataloader import DataLoader
+from redis.asyncio import Redis
+from starlette.types import Receive
+from starlette.types import Scope
+from starlette.types import Send
+
+pytestmark = pytest.mark.anyio
+
+T = TypeVar("T")
+
+
+async def within(seconds: float, work: Callable[[], Awaitable[T]]) -> T:
+    """Run work on behalf of a request with the given time left, in a task of its own."""
+
+    async def run() -> T:
+        deadlines._DEADLINE_CONTEXT.set(asyncio.get_running_loop().time() + seconds)
+        return await work()
+
+    return await asyncio.create_task(run())
+
+
+async def test_no_deadline_outside_requests() -> None:
+    assert deadlines.remaining() is None
+
+    async with deadlines.timeout():
+        await asyncio.sleep(0)
+
+
+async def test_remaining_time_of_the_request() -> None:
+    async def check() -> float | None:
+        return deadlines.remaining()
+
+    remaining = await within(10, check)
+
+    assert remaining is not None
+    assert 9 < remaining <= 10
+
+
+def test_routes_get_their_own_deadline() -> None:
+    assert deadlines.timeout_for("/api/v2/scores/stream") is None
+    assert deadlines.timeout_for("/api/v2/scores/123/download") == 30.0
+    assert deadlines.timeout_for("/osu/75") == 30.0
+    assert deadlines.timeout_for("/api/v2/users/3") == 5.0
+
+
+async def test_detached_work_has_no_deadline() -> None:
+    async def check() -> float | None:
+        return deadlines.remaining()
+
+    async def start_shared_work() -> float | None:
+        return await asyncio.create_task(check(), context=deadlines.detached())
+
+    assert await within(10, start_shared_work) is None
+
+
+async def test_shared_work_outlives_a_caller_past_its_deadline() -> None:
+    finished = asyncio.Event()
+
+    async def shared_work() -> str:
+        await asyncio.sleep(0.05)
+        finished.set()
+        return "done"
+
+    task = asyncio.create_task(shared_work(), context=deadlines.detached())
+
+    with pytest.raises(TimeoutError):
+        await within(0.01, lambda: deadlines.wait_shared(task))
+    assert await within(10, lambda: deadlines.wait_shared(task)) == "done"
+    assert finished.is_set()
+
+
+async def test_batch_is_not_bound_by_the_first_caller() -> None:
+    seen_remaining: list[float | None] = []
+
+    async def batch_load(keys: list[int]) -> Mapping[int, str]:
+        seen_remaining.append(deadlines.remaining())
+        await asyncio.sleep(0.05)
+        return {key: f"row {key}" for key in keys}
+
+    loader = DataLoader(batch_load)
+
+    hurried, patient = await asyncio.gather(
+        within(0.01, lambda: loader.load(1)),
+        within(10, lambda: loader.load(1)),
+        return_exceptions=True,
+    )
+
+    assert isinstance(hurried, TimeoutError)
+    assert patient == "row 1"
+    assert seen_remaining == [None]
+
+
+async def test_cached_load_is_not_bound_by_the_first_caller(redis: Redis) -> None:
+    @cache.cached("tests.deadlines", ttl=60, schema=int)
+    async def slow_count() -> int:
+        assert deadlines.remaining() is None
+        await asyncio.sleep(0.05)
+        return 727
+
+    hurried, patient = await asyncio.gather(
+        within(0.01, slow_count),
+        within(10, slow_count),
+        return_exceptions=True,
+    )
+
+    assert isinstance(hurried, TimeoutError)
+    assert patient == 727
+
+
+async def tracked(work: Callable[[], Awaitable[Any]]) -> int:
+    """Count the refused queries a request is told about."""
+    with admission.track_rejections() as rejections:
+        try:
+            await work()
+        except OverloadedError:
+            pass
+    return len(rejections)
+
+
+async def test_refused_batches_are_reported_to_every_caller() -> None:
+    async def batch_load(keys: list[int]) -> Mapping[int, str]:
+        await asyncio.sleep(0)
+        raise OverloadedError("queue full")
+
+    loader = DataLoader(batch_load)
+
+    rejections = await asyncio.gather(
+        tracked(lambda: loader.load(1)),
+        tracked(lambda: loader.load(1)),
+    )
+
+    assert list(rejections) == [1, 1]
+
+
+async def test_refused_cached_loads_are_reported_to_every_caller(
+    redis: Redis,
+) -> None:
+    calls = 0
+
+    @cache.cached("tests.rejections", ttl=60, schema=int)
+    async def count() -> int:
+        nonlocal calls
+        calls += 1
+        # as a service would, turning the failure into an error value
+        admission.record_rejections([OverloadedError("queue full")])
+        await asyncio.sleep(0)
+        return 0
+
+    assert list(await asyncio.gather(tracked(count), tracked(count))) == [1, 1]
+    # a result computed while queries were refused isn't cached
+    await count()
+    assert calls == 2
+
+
+async def request(app: deadlines.DeadlineMiddleware, path: str) -> httpx.Response:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path)
+
+
+async def test_middleware_bounds_requests_by_their_deadline(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "REQUEST_DEADLINE", 50)
+    seen_remaining: list[float | None] = []
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        seen_remaining.append(deadlines.remaining())
+        if scope["path"] == "/slow":
+            await asyncio.sleep(1)
+
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    middleware = deadlines.DeadlineMiddleware(app)
+
+    fast = await request(middleware, "/fast")
+    slow = await request(middleware, "/slow")
+
+    assert fast.status_code == 200
+    assert slow.status_code == 504
+    assert slow.json() == {"error": "Request timed out."}
+    assert all(
+        remaining is not None and 0 < remaining <= 0.05 for remaining in seen_remaining
+    )
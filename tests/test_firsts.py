@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from common.utils import RankedStatus
+from common.utils import SubmissionStatus
+from factories import make_score
+from redis.asyncio import Redis
+from repositories import maps
+from repositories import scores
+from repositories.scores import FirstPlace
+from repositories.scores import Score
+from services import firsts
+
+pytestmark = pytest.mark.anyio
+
+MAP_A = "a" * 32
+MAP_B = "b" * 32
+
+
+class Database:
+    """Stands in for the scores and maps repositories."""
+
+    def __init__(self, monkeypatch: pytest.MonkeyPatch, rows: list[Score]) -> None:
+        self.rows = rows
+        self.map_statuses = {MAP_A: RankedStatus.Ranked, MAP_B: RankedStatus.Ranked}
+        monkeypatch.setattr(maps, "fetch_many_by_md5s", self.fetch_maps)
+        monkeypatch.setattr(scores, "fetch_many_by_ids", self.fetch_many_by_ids)
+        monkeypatch.setattr(scores, "fetch_max_id", self.fetch_max_id)
+        monkeypatch.setattr(scores, "fetch_first_places", self.fetch_first_places)
+        monkeypatch.setattr(scores, "fetch_many_after", self.fetch_many_after)
+
+    async def fetch_maps(self, md5s: list[str]) -> list[dict[str, Any]]:
+        return [{"md5": md5, "status": self.map_statuses[md5]} for md5 in md5s]
+
+    async def fetch_many_by_ids(self, ids: list[int]) -> list[Score]:
+        return [score for score in self.rows if score["id"] in ids]
+
+    async def fetch_max_id(self) -> int | None:
+        return max((score["id"] for score in self.rows), default=None)
+
+    async def fetch_first_places(self, **kwargs: Any) -> list[FirstPlace]:
+        best: dict[tuple[str, int], Score] = {}
+        for score in sorted(self.rows, key=lambda score: score["id"]):
+            key = (score["map_md5"], score["mode"])
+            if key not in best or score["score"] > best[key]["score"]:
+                best[key] = score
+
+        return [
+            {
+                "id": score["id"],
+                "map_md5": score["map_md5"],
+                "mode": score["mode"],
+                "score": score["score"],
+                "userid": score["userid"],
+            }
+            for score in best.values()
+        ]
+
+    async def fetch_many_after(self, id: int, limit: int) -> list[Score]:
+        return [score for score in self.rows if score["id"] > id][:limit]
+
+
+async def firsts_of(user_id: int, page: int = 1, page_size: int = 100) -> list[int]:
+    first_places = await firsts.fetch_many(user_id, 0, page, page_size)
+    assert isinstance(first_places, list)
+    return [score["id"] for score in first_places]
+
+
+async def submit(database: Database, **fields: Any) -> bool:
+    score = make_score(**fields)
+    database.rows.append(score)
+    return await firsts.submit(score)
+
+
+async def test_higher_score_takes_the_first_place(
+    redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    database = Database(monkeypatch, [])
+
+    assert await submit(database, id=1, userid=3, score=100)
+    assert await submit(database, id=2, userid=4, score=200)
+
+    assert await firsts_of(3) == []
+    assert await firsts_of(4) == [2]
+    assert await firsts.fetch_count(3, 0) == 0
+    assert await firsts.fetch_count(4, 0) == 1
+
+
+async def test_lower_and_tied_scores_do_not_take_the_first_place(
+    redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    database = Database(monkeypatch, [])
+    await submit(database, id=1, userid=3, score=100)
+
+    assert not await submit(database, id=2, userid=4, score=50)
+    assert not await submit(database, id=3, userid=4, score=100)
+    assert await firsts_of(3) == [1]
+    assert await firsts_of(4) == []
+
+
+async def test_resubmitted_first_place_is_kept(
+    redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    database = Database(monkeypatch, [])
+    score = make_score(id=1, userid=3, score=100)
+    database.rows.append(score)
+
+    assert await firsts.submit(score)
+    assert not await firsts.submit(score)
+    assert await firsts_of(3) == [1]
+
+
+async def test_only_best_scores_on_ranked_maps_count(
+    redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    database = Database(monkeypatch, [])
+    database.map_statuses[MAP_B] = RankedStatus.Pending
+
+    assert not await submit(database, id=1, map_md5=MAP_B)
+    assert not await submit(database, id=2, status=SubmissionStatus.SUBMITTED)
+    assert await firsts_of(3) == []
+
+
+async def test_first_places_are_paged_most_recent_first(
+    redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    database = Database(monkeypatch, [])
+    for i in range(5):
+        database.map_statuses[f"{i:032d}"] = RankedStatus.Ranked
+        await submit(database, id=i + 1, map_md5=f"{i:032d}")
+
+    assert await firsts_of(3, page=1, page_size=2) == [5, 4]
+    assert await firsts_of(3, page=3, page_size=2) == [1]
+
+
+async def test_page_size_is_clamped(
+    redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    database = Database(monkeypatch, [])
+    await submit(database, id=1, map_md5=MAP_A)
+    await submit(database, id=2, map_md5=MAP_B)
+
+    # rather than reading the range up to -1, i.e. the whole set
+    assert await firsts_of(3, page_size=0) == [2]
+    assert await firsts_of(3, page=0, page_size=-5) == [2]
+    assert await firsts_of(3, page_size=10**9) == [2, 1]
+
+
+async def test_rebuild_replaces_the_index(
+    redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    database = Database(
+        monkeypatch,
+        [
+            make_score(id=1, userid=3, score=100, map_md5=MAP_A),
+            make_score(id=2, userid=4, score=200, map_md5=MAP_A),
+            make_score(id=3, userid=3, score=100, map_md5=MAP_B),
+        ],
+    )
+    # a stale first place, no longer backed by the scores table
+    await submit(database, id=4, userid=5, score=999, map_md5=MAP_B)
+    database.rows.pop()
+
+    assert await firsts.rebuild() == 2
+
+    assert await firsts_of(3) == [3]
+    assert await firsts_of(4) == [2]
+    assert await firsts_of(5) == []
+    assert not [key async for key in redis.scan_iter("tomoe:firsts_rebuild:*")]
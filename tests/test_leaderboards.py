@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+from common.utils import SubmissionStatus
+from factories import make_score
+from redis.asyncio import Redis
+from repositories import scores
+from repositories.scores import Score
+from services import leaderboards
+
+pytestmark = pytest.mark.anyio
+
+MD5 = "a" * 32
+
+
+class Database:
+    """Stands in for the scores repository, counting the leaderboard reads."""
+
+    def __init__(self, monkeypatch: pytest.MonkeyPatch, rows: list[Score]) -> None:
+        self.rows = rows
+        self.reads = 0
+        monkeypatch.setattr(scores, "fetch_many", self.fetch_many)
+
+    async def fetch_many(self, **kwargs: Any) -> list[Score]:
+        self.reads += 1
+        ordered = sorted(self.rows, key=lambda s: (s["score"], s["id"]), reverse=True)
+        return ordered[: kwargs["page_size"]]
+
+
+def ids(leaderboard: object) -> list[int]:
+    assert isinstance(leaderboard, list)
+    return [score["id"] for score in leaderboard]
+
+
+async def test_cold_leaderboard_is_filled_once(
+    redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    database = Database(
+        monkeypatch,
+        [make_score(id=1, score=100), make_score(id=2, score=300)],
+    )
+
+    assert ids(await leaderboards.fetch_leaderboard(MD5, 0)) == [2, 1]
+    assert ids(await leaderboards.fetch_leaderboard(MD5, 0)) == [2, 1]
+    assert ids(await leaderboards.fetch_leaderboard(MD5, 0, limit=1)) == [2]
+    assert database.reads == 1
+
+
+async def test_empty_leaderboard_is_cached(
+    redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    database = Database(monkeypatch, [])
+
+    assert await leaderboards.fetch_leaderboard(MD5, 0) == []
+    assert await leaderboards.fetch_leaderboard(MD5, 0) == []
+    assert database.reads == 1
+
+
+async def test_ties_are_ordered_by_id(
+    redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    Database(monkeypatch, [make_score(id=id, score=100) for id in (9, 10, 100)])
+
+    assert ids(await leaderboards.fetch_leaderboard(MD5, 0)) == [100, 10, 9]
+
+
+async def test_submitted_scores_join_a_warm_leaderboard(
+    redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(leaderboards, "LEADERBOARD_SIZE", 2)
+    Database(monkeypatch, [make_score(id=1, score=100), make_score(id=2, score=200)])
+    await leaderboards.fetch_leaderboard(MD5, 0)
+
+    await leaderboards.submit(make_score(id=3, score=150))
+
+    assert ids(await leaderboards.fetch_leaderboard(MD5, 0)) == [2, 3]
+    # the payload of the evicted score went along with it
+    payload_ids = await redis.hkeys(  # type: ignore[misc]
+        f"tomoe:leaderboard:{MD5}:0:global:scores",
+    )
+    assert sorted(payload_ids) == [b"%020d" % 2, b"%020d" % 3]
+
+
+async def test_scores_submitted_during_a_fill_are_kept(
+    redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # the fill read the database before the new score was inserted
+    Database(monkeypatch, [make_score(id=1, score=100)])
+    await leaderboards.submit(make_score(id=2, score=200))
+
+    assert ids(await leaderboards.fetch_leaderboard(MD5, 0)) == [2, 1]
+    assert await redis.exists(f"tomoe:leaderboard:{MD5}:0:global:pending") == 0
+
+
+async def test_unranked_submissions_are_ignored(
+    redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    Database(monkeypatch, [make_score(id=1, score=100)])
+    await leaderboards.fetch_leaderboard(MD5, 0)
+
+    await leaderboards.submit(
+        make_score(id=2, score=200, status=SubmissionStatus.FAILED),
+    )
+
+    assert ids(await leaderboards.fetch_leaderboard(MD5, 0)) == [1]
+
+
+async def test_invalidated_leaderboard_is_filled_again(
+    redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    database = Database(monkeypatch, [make_score(id=1, score=100)])
+    await leaderboards.fetch_leaderboard(MD5, 0)
+
+    await leaderboards.invalidate(MD5, 0)
+    database.rows.append(make_score(id=2, score=200))
+
+    assert ids(await leaderboards.fetch_leaderboard(MD5, 0)) == [2, 1]
+    assert database.reads == 2
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import random
+
+import pytest
+from common.metrics import Histogram
+from common.metrics import fingerprint
+
+
+def test_empty_histogram() -> None:
+    histogram = Histogram()
+
+    assert histogram.quantile(0.5) == 0.0
+    assert histogram.summary() == {
+        "mean": 0.0,
+        "p50": 0.0,
+        "p95": 0.0,
+        "p99": 0.0,
+        "max": 0.0,
+    }
+
+
+@pytest.mark.parametrize("q", [0.5, 0.9, 0.95, 0.99])
+def test_quantiles_are_within_the_bucket_error(q: float) -> None:
+    rng = random.Random(727)
+    samples = sorted(rng.lognormvariate(-6, 1.5) for _ in range(10_000))
+    histogram = Histogram()
+    for sample in samples:
+        histogram.record(sample)
+
+    exact = samples[int(q * len(samples)) - 1]
+
+    assert exact <= histogram.quantile(q) <= exact * 1.125 + 1e-6
+
+
+def test_quantiles_never_exceed_the_max() -> None:
+    histogram = Histogram()
+    histogram.record(0.0101)
+
+    assert histogram.quantile(0.99) == 0.0101
+
+
+def test_summary_is_in_milliseconds() -> None:
+    histogram = Histogram()
+    histogram.record(0.001)
+    histogram.record(0.003)
+
+    summary = histogram.summary()
+
+    assert summary["mean"] == pytest.approx(2.0)
+    assert summary["max"] == pytest.approx(3.0)
+    assert 1.0 <= summary["p50"] <= 1.125
+
+
+def test_extreme_durations_are_recorded() -> None:
+    histogram = Histogram()
+    histogram.record(0.0)
+    histogram.record(3600.0)
+
+    assert histogram.count == 2
+    assert histogram.quantile(0.5) == pytest.approx(1.125e-6)
+    assert histogram.quantile(1.0) == 3600.0
+
+
+def test_fingerprint_collapses_whitespace() -> None:
+    query = """
+        SELECT id
+        FROM   scores
+        WHERE  userid = :userid
+    """
+
+    assert fingerprint(query) == "SELECT id FROM scores WHERE userid = :userid"
+
+
+def test_fingerprint_folds_in_lists_of_any_size() -> None:
+    one = fingerprint("SELECT * FROM maps WHERE id IN (:id_0)")
+    three = fingerprint("SELECT * FROM maps WHERE id IN (:id_0, :id_1, :id_2)")
+
+    assert one == three == "SELECT * FROM maps WHERE id IN (:id_...)"
+
+
+def test_fingerprint_keeps_distinct_lists_apart() -> None:
+    assert (
+        fingerprint(
+            "WHERE s.status IN (:s_status_0, :s_status_1) AND m.status IN (:m_status_0)",
+        )
+        == "WHERE s.status IN (:s_status_...) AND m.status IN (:m_status_...)"
+    )
+
+
+def test_fingerprint_leaves_other_parameters_alone() -> None:
+    query = "SELECT * FROM scores WHERE mode = :mode_0 AND id = :id"
+
+    assert fingerprint(query) == query
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from repositories import query_builder
+from repositories.query_builder import Filter
+
+
+def test_no_filters_match_everything() -> None:
+    assert query_builder.build() == ("TRUE", {})
+
+
+def test_missing_values_are_skipped() -> None:
+    predicates, values = query_builder.build(
+        Filter("s.mode", "=", None),
+        Filter("s.status", "=", 2),
+    )
+
+    assert predicates == "s.status = :s_status"
+    assert values == {"s_status": 2}
+
+
+def test_filters_are_joined_with_and() -> None:
+    predicates, values = query_builder.build(
+        Filter("server", "=", "osu!"),
+        Filter("mode", "=", 0),
+    )
+
+    assert predicates == "server = :server AND mode = :mode"
+    assert values == {"server": "osu!", "mode": 0}
+
+
+def test_in_lists_get_one_placeholder_per_value() -> None:
+    predicates, values = query_builder.build(Filter("s.id", "IN", [3, 1, 2]))
+
+    assert predicates == "s.id IN (:s_id_0, :s_id_1, :s_id_2)"
+    assert values == {"s_id_0": 3, "s_id_1": 1, "s_id_2": 2}
+
+
+def test_empty_in_list_matches_nothing() -> None:
+    assert query_builder.build(Filter("id", "IN", [])) == ("FALSE", {})
+
+
+def test_falsy_values_are_not_skipped() -> None:
+    predicates, values = query_builder.build(Filter("mode", "=", 0))
+
+    assert predicates == "mode = :mode"
+    assert values == {"mode": 0}
+
+
+def test_bitmask_filter_requires_every_bit() -> None:
+    predicates, values = query_builder.build(Filter("s.mods", "&", 8 | 16))
+
+    assert predicates == "(s.mods & :s_mods_mask) = :s_mods_mask"
+    assert values == {"s_mods_mask": 24}
+
+
+def test_bitmask_and_equality_filters_on_one_column_get_distinct_params() -> None:
+    predicates, values = query_builder.build(
+        Filter("s.mods", "=", 72),
+        Filter("s.mods", "&", 8),
+    )
+
+    assert predicates == "s.mods = :s_mods AND (s.mods & :s_mods_mask) = :s_mods_mask"
+    assert values == {"s_mods": 72, "s_mods_mask": 8}
+
+
+def test_no_mod_bitmask_is_still_rendered() -> None:
+    predicates, values = query_builder.build(Filter("s.mods", "&", 0))
+
+    assert predicates == "(s.mods & :s_mods_mask) = :s_mods_mask"
+    assert values == {"s_mods_mask": 0}
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from common import replays
+from common import storage
+from common.replays import ReplayIndex
+
+
+def test_added_ids_are_members() -> None:
+    index = ReplayIndex()
+    index.add(5)
+    index.add(3)
+    index.add(5)
+
+    assert 3 in index
+    assert 5 in index
+    assert 4 not in index
+    assert len(index) == 2
+
+
+def test_added_ids_are_merged_into_the_sorted_array(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(replays, "MERGE_THRESHOLD", 3)
+    index = ReplayIndex()
+    for score_id in (9, 1, 5, 7):
+        index.add(score_id)
+
+    assert list(index._ids) == [1, 5, 9]
+    assert index._added == {7}
+    assert all(score_id in index for score_id in (1, 5, 7, 9))
+    assert 6 not in index
+
+
+@pytest.mark.anyio
+async def test_refresh_replaces_the_index_with_the_directory(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def list_keys(extension: str, bucket: str) -> list[str]:
+        return ["3", "1", "2", "not-a-replay"]
+
+    monkeypatch.setattr(storage, "list_keys", list_keys)
+    index = ReplayIndex()
+    index.add(42)
+
+    await index.refresh()
+
+    assert list(index._ids) == [1, 2, 3]
+    assert 42 not in index
+
+
+@pytest.mark.anyio
+async def test_ids_added_during_a_refresh_are_kept(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    listing = asyncio.Event()
+
+    async def list_keys(extension: str, bucket: str) -> list[str]:
+        await listing.wait()
+        return ["1"]
+
+    monkeypatch.setattr(storage, "list_keys", list_keys)
+    index = ReplayIndex()
+
+    refresh = asyncio.ensure_future(index.refresh())
+    await asyncio.sleep(0)
+    index.add(2)
+    listing.set()
+    await refresh
+
+    assert 1 in index
+    assert 2 in index
+
+
+@pytest.mark.anyio
+async def test_failed_refresh_keeps_the_index(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def list_keys(extension: str, bucket: str) -> list[str]:
+        raise OSError("unreadable directory")
+
+    monkeypatch.setattr(storage, "list_keys", list_keys)
+    index = ReplayIndex()
+    index.add(1)
+
+    with pytest.raises(OSError):
+        await index.refresh()
+
+    assert 1 in index
+    index.add(2)
+    assert index._added_during_rescan is None